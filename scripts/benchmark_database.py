@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Benchmark per-call latency of Database methods on a large notes table.
+
+Compares the pooled per-thread connections against the previous behaviour
+(one sqlite3.connect + PRAGMAs per call) on a notes table with 100k rows.
+
+Usage:
+    python scripts/benchmark_database.py [--rows 100000] [--calls 2000]
+"""
+
+import argparse
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from gateway.database import Database  # noqa: E402
+
+
+class LegacyDatabase(Database):
+    """Database with the old connect-per-call behaviour, for comparison."""
+
+    @contextmanager
+    def _get_connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+        except sqlite3.Error:
+            pass
+        try:
+            yield conn
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def close(self):
+        pass
+
+
+def populate(db_path: Path, rows: int, nodes: int):
+    """Fill the notes table with `rows` notes spread over `nodes` nodes."""
+    db = Database(db_path=db_path)
+    db.close()
+    conn = sqlite3.connect(db_path)
+    start = datetime.utcnow() - timedelta(days=365)
+    step = timedelta(days=365) / rows
+    conn.executemany(
+        """
+        INSERT INTO notes (
+            local_queue_id, node_id, created_at, lat, lon,
+            text_original, text_normalized, status
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            (
+                f"Q-{i + 1:04d}",
+                f"!{i % nodes:08x}",
+                (start + step * i).isoformat(sep=" "),
+                4.6 + random.random() / 100,
+                -74.08 + random.random() / 100,
+                f"report {i}",
+                f"report {i}",
+                "pending" if i % 50 == 0 else "sent",
+            )
+            for i in range(rows)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def measure(db: Database, calls: int, rows: int, nodes: int):
+    """Return {method: [latencies in microseconds]}."""
+    bucket = int(time.time() / 120)
+    operations = {
+        "get_user_language": lambda i: db.get_user_language(f"!{i % nodes:08x}"),
+        "get_note_by_queue_id": lambda i: db.get_note_by_queue_id(f"Q-{(i * 7919) % rows + 1:04d}"),
+        "get_total_queue_size": lambda i: db.get_total_queue_size(),
+        "get_node_stats": lambda i: db.get_node_stats(f"!{i % nodes:08x}"),
+        "check_duplicate": lambda i: db.check_duplicate(
+            f"!{i % nodes:08x}", "new report", 4.6, -74.08, bucket
+        ),
+    }
+    results = {}
+    for name, op in operations.items():
+        op(0)  # warm-up (opens the thread's connection for the pooled case)
+        samples = []
+        for i in range(calls):
+            t0 = time.perf_counter()
+            op(i)
+            samples.append((time.perf_counter() - t0) * 1e6)
+        results[name] = samples
+    return results
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000, help="rows in notes table")
+    parser.add_argument("--nodes", type=int, default=200, help="distinct node ids")
+    parser.add_argument("--calls", type=int, default=2000, help="calls per method")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        print(f"Populating {args.rows} notes over {args.nodes} nodes...")
+        populate(db_path, args.rows, args.nodes)
+
+        legacy = measure(LegacyDatabase(db_path=db_path), args.calls, args.rows, args.nodes)
+        pooled_db = Database(db_path=db_path)
+        pooled = measure(pooled_db, args.calls, args.rows, args.nodes)
+        pooled_db.close()
+
+    print(f"\nPer-call latency in µs ({args.calls} calls each)")
+    print(f"{'method':<22} {'before p50':>11} {'before p99':>11} {'after p50':>10} {'after p99':>10} {'speedup':>8}")
+    for name in legacy:
+        before, after = legacy[name], pooled[name]
+        speedup = statistics.median(before) / statistics.median(after)
+        print(
+            f"{name:<22} {statistics.median(before):>11.1f} {percentile(before, 99):>11.1f} "
+            f"{statistics.median(after):>10.1f} {percentile(after, 99):>10.1f} {speedup:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
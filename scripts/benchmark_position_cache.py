@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Benchmark position packet handling: write-through vs write-behind.
+
+Feeds simulated position packets through MeshtasticSerial._on_receive_position
+and reports database commits per simulated minute (each commit is one fsync
+with synchronous=FULL) and packet-handler latency percentiles for both
+PositionCache modes.
+
+Time is compressed by --speedup: 120 nodes beaconing every 60 s at speedup 20
+become 40 packets per real second, and the flush interval is scaled to match.
+
+Usage:
+    python scripts/benchmark_position_cache.py [--nodes 120] [--minutes 5]
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from gateway.config import POSITION_FLUSH_INTERVAL, POSITION_FLUSH_MAX_PENDING  # noqa: E402
+from gateway.database import Database  # noqa: E402
+from gateway.meshtastic_serial import MeshtasticSerial  # noqa: E402
+from gateway.position_cache import PositionCache  # noqa: E402
+
+
+def count_commits(db: Database) -> dict:
+    """Wrap the position write methods of db to count commits."""
+    counter = {"commits": 0}
+    for name in ("save_position", "save_positions"):
+        original = getattr(db, name)
+
+        def wrapped(*args, _original=original, **kwargs):
+            counter["commits"] += 1
+            return _original(*args, **kwargs)
+
+        setattr(db, name, wrapped)
+    return counter
+
+
+def run(mode: str, nodes: int, minutes: float, beacon_secs: float, speedup: float):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(db_path=Path(tmp) / "bench.db")
+        counter = count_commits(db)
+        cache = PositionCache(
+            db=db,
+            write_behind=(mode == "write-behind"),
+            flush_interval=POSITION_FLUSH_INTERVAL / speedup,
+            flush_max_pending=POSITION_FLUSH_MAX_PENDING,
+        )
+        serial = MeshtasticSerial(port="/dev/null", position_cache=cache)
+        serial.running = True
+
+        interval = beacon_secs / nodes / speedup  # real seconds between packets
+        total_packets = int(minutes * 60 / beacon_secs * nodes)
+        latencies = []
+        next_at = time.perf_counter()
+        for i in range(total_packets):
+            node_num = 0x10000000 + i % nodes
+            packet = {
+                "from": node_num,
+                "decoded": {
+                    "position": {
+                        "latitudeI": 46097000 + i % 1000,
+                        "longitudeI": -740817000 - i % 1000,
+                    }
+                },
+            }
+            t0 = time.perf_counter()
+            serial._on_receive_position(packet, None)
+            latencies.append((time.perf_counter() - t0) * 1e6)
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        cache.close()
+        db.close()
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+    return {
+        "packets": total_packets,
+        "commits_per_min": counter["commits"] / minutes,
+        "p50_us": statistics.median(latencies),
+        "p99_us": p99,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=120, help="beaconing nodes")
+    parser.add_argument("--beacon", type=float, default=60.0, help="beacon interval (s)")
+    parser.add_argument("--minutes", type=float, default=5.0, help="simulated minutes")
+    parser.add_argument("--speedup", type=float, default=20.0, help="time compression factor")
+    args = parser.parse_args()
+
+    print(
+        f"{args.nodes} nodes, beacon every {args.beacon:.0f}s, "
+        f"{args.minutes:.0f} simulated minutes (x{args.speedup:.0f})"
+    )
+    print(f"{'mode':<14} {'packets':>8} {'fsyncs/min':>11} {'p50 µs':>9} {'p99 µs':>9}")
+    for mode in ("write-through", "write-behind"):
+        r = run(mode, args.nodes, args.minutes, args.beacon, args.speedup)
+        print(
+            f"{mode:<14} {r['packets']:>8} {r['commits_per_min']:>11.1f} "
+            f"{r['p50_us']:>9.1f} {r['p99_us']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Benchmark queue-to-OSM latency: fixed-interval polling vs event-driven worker.
+
+Each round queues a note while Internet is down (the OSM POST raises
+ConnectionError and the connectivity circuit is open), keeps the outage for a
+random part of the worker interval, then restores connectivity. The reported
+latency is the time from connectivity coming back to the note being marked
+sent.
+
+Time is compressed by --speedup: WORKER_INTERVAL becomes 30 / speedup seconds,
+and latencies are scaled back up for the report.
+
+Usage:
+    python scripts/benchmark_worker_wakeup.py [--notes 20] [--speedup 10]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+# Keep the benchmark database out of the real data directory
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="bench-wakeup-")
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import requests  # noqa: E402
+
+from gateway import main as gateway_main  # noqa: E402
+from gateway.main import Gateway  # noqa: E402
+
+
+class PollingGateway(Gateway):
+    """Gateway with the previous fixed-interval worker loop, for comparison."""
+
+    def _worker_loop(self):
+        while self.running:
+            try:
+                self.osm_worker.process_pending(limit=10)
+                self.notifications.process_sent_notifications()
+            except Exception:
+                pass
+            time.sleep(gateway_main.WORKER_INTERVAL)
+
+
+def fake_osm(state):
+    """Session.request replacement: ConnectionError while offline, 200 otherwise."""
+    counter = {"id": 0}
+
+    def post(*args, **kwargs):
+        if state["offline"]:
+            raise requests.exceptions.ConnectionError()
+        counter["id"] += 1
+        response = Mock(status_code=200)
+        response.json.return_value = {"properties": {"id": counter["id"]}}
+        return response
+
+    return post
+
+
+def run(gateway_cls, notes: int, interval: float):
+    state = {"offline": False}
+    with patch("gateway.main.MeshtasticSerial"), \
+            patch("gateway.main.WORKER_INTERVAL", interval), \
+            patch("gateway.osm_worker.DRY_RUN", False), \
+            patch("gateway.http_client.requests.Session.request", side_effect=fake_osm(state)):
+        gw = gateway_cls()
+        gw.osm_worker.http.set_limit("api.openstreetmap.org", None)
+        gw.notifications = Mock()
+        gw.db.set_time_correction_applied(True)
+        gw.running = True
+        worker = threading.Thread(target=gw._worker_loop, daemon=True)
+        worker.start()
+
+        latencies = []
+        for i in range(notes):
+            # Outage: circuit open, note goes to the queue
+            state["offline"] = True
+            for _ in range(gw.connectivity.failure_threshold):
+                gw.connectivity.record_failure()
+            queue_id = gw.db.create_note("!bench", 4.6097, -74.0817, f"report {i}", f"report {i}")
+            gw.wake_worker()  # what _handle_message does for a queued note
+            time.sleep(random.uniform(0, interval))
+
+            # Internet is back and the monitor notices
+            state["offline"] = False
+            restored = time.perf_counter()
+            gw.connectivity.record_success()
+            while gw.db.get_note_by_queue_id(queue_id)["status"] != "sent":
+                time.sleep(0.002)
+            latencies.append(time.perf_counter() - restored)
+
+        gw.running = False
+        gw.wake_worker()
+        worker.join(timeout=interval + 1)
+        gw.db.close()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=20, help="queued notes per mode")
+    parser.add_argument("--speedup", type=float, default=10.0, help="time compression factor")
+    args = parser.parse_args()
+
+    interval = 30 / args.speedup
+    print(f"{args.notes} notes queued during outages, WORKER_INTERVAL=30s (x{args.speedup:.0f})")
+    print(f"{'mode':<10} {'p50 s':>8} {'p95 s':>8} {'max s':>8}")
+    for name, cls in (("polling", PollingGateway), ("event", Gateway)):
+        samples = sorted(s * args.speedup for s in run(cls, args.notes, interval))
+        p95 = samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+        print(f"{name:<10} {statistics.median(samples):>8.2f} {p95:>8.2f} {samples[-1]:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
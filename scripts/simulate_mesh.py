@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""Load-test the gateway with a synthetic mesh of N virtual nodes.
+
+A simulated mesh stands in for meshtastic's SerialInterface (nodes,
+sendText, heartbeats) and publishes position beacons and text messages on
+the same pubsub topics the real interface uses. A real Gateway runs against
+it end to end: ingestion, commands, note creation, the TX scheduler with its
+airtime budget, and the OSM worker submitting to a local mock OSM endpoint
+(gateway.mock_osm; OSM_API_URL, NOMINATIM_API_URL and CONNECTIVITY_PROBE_URL
+point at it, and --osm-latency/--osm-error inject faults).
+
+Traffic model:
+    - every node beacons its position every --beacon-interval seconds
+    - messages arrive at --msg-rate per second in clumps of --burst-size
+      (Poisson when 1), each from a different random node that has beaconed
+    - --note-share of messages are #osmnote reports, the rest informational
+      commands
+
+Prints queue growth every --report-interval seconds, then sustained msgs/s
+and ACK latency percentiles (message sent -> first DM back to that node).
+
+Usage:
+    python scripts/simulate_mesh.py [--nodes 2000] [--duration 120] [--msg-rate 5]
+"""
+
+import argparse
+import heapq
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+from urllib.parse import urlsplit
+
+COMMANDS = ["#osmstatus", "#osmcount", "#osmlist", "#osmqueue", "#osmhelp"]
+GATEWAY_NUM = 0x0A0A0A0A
+CENTER = (4.6097, -74.0817)
+
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from gateway.mock_osm import FaultProfile, MockOSMServer, parse_latency  # noqa: E402
+
+# The mock must be up before gateway.config reads the URLs
+_mock = MockOSMServer().start()
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="simulate-mesh-")
+os.environ["DRY_RUN"] = "false"
+os.environ["OSM_API_URL"] = _mock.notes_url
+os.environ["NOMINATIM_API_URL"] = _mock.reverse_url
+os.environ["CONNECTIVITY_PROBE_URL"] = _mock.probe_url
+
+from pubsub import pub  # noqa: E402
+
+from gateway.main import Gateway  # noqa: E402
+
+
+class SimulatedMesh:
+    """Stand-in for meshtastic SerialInterface backed by virtual nodes."""
+
+    def __init__(self, nodes: int, beacon_interval: float, msg_rate: float, note_share: float,
+                 burst_size: int, seed: int = 1):
+        self.random = random.Random(seed)
+        self.beacon_interval = beacon_interval
+        self.msg_rate = msg_rate
+        self.note_share = note_share
+        self.burst_size = max(1, burst_size)
+        self.isConnected = threading.Event()
+        self.isConnected.set()
+        self.nodes = {}
+        self._home = {}
+        for i in range(nodes):
+            num = 0x10000000 + i
+            self.nodes[num] = {"num": num, "user": {"id": f"!{num:08x}"}, "deviceMetrics": {"uptimeSeconds": 3600}}
+            self._home[num] = (CENTER[0] + self.random.uniform(-0.05, 0.05),
+                               CENTER[1] + self.random.uniform(-0.05, 0.05))
+        self._beaconed = []
+        self._packet_id = 0
+        self._lock = threading.Lock()
+        # node -> send times of messages still waiting for a DM back
+        self._awaiting = defaultdict(deque)
+        self.ack_latencies = []
+        self.offered = 0
+        self.beacons = 0
+        self.max_lag = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    # SerialInterface API used by the gateway
+    def getMyNodeInfo(self):
+        return {"num": GATEWAY_NUM, "user": {"hwModel": "SIMULATED"}}
+
+    def getNode(self, node_id):
+        device = SimpleNamespace(role=1)  # already CLIENT_MUTE
+        return SimpleNamespace(localConfig=SimpleNamespace(device=device), writeConfig=lambda *_: None)
+
+    def sendText(self, text, destinationId="^all", wantAck=False, **kwargs):
+        now = time.monotonic()
+        with self._lock:
+            waiting = self._awaiting.get(destinationId)
+            if waiting:
+                self.ack_latencies.append(now - waiting.popleft())
+
+    def sendHeartbeat(self):
+        pass
+
+    def close(self):
+        self.isConnected.clear()
+
+    # Traffic generation
+    def _next_id(self):
+        self._packet_id += 1
+        return self._packet_id
+
+    def _beacon(self, num):
+        lat, lon = self._home[num]
+        position = {"latitudeI": int(lat * 1e7), "longitudeI": int(lon * 1e7),
+                    "latitude": lat, "longitude": lon, "time": int(time.time())}
+        self.nodes[num]["position"] = position
+        self.nodes[num]["lastHeard"] = time.time()
+        packet = {"from": num, "fromId": f"!{num:08x}", "to": 0xFFFFFFFF, "id": self._next_id(),
+                  "decoded": {"portnum": "POSITION_APP", "position": position}}
+        pub.sendMessage("meshtastic.receive.position", packet=packet, interface=self)
+        self.beacons += 1
+
+    def _message(self, num):
+        if self.random.random() < self.note_share:
+            text = f"#osmnote reporte {self._packet_id} {self.random.choice(['bache', 'árbol caído', 'sin luz'])}"
+        else:
+            text = self.random.choice(COMMANDS)
+        packet = {"from": num, "fromId": f"!{num:08x}", "to": GATEWAY_NUM, "id": self._next_id(),
+                  "decoded": {"portnum": "TEXT_MESSAGE_APP", "text": text, "payload": text.encode()}}
+        with self._lock:
+            self._awaiting[num].append(time.monotonic())
+            self.offered += 1
+        pub.sendMessage("meshtastic.receive.text", packet=packet, interface=self)
+
+    def _run(self):
+        start = time.monotonic()
+        events = []
+        for num in self.nodes:
+            events.append((self.random.uniform(0, self.beacon_interval), "beacon", num))
+        if self.msg_rate > 0:
+            events.append((self.random.expovariate(self.msg_rate / self.burst_size), "burst", None))
+        heapq.heapify(events)
+
+        while events and not self._stop.is_set():
+            at, kind, num = heapq.heappop(events)
+            delay = at - (time.monotonic() - start)
+            if delay > 0:
+                if self._stop.wait(delay):
+                    break
+            else:
+                # The reader thread could not keep up with the offered load
+                self.max_lag = max(self.max_lag, -delay)
+
+            if kind == "beacon":
+                first = "position" not in self.nodes[num]
+                self._beacon(num)
+                if first:
+                    self._beaconed.append(num)
+                heapq.heappush(events, (at + self.beacon_interval, "beacon", num))
+            else:
+                if self._beaconed:
+                    size = min(self.burst_size, len(self._beaconed))
+                    for sender in self.random.sample(self._beaconed, size):
+                        self._message(sender)
+                heapq.heappush(events, (at + self.random.expovariate(self.msg_rate / self.burst_size), "burst", None))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="simulated-mesh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5.0)
+
+    def unanswered(self):
+        with self._lock:
+            return sum(len(waiting) for waiting in self._awaiting.values())
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=2000, help="virtual nodes")
+    parser.add_argument("--duration", type=float, default=120.0, help="seconds of traffic")
+    parser.add_argument("--beacon-interval", type=float, default=60.0, help="position beacon period per node (s)")
+    parser.add_argument("--msg-rate", type=float, default=5.0, help="text messages per second, all nodes")
+    parser.add_argument("--note-share", type=float, default=0.7, help="fraction of messages that are #osmnote")
+    parser.add_argument("--burst-size", type=int, default=1, help="messages per arrival (1 = Poisson)")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="seconds between progress lines")
+    parser.add_argument("--unlimited-osm", action="store_true", help="remove the OSM rate limit (gateway-only capacity)")
+    parser.add_argument("--osm-latency", default="0", help="mock OSM latency spec, e.g. exp:0.3 (see gateway.mock_osm)")
+    parser.add_argument("--osm-error", action="append", default=[], metavar="STATUS:RATE",
+                        help="inject an OSM error status, e.g. 429:0.05 (repeatable)")
+    parser.add_argument("--osm-retry-after", type=float, default=None, help="Retry-After seconds on injected 429/503")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="keep the gateway's INFO logging")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    errors = {int(status): float(rate) for status, _, rate in (e.partition(":") for e in args.osm_error)}
+    _mock.profiles["notes"] = FaultProfile(
+        latency=parse_latency(args.osm_latency), errors=errors, retry_after=args.osm_retry_after,
+    )
+    mesh = SimulatedMesh(args.nodes, args.beacon_interval, args.msg_rate, args.note_share,
+                         args.burst_size, seed=args.seed)
+    with patch("gateway.meshtastic_serial.meshtastic.serial_interface.SerialInterface", lambda **kwargs: mesh):
+        gw = Gateway()
+        gw.db.set_time_correction_applied(True)
+        if args.unlimited_osm:
+            gw.http.set_limit(urlsplit(os.environ["OSM_API_URL"]).hostname, None)
+        runner = threading.Thread(target=gw.start, name="gateway", daemon=True)
+        runner.start()
+        while not gw.serial.running:
+            time.sleep(0.01)
+
+        print(f"{args.nodes} nodes, beacon every {args.beacon_interval:.0f} s, {args.msg_rate} msgs/s "
+              f"({args.note_share:.0%} notes, bursts of {args.burst_size}) for {args.duration:.0f} s")
+        print(f"{'t s':>6} {'offered/s':>10} {'handled/s':>10} {'ingest q':>9} {'dropped':>8} "
+              f"{'tx q':>6} {'osm q':>6} {'osm sent':>9}")
+        mesh.start()
+        started = time.monotonic()
+        last_offered, last_processed, last_t = 0, 0, started
+        osm_queue = []
+        while time.monotonic() - started < args.duration:
+            time.sleep(min(args.report_interval, max(0.0, args.duration - (time.monotonic() - started))))
+            now = time.monotonic()
+            ingest = gw.ingestion.get_metrics()
+            queued = gw.db.get_total_queue_size()
+            osm_queue.append((now - started, queued))
+            span = now - last_t
+            print(f"{now - started:>6.0f} {(mesh.offered - last_offered) / span:>10.1f} "
+                  f"{(ingest['processed'] - last_processed) / span:>10.1f} {ingest['depth']:>9} "
+                  f"{sum(ingest['dropped'].values()):>8} {gw.tx_scheduler.get_metrics()['pending']:>6} "
+                  f"{queued:>6} {_mock.get_metrics()['notes_created']:>9}")
+            last_offered, last_processed, last_t = mesh.offered, ingest["processed"], now
+        mesh.stop()
+        elapsed = time.monotonic() - started
+        ingest = gw.ingestion.get_metrics()
+        gw.stop()
+        runner.join(timeout=10.0)
+    _mock.stop()
+
+    print()
+    print(f"offered {mesh.offered} messages and {mesh.beacons} beacons in {elapsed:.0f} s")
+    print(f"sustained {ingest['processed'] / elapsed:.1f} msgs/s handled "
+          f"({sum(ingest['dropped'].values())} dropped, reader lag max {mesh.max_lag * 1000:.0f} ms)")
+    if len(osm_queue) >= 2:
+        (t0, q0), (t1, q1) = osm_queue[0], osm_queue[-1]
+        mock_metrics = _mock.get_metrics()
+        print(f"OSM queue {q0} -> {q1} ({(q1 - q0) / (t1 - t0) * 60:+.1f} notes/min), "
+              f"{mock_metrics['notes_created']} notes submitted, responses {mock_metrics['by_status']}")
+    if mesh.ack_latencies:
+        samples = mesh.ack_latencies
+        print(f"ACK latency s: p50 {percentile(samples, 0.50):.2f}  p95 {percentile(samples, 0.95):.2f}  "
+              f"p99 {percentile(samples, 0.99):.2f}  max {max(samples):.2f}  "
+              f"({len(samples)} answered, {mesh.unanswered()} unanswered)")
+
+
+if __name__ == "__main__":
+    main()
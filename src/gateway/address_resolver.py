@@ -0,0 +1,128 @@
+"""Background reverse geocoding of new notes."""
+
+import queue
+import logging
+import threading
+from typing import Dict, Optional
+
+from .database import Database
+from .geocoding import GeocodingService
+from .config import ADDRESS_QUEUE_MAXSIZE
+
+logger = logging.getLogger(__name__)
+
+
+class AddressResolver:
+    """
+    Resolve and store the address of each note as soon as it is created.
+
+    resolve() never waits for Nominatim: offline and cached addresses are
+    stored right away, everything else is queued for one background thread
+    (Nominatim allows one request per second anyway). ACKs and Q→Note
+    notifications then read notes.address instead of geocoding themselves.
+
+    Attributes:
+        maxsize: Maximum number of notes waiting for a lookup; beyond that the
+            note is skipped and notified without an address (unless the
+            offline geocoder or the cache has it by then)
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        geocoding: GeocodingService,
+        maxsize: int = ADDRESS_QUEUE_MAXSIZE,
+    ):
+        self.db = db
+        self.geocoding = geocoding
+        self.maxsize = maxsize
+        self._queue: queue.Queue[Optional[tuple]] = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[threading.Thread] = None
+
+        # Metrics (resolve() runs on the ingestion workers)
+        self._metrics_lock = threading.Lock()
+        self._local = 0
+        self._remote = 0
+        self._unresolved = 0
+        self._dropped = 0
+
+    def start(self):
+        """Start the lookup thread."""
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name="address-resolver", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the lookup thread. Queued lookups are abandoned."""
+        if not self._thread:
+            return
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def resolve(self, local_queue_id: str):
+        """Store the address of a note now if known locally, else queue a lookup."""
+        note = self.db.get_note_by_queue_id(local_queue_id)
+        if not note or note.get("address") or note.get("lat") is None or note.get("lon") is None:
+            return
+
+        address = self.geocoding.lookup_local(note["lat"], note["lon"])
+        if address:
+            self.db.set_note_address(local_queue_id, address)
+            with self._metrics_lock:
+                self._local += 1
+            return
+
+        try:
+            self._queue.put_nowait((local_queue_id, note["lat"], note["lon"]))
+        except queue.Full:
+            with self._metrics_lock:
+                self._dropped += 1
+            logger.warning(f"Address lookup queue full, not resolving {local_queue_id}")
+
+    def _run(self):
+        """Lookup thread: geocode queued notes and store the result."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            local_queue_id, lat, lon = item
+            address = None
+            try:
+                address = self.geocoding.reverse_geocode(lat, lon)
+                if address:
+                    self.db.set_note_address(local_queue_id, address)
+            except Exception as e:
+                address = None
+                logger.error(f"Error resolving address for {local_queue_id}: {e}")
+            with self._metrics_lock:
+                if address:
+                    self._remote += 1
+                else:
+                    self._unresolved += 1
+
+    def get_metrics(self) -> Dict[str, int]:
+        """
+        Snapshot of resolver metrics.
+
+        Returns:
+            Dict with 'queued' lookups, 'local' (offline/cache, stored
+            immediately), 'remote' (Nominatim), 'unresolved' and 'dropped'.
+        """
+        with self._metrics_lock:
+            return {
+                "queued": self._queue.qsize(),
+                "local": self._local,
+                "remote": self._remote,
+                "unresolved": self._unresolved,
+                "dropped": self._dropped,
+            }
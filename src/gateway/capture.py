@@ -0,0 +1,300 @@
+"""Record and replay Meshtastic packet streams."""
+
+import json
+import time
+import base64
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Keys meshtastic adds that cannot be serialised (the raw protobuf object)
+_SKIPPED_KEYS = ("raw",)
+
+
+def _encode(value: Any) -> Any:
+    """json.dumps default: bytes as base64, anything else as its string form."""
+    if isinstance(value, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(bytes(value)).decode("ascii")}
+    return str(value)
+
+
+def _decode(obj: Dict[str, Any]) -> Any:
+    """json.loads object_hook reversing _encode for bytes."""
+    if len(obj) == 1 and "__bytes__" in obj:
+        return base64.b64decode(obj["__bytes__"])
+    return obj
+
+
+def _strip(packet: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of packet without non-serialisable keys (also inside 'decoded')."""
+    clean = {k: v for k, v in packet.items() if k not in _SKIPPED_KEYS}
+    decoded = clean.get("decoded")
+    if isinstance(decoded, dict):
+        clean["decoded"] = {k: v for k, v in decoded.items() if k not in _SKIPPED_KEYS}
+    return clean
+
+
+class PacketRecorder:
+    """
+    Append every received packet to a JSONL capture file.
+
+    One line per packet: {"t": <unix time>, "packet": <packet dict>}. Bytes
+    payloads are stored as base64 and the raw protobuf object is dropped, so
+    a line round-trips to the dict the pubsub handlers saw. Write errors are
+    logged and counted, never raised into the reader thread.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._recorded = 0
+        self._errors = 0
+
+    def record(self, packet: Dict[str, Any], now: Optional[float] = None):
+        """Append one packet."""
+        now = time.time() if now is None else now
+        try:
+            line = json.dumps({"t": now, "packet": _strip(packet)}, default=_encode, separators=(",", ":"))
+            with self._lock:
+                self._file.write(line + "\n")
+                self._file.flush()
+                self._recorded += 1
+        except Exception as e:
+            logger.debug(f"Could not record packet: {e}")
+            with self._lock:
+                self._errors += 1
+
+    def close(self):
+        """Close the capture file."""
+        with self._lock:
+            self._file.close()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Returns: Dict with 'path', 'recorded' and 'errors'."""
+        with self._lock:
+            return {"path": str(self.path), "recorded": self._recorded, "errors": self._errors}
+
+
+def read_capture(path: Union[str, Path]) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    """Yield (timestamp, packet) from a capture file, skipping unreadable lines."""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line, object_hook=_decode)
+                yield float(record["t"]), record["packet"]
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Skipping line {number} of {path}: {e}")
+
+
+class ReplayInterface:
+    """
+    Stand-in for meshtastic SerialInterface while replaying.
+
+    Provides what MeshtasticSerial and the gateway use: nodes, getMyNodeInfo,
+    getNode, sendText (recorded in sent), sendHeartbeat and close.
+    """
+
+    def __init__(self, nodes: Optional[Dict[int, Dict[str, Any]]] = None):
+        self.nodes: Dict[int, Dict[str, Any]] = nodes or {}
+        self.isConnected = threading.Event()
+        self.isConnected.set()
+        self.sent: List[Tuple[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def getMyNodeInfo(self) -> Dict[str, Any]:
+        return {}
+
+    def getNode(self, node_id):
+        return None
+
+    def sendText(self, text: str, destinationId: Any = "^all", wantAck: bool = False, **kwargs):
+        with self._lock:
+            self.sent.append((text, destinationId))
+
+    def sendHeartbeat(self):
+        pass
+
+    def close(self):
+        self.isConnected.clear()
+
+
+class PacketReplayer:
+    """
+    Feed a capture through MeshtasticSerial's pubsub handlers.
+
+    Each packet is delivered the way pubsub delivers it: to the handler of
+    its specific topic (text or position), then to the catch-all
+    meshtastic.receive handler. speed is a multiple of the recorded pace;
+    0 replays as fast as possible.
+
+    Stage latencies (seconds) are measured per message that reaches the
+    serial message callback:
+        - dispatch: packet fed -> message handed to the callback (parsing)
+        - queue: handed off -> handler started (only with instrument())
+        - handle: handler duration (only with instrument())
+        - end_to_end: packet fed -> handler done (only with instrument())
+    """
+
+    STAGES = ("dispatch", "queue", "handle", "end_to_end")
+
+    def __init__(self, serial, speed: float = 1.0):
+        self.serial = serial
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        # id(msg) -> (fed_at, handed_at) for messages not handled yet
+        self._pending: Dict[int, Tuple[float, float]] = {}
+        self._fed_at = 0.0
+        self._samples: Dict[str, List[float]] = {stage: [] for stage in self.STAGES}
+        self._packets = 0
+        self._messages = 0
+        self._handled = 0
+        self._refused = 0
+        self._first_fed: Optional[float] = None
+        self._last_done: Optional[float] = None
+        self._feed_elapsed = 0.0
+
+    def _on_message(self, callback: Callable[[Dict[str, Any]], Any]) -> Callable[[Dict[str, Any]], Any]:
+        def tracked(msg: Dict[str, Any]):
+            handed_at = time.monotonic()
+            with self._lock:
+                self._messages += 1
+                self._pending[id(msg)] = (self._fed_at, handed_at)
+                self._samples["dispatch"].append(handed_at - self._fed_at)
+            accepted = callback(msg) if callback else None
+            if accepted is False:
+                # Refused downstream (e.g. a full ingestion queue): it will never be handled
+                with self._lock:
+                    self._pending.pop(id(msg), None)
+                    self._refused += 1
+            return accepted
+        return tracked
+
+    def instrument(self, handler: Callable[[Dict[str, Any]], Any]) -> Callable[[Dict[str, Any]], Any]:
+        """Wrap the downstream message handler to time the queue and handle stages."""
+        def timed(msg: Dict[str, Any]):
+            started = time.monotonic()
+            try:
+                return handler(msg)
+            finally:
+                done = time.monotonic()
+                with self._cond:
+                    times = self._pending.pop(id(msg), None)
+                    if times:
+                        fed_at, handed_at = times
+                        self._samples["queue"].append(started - handed_at)
+                        self._samples["handle"].append(done - started)
+                        self._samples["end_to_end"].append(done - fed_at)
+                        self._handled += 1
+                        self._last_done = done
+                    self._cond.notify_all()
+        return timed
+
+    def dispatch(self, packet: Dict[str, Any]):
+        """Deliver one packet to the serial handlers in pubsub order."""
+        interface = self.serial.interface
+        portnum = (packet.get("decoded") or {}).get("portnum")
+        if portnum in ("TEXT_MESSAGE_APP", 1):
+            self.serial._on_receive_text(packet, interface)
+        elif portnum in ("POSITION_APP", 3):
+            self.serial._on_receive_position(packet, interface)
+        self.serial._on_receive_all(packet, interface)
+
+    def replay(self, records: Iterable[Tuple[float, Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Replay (timestamp, packet) records, e.g. from read_capture().
+
+        The serial message callback is wrapped for the duration of the replay.
+
+        Returns:
+            get_metrics() after the last packet is fed
+        """
+        original = self.serial.message_callback
+        self.serial.message_callback = self._on_message(original)
+        started = time.monotonic()
+        first_t = None
+        try:
+            for t, packet in records:
+                if first_t is None:
+                    first_t = t
+                if self.speed:
+                    delay = (t - first_t) / self.speed - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+                fed_at = time.monotonic()
+                with self._lock:
+                    self._fed_at = fed_at
+                    self._packets += 1
+                    if self._first_fed is None:
+                        self._first_fed = fed_at
+                try:
+                    self.dispatch(packet)
+                except Exception as e:
+                    logger.error(f"Error replaying packet {packet.get('id')}: {e}")
+        finally:
+            self.serial.message_callback = original
+            self._feed_elapsed += time.monotonic() - started
+        return self.get_metrics()
+
+    def wait_handled(self, timeout: float = 30.0) -> bool:
+        """
+        Wait until every message fed so far has been handled (with instrument()).
+
+        Messages the downstream queue evicts after accepting them are never
+        handled, so this returns False after timeout in that case.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Replay results.
+
+        Returns:
+            Dict with 'packets', 'messages' (reached the callback), 'handled',
+            'refused' (the callback returned False),
+            'feed_elapsed' (s), 'packets_per_s' (feed rate), 'messages_per_s'
+            (handled messages over first feed -> last handled, None before any)
+            and 'stages': per stage 'count' and 'p50'/'p95'/'max' in seconds
+        """
+        def summary(samples: List[float]) -> Dict[str, Any]:
+            ordered = sorted(samples)
+
+            def percentile(pct: float) -> Optional[float]:
+                if not ordered:
+                    return None
+                return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+            return {
+                "count": len(ordered),
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": ordered[-1] if ordered else None,
+            }
+
+        with self._lock:
+            span = (self._last_done - self._first_fed) if self._last_done and self._first_fed else None
+            return {
+                "packets": self._packets,
+                "messages": self._messages,
+                "handled": self._handled,
+                "refused": self._refused,
+                "feed_elapsed": self._feed_elapsed,
+                "packets_per_s": self._packets / self._feed_elapsed if self._feed_elapsed > 0 else None,
+                "messages_per_s": self._handled / span if span else None,
+                "stages": {stage: summary(self._samples[stage]) for stage in self.STAGES},
+            }
@@ -14,7 +14,7 @@ from .config import (
 from .database import Database
 from .position_cache import PositionCache
 from .rate_limiter import RateLimiter
-from .geocoding import GeocodingService
+from .connectivity import ConnectivityMonitor
 from .i18n import _, get_current_locale
 
 logger = logging.getLogger(__name__)
@@ -204,11 +204,17 @@ class CommandProcessor:
         r"#osm_notes\b",  # Plural variant with underscore
     ]
 
-    def __init__(self, db: Database, position_cache: PositionCache):
+    def __init__(
+        self,
+        db: Database,
+        position_cache: PositionCache,
+        connectivity: Optional[ConnectivityMonitor] = None,
+    ):
         self.db = db
         self.position_cache = position_cache
+        # Without a shared (started) monitor, status reports online until a failure is recorded
+        self.connectivity = connectivity or ConnectivityMonitor()
         self.rate_limiter = RateLimiter()
-        self.geocoding = GeocodingService()
 
     def normalize_text(self, text: str) -> str:
         """Normalize text for deduplication."""
@@ -338,13 +344,8 @@ class CommandProcessor:
 
     def _handle_status(self, node_id: str, locale: Optional[str] = None) -> Tuple[str, str]:
         """Handle #osmstatus command."""
-        import requests
-        internet_ok = False
-        try:
-            response = requests.get("https://www.google.com", timeout=3)
-            internet_ok = response.status_code == 200
-        except:
-            pass
+        # Cached state from the connectivity monitor; never blocks on the network
+        internet_ok = self.connectivity.is_online()
 
         total_queue = self.db.get_total_queue_size()
         node_stats = self.db.get_node_stats(node_id)
@@ -392,7 +393,7 @@ class CommandProcessor:
 
         lines = [_("📝 Últimas {count} notas:", locale).format(count=len(notes))]
         for note in notes:
-            status_icon = "⏳" if note["status"] == "pending" else "✅"
+            status_icon = {"pending": "⏳", "failed": "❌"}.get(note["status"], "✅")
             # Parse UTC datetime and convert to server timezone
             created_str = note["created_at"]
             try:
@@ -437,7 +438,8 @@ class CommandProcessor:
         import time
         from datetime import datetime, timedelta
         
-        # Get all positions from database
+        # Get all positions from database (flush buffered write-behind updates first)
+        self.position_cache.flush()
         all_positions = self.db.load_all_positions()
         
         if not all_positions:
@@ -645,28 +647,22 @@ class CommandProcessor:
         if is_approximate:
             text_normalized = f"[posición aproximada] {text_normalized}"
 
-        # Check for duplicates
+        # Create note unless it duplicates one already queued (atomic check + insert)
         recv_time = timestamp or time.time()
         time_bucket = int(recv_time / DEDUP_TIME_BUCKET_SECONDS)
 
-        if self.db.check_duplicate(
-            node_id,
-            text_normalized,
-            position.lat,
-            position.lon,
-            time_bucket,
-        ):
-            return "osmnote_duplicate", MSG_DUPLICATE(locale)
-
-        # Create note
-        local_queue_id = self.db.create_note(
+        local_queue_id, is_duplicate = self.db.create_note_deduplicated(
             node_id=node_id,
             lat=position.lat,
             lon=position.lon,
             text_original=text,
             text_normalized=text_normalized,
+            time_bucket=time_bucket,
         )
 
+        if is_duplicate:
+            return "osmnote_duplicate", MSG_DUPLICATE(locale)
+
         if not local_queue_id:
             return "osmnote_error", _("❌ Error al crear nota.", locale)
 
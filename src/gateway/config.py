@@ -31,9 +31,20 @@ except (PermissionError, OSError):
 
 # Database path
 DB_PATH = DATA_DIR / "gateway.db"
+# Prepared statements kept per SQLite connection (connections are reused per thread)
+DB_STATEMENT_CACHE_SIZE = 256
 
 # Serial port
 SERIAL_PORT = os.getenv("SERIAL_PORT", "/dev/ttyACM0")
+# Link supervisor: the interface is probed (heartbeat) every
+# SERIAL_PROBE_INTERVAL seconds; a dead link is reconnected with exponential
+# backoff from SERIAL_RECONNECT_MIN_SECONDS up to SERIAL_RECONNECT_MAX_SECONDS
+SERIAL_PROBE_INTERVAL = 30  # seconds
+SERIAL_RECONNECT_MIN_SECONDS = 5.0
+SERIAL_RECONNECT_MAX_SECONDS = 300.0
+# Packet capture: every packet seen on meshtastic.receive is appended to this
+# JSONL file for replay with scripts/replay_capture.py. Empty disables it.
+PACKET_CAPTURE_PATH = os.getenv("PACKET_CAPTURE_PATH", "")
 
 # Dry run mode
 DRY_RUN = os.getenv("DRY_RUN", "false").lower() == "true"
@@ -56,24 +67,113 @@ TZ = os.getenv("TZ", "America/Bogota")
 POS_GOOD = 15
 POS_MAX = 120  # Increased from 60 to 120 seconds to accommodate 60s broadcast minimum
 
+# Position cache persistence
+# Write-behind batches position writes instead of one fsync per position packet.
+# Positions are flushed every POSITION_FLUSH_INTERVAL seconds, or sooner once
+# POSITION_FLUSH_MAX_PENDING nodes have unsaved updates, and on shutdown.
+POSITION_WRITE_BEHIND = os.getenv("POSITION_WRITE_BEHIND", "true").lower() == "true"
+POSITION_FLUSH_INTERVAL = 30.0  # seconds
+POSITION_FLUSH_MAX_PENDING = 200  # nodes
+
 # Deduplication settings
 DEDUP_TIME_BUCKET_SECONDS = 120
 DEDUP_LOCATION_PRECISION = 4  # decimal places for lat/lon
 
+# Outbound HTTP (shared keep-alive session for OSM, Nominatim and probes)
+HTTP_POOL_MAXSIZE = 4  # pooled connections per host
+HTTP_USER_AGENT = "OSM-Mesh-Notes-Gateway/1.0"  # required by Nominatim
+
 # OSM API
-OSM_API_URL = "https://api.openstreetmap.org/api/0.6/notes.json"
-OSM_RATE_LIMIT_SECONDS = 3
+# Overridable to point a test gateway at a local stand-in (e.g. scripts/simulate_mesh.py)
+OSM_API_URL = os.getenv("OSM_API_URL", "https://api.openstreetmap.org/api/0.6/notes.json")
+OSM_RATE_LIMIT_SECONDS = 3  # initial spacing between requests to the OSM API host
+# Adaptive submission rate (AIMD): each successful note speeds up by
+# OSM_RATE_INCREASE requests/s, down to OSM_RATE_MIN_SECONDS spacing; each
+# 429/5xx multiplies the rate by OSM_RATE_DECREASE_FACTOR, up to
+# OSM_RATE_MAX_SECONDS spacing. Retry-After pauses submissions entirely.
+OSM_RATE_MIN_SECONDS = 1.0
+OSM_RATE_MAX_SECONDS = 60.0
+OSM_RATE_INCREASE = 0.01
+OSM_RATE_DECREASE_FACTOR = 0.5
 OSM_MAX_RETRIES = 3  # Maximum retry attempts for failed OSM API calls
-OSM_RETRY_DELAY_SECONDS = 60  # Delay between retries
+OSM_RETRY_DELAY_SECONDS = 60  # Base delay before the first retry
+OSM_RETRY_MAX_DELAY_SECONDS = 3600  # Cap for the exponential backoff
+OSM_RETRY_JITTER = 0.2  # +/- fraction of random jitter applied to each delay
+# Submission journal: a note whose POST outcome is unknown (crash, power loss or
+# timeout after sending) is looked up among OSM notes within
+# OSM_RECONCILE_RADIUS degrees before it is submitted again. Notes created more
+# than OSM_RECONCILE_CLOCK_SLACK seconds before the attempt do not match.
+OSM_RECONCILE_RADIUS = 0.0005
+OSM_RECONCILE_CLOCK_SLACK = 3600
+# Fair scheduling of the pending queue: each worker batch takes notes round-robin
+# across nodes (oldest first within a node), so one node's backlog cannot delay
+# everyone else. Notes younger than OSM_FRESH_PRIORITY_SECONDS go ahead of the
+# backlog (0 disables the priority).
+OSM_FRESH_PRIORITY_SECONDS = int(os.getenv("OSM_FRESH_PRIORITY_SECONDS", "0"))
+OSM_QUEUE_WAIT_SAMPLES = 100  # recent queue waits kept per node for percentiles
+OSM_QUEUE_WAIT_MAX_NODES = 500  # nodes tracked for queue-wait metrics (least recent dropped)
+# Backlog drain mode: above OSM_DRAIN_ENTER_BACKLOG pending notes the worker
+# submits continuously in batches of OSM_DRAIN_BATCH_SIZE (paced only by the
+# OSM rate controller, with notification passes between batches) until the
+# queue drops to OSM_DRAIN_EXIT_BACKLOG. Throughput is averaged over
+# OSM_DRAIN_RATE_WINDOW seconds for the ETA.
+OSM_DRAIN_ENTER_BACKLOG = 50
+OSM_DRAIN_EXIT_BACKLOG = 5
+OSM_DRAIN_BATCH_SIZE = 25
+OSM_DRAIN_RATE_WINDOW = 300  # seconds
+OSM_DRAIN_LOG_INTERVAL = 60  # seconds between drain progress logs
+
+# Connectivity monitor (circuit breaker shared by OSM, Nominatim and #osmstatus)
+# After CONNECTIVITY_FAILURE_THRESHOLD consecutive timeouts/connection errors the
+# circuit opens and outgoing requests are skipped; every CONNECTIVITY_RETRY_SECONDS
+# a single probe or request is let through to check whether Internet is back.
+CONNECTIVITY_PROBE_URL = os.getenv("CONNECTIVITY_PROBE_URL", "https://api.openstreetmap.org/api/capabilities")
+CONNECTIVITY_PROBE_INTERVAL = 60  # seconds between probes while online
+CONNECTIVITY_PROBE_TIMEOUT = 5  # seconds
+CONNECTIVITY_FAILURE_THRESHOLD = 2
+CONNECTIVITY_RETRY_SECONDS = 30  # seconds before a half-open probe
 
 # Nominatim reverse geocoding API
-NOMINATIM_API_URL = "https://nominatim.openstreetmap.org/reverse"
-NOMINATIM_RATE_LIMIT_SECONDS = 1  # Nominatim requires max 1 request per second
+NOMINATIM_API_URL = os.getenv("NOMINATIM_API_URL", "https://nominatim.openstreetmap.org/reverse")
+NOMINATIM_RATE_LIMIT_SECONDS = 1  # Nominatim requires max 1 request per second (shared by all callers)
 NOMINATIM_TIMEOUT = 5  # seconds
 
+# Offline reverse geocoding from a local boundaries file
+# OFFLINE_GEOCODER_PATH: GeoJSON FeatureCollection of OSM boundaries/places
+# (name + admin_level or place tags), e.g. exported with `osmium export`.
+# Empty disables it. Nominatim is only asked when the point is not covered,
+# unless GEOCODER_NOMINATIM_FALLBACK is false.
+OFFLINE_GEOCODER_PATH = os.getenv("OFFLINE_GEOCODER_PATH", "")
+GEOCODER_NOMINATIM_FALLBACK = os.getenv("GEOCODER_NOMINATIM_FALLBACK", "true").lower() == "true"
+OFFLINE_GEOCODER_GRID_DEGREES = 0.05  # spatial index cell size
+
+# Note addresses are resolved in the background after a note is created;
+# at most this many notes wait for a Nominatim lookup
+ADDRESS_QUEUE_MAXSIZE = 200
+
+# Reverse-geocode cache (SQLite-backed, LRU in memory)
+# Coordinates are rounded to GEOCODE_CACHE_PRECISION decimals to form the cache
+# key: 3 decimals is a ~110 m cell, well inside one barrio.
+GEOCODE_CACHE_PRECISION = int(os.getenv("GEOCODE_CACHE_PRECISION", "3"))
+GEOCODE_CACHE_TTL = 30 * 86400  # seconds (addresses rarely change)
+GEOCODE_CACHE_MAX_ENTRIES = 5000
+
 # Meshtastic message limits
 MESHTASTIC_MAX_MESSAGE_LENGTH = 200  # Safe limit (theoretical max is ~237 bytes)
 
+# Outbound LoRa scheduling (TxScheduler)
+# Airtime budget: transmissions in any TX_DUTY_CYCLE_WINDOW may use at most
+# TX_DUTY_CYCLE of it (e.g. 0.10 for EU868 g3). Bulk notifications may only use
+# TX_BULK_BUDGET_FRACTION of that budget so ACKs always find room.
+TX_DUTY_CYCLE = float(os.getenv("TX_DUTY_CYCLE", "0.10"))
+TX_DUTY_CYCLE_WINDOW = 3600  # seconds
+TX_BULK_BUDGET_FRACTION = 0.8
+TX_DESTINATION_GAP_SECONDS = 3.5  # minimum spacing between packets to the same node
+# Airtime estimate (defaults approximate the LongFast preset)
+TX_BITRATE_BPS = 1070
+TX_PACKET_OVERHEAD_BYTES = 32  # Meshtastic header + encryption
+TX_PREAMBLE_SECONDS = 0.13
+
 # Rate limiting per user
 USER_RATE_LIMIT_WINDOW = 60  # seconds
 USER_RATE_LIMIT_MAX_MESSAGES = 5  # max messages per window per user
@@ -82,6 +182,19 @@ USER_RATE_LIMIT_MAX_MESSAGES = 5  # max messages per window per user
 DEVICE_UPTIME_RECENT = 120  # Device is "recently started" if uptime < this
 DEVICE_UPTIME_GPS_WAIT = 60  # Wait time for GPS fix after device start
 
+# Ingestion queue (decouples the Meshtastic reader thread from message handling)
+# INGEST_OVERFLOW_POLICY: drop_lowest (evict a queued lower-priority message),
+# drop_newest (refuse the incoming message) or block (wait INGEST_BLOCK_TIMEOUT for room)
+INGEST_QUEUE_MAXSIZE = 100  # messages
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_OVERFLOW_POLICY = os.getenv("INGEST_OVERFLOW_POLICY", "drop_lowest")
+INGEST_BLOCK_TIMEOUT = 1.0  # seconds
+# Text packets seen again with the same (from, packet id) within
+# INGEST_DEDUP_TTL seconds are dropped before parsing (the catch-all receive
+# topic and mesh rebroadcasts deliver the same packet more than once)
+INGEST_DEDUP_TTL = 600  # seconds
+INGEST_DEDUP_MAX_ENTRIES = 2048
+
 # Worker intervals (seconds)
 WORKER_INTERVAL = 30
 NOTIFICATION_ANTI_SPAM_WINDOW = 60  # seconds
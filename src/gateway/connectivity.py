@@ -0,0 +1,186 @@
+"""Internet connectivity monitor with circuit breaker."""
+
+import time
+import logging
+import threading
+import requests
+from typing import Callable, List, Optional
+
+from .config import (
+    CONNECTIVITY_PROBE_URL,
+    CONNECTIVITY_PROBE_INTERVAL,
+    CONNECTIVITY_PROBE_TIMEOUT,
+    CONNECTIVITY_FAILURE_THRESHOLD,
+    CONNECTIVITY_RETRY_SECONDS,
+)
+from .http_client import HttpClient, get_client
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectivityMonitor:
+    """
+    Shared view of Internet reachability for OSM, Nominatim and #osmstatus.
+
+    Works as a circuit breaker:
+        - closed: online, requests go through
+        - open: offline, requests are refused immediately instead of waiting
+          for a network timeout
+        - half_open: retry_seconds after opening, a single trial (a probe or a
+          real request) is let through; its outcome closes or re-opens the circuit
+
+    Callers report the outcome of their own requests with record_success()
+    (any HTTP response, whatever the status code) and record_failure()
+    (timeouts and connection errors). A background thread started with
+    start() probes probe_url every probe_interval seconds while closed, and
+    performs the half-open probe while open, so state is fresh even when no
+    notes are being sent.
+
+    Listeners registered with add_listener() are called with True/False when
+    the circuit closes/opens.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        probe_url: str = CONNECTIVITY_PROBE_URL,
+        probe_interval: float = CONNECTIVITY_PROBE_INTERVAL,
+        probe_timeout: float = CONNECTIVITY_PROBE_TIMEOUT,
+        failure_threshold: int = CONNECTIVITY_FAILURE_THRESHOLD,
+        retry_seconds: float = CONNECTIVITY_RETRY_SECONDS,
+        http: Optional[HttpClient] = None,
+    ):
+        self.probe_url = probe_url
+        self.http = http or get_client()
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.failure_threshold = failure_threshold
+        self.retry_seconds = retry_seconds
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._last_success: Optional[float] = None
+        self._listeners: List[Callable[[bool], None]] = []
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def state(self) -> str:
+        """Current circuit state (closed, open or half_open)."""
+        with self._lock:
+            return self._state
+
+    def is_online(self) -> bool:
+        """Cached connectivity: True only while the circuit is closed."""
+        with self._lock:
+            return self._state == self.CLOSED
+
+    def allow_request(self) -> bool:
+        """
+        Whether an outgoing request should be attempted now.
+
+        Returns True while closed. While open, returns False until
+        retry_seconds have elapsed, then lets exactly one caller through as
+        the half-open trial.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            # A half-open trial that never reported back is retried after retry_seconds too
+            if now - self._opened_at >= self.retry_seconds:
+                self._state = self.HALF_OPEN
+                self._opened_at = now
+                return True
+            return False
+
+    def record_success(self):
+        """Report that a request reached the remote server."""
+        with self._lock:
+            self._consecutive_failures = 0
+            self._last_success = time.monotonic()
+            changed = self._state != self.CLOSED
+            self._state = self.CLOSED
+        if changed:
+            logger.info("Connectivity restored (circuit closed)")
+            self._notify(True)
+
+    def record_failure(self):
+        """Report a timeout or connection error."""
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == self.OPEN:
+                return
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                changed = self._state == self.CLOSED
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            else:
+                return
+        if changed:
+            logger.warning("Connectivity lost (circuit open)")
+            self._notify(False)
+
+    def add_listener(self, callback: Callable[[bool], None]):
+        """Register callback(online) for circuit state changes."""
+        self._listeners.append(callback)
+
+    def _notify(self, online: bool):
+        for callback in list(self._listeners):
+            try:
+                callback(online)
+            except Exception as e:
+                logger.error(f"Error in connectivity listener: {e}")
+
+    def probe(self) -> bool:
+        """Probe probe_url once and record the outcome. Returns True if reachable."""
+        try:
+            # The default probe URL is on the OSM API host: probes must not
+            # spend (or wait for) the note submission rate limit
+            self.http.head(self.probe_url, timeout=self.probe_timeout, allow_redirects=False, rate_limited=False)
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"Connectivity probe failed: {e}")
+            self.record_failure()
+            return False
+        self.record_success()
+        return True
+
+    def _probe_due(self) -> bool:
+        """Whether the background thread should probe now."""
+        with self._lock:
+            state = self._state
+            last_success = self._last_success
+        if state == self.CLOSED:
+            # Real requests that succeeded recently make a probe redundant
+            return last_success is None or time.monotonic() - last_success >= self.probe_interval
+        return self.allow_request()
+
+    def _run(self):
+        """Background probe loop."""
+        while not self._stop_event.is_set():
+            try:
+                if self._probe_due():
+                    self.probe()
+            except Exception as e:
+                logger.error(f"Error in connectivity monitor: {e}")
+            self._stop_event.wait(min(self.probe_interval, self.retry_seconds))
+
+    def start(self):
+        """Start the background probe thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="connectivity", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background probe thread."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.probe_timeout + 1.0)
+            self._thread = None
@@ -1,36 +1,45 @@
 """SQLite database management."""
 
 import sqlite3
+import hashlib
 import logging
+import threading
+import time
 from pathlib import Path
-from datetime import datetime
-from typing import Optional, List, Dict, Any
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Tuple
 from contextlib import contextmanager
 import pytz
 
-from .config import DB_PATH, DEDUP_LOCATION_PRECISION, DEDUP_TIME_BUCKET_SECONDS, OSM_MAX_RETRIES, TZ
+from .config import (
+    DB_PATH, DB_STATEMENT_CACHE_SIZE, DEDUP_LOCATION_PRECISION, DEDUP_TIME_BUCKET_SECONDS, TZ,
+)
 
 logger = logging.getLogger(__name__)
 
 
 class Database:
-    """Database manager for notes storage."""
+    """
+    Database manager for notes storage.
+
+    Connections are reused per thread: each thread (pubsub callback thread,
+    worker thread, main thread) gets its own long-lived SQLite connection,
+    configured once with the power-loss PRAGMAs and a prepared-statement cache.
+    SQLite connections must not be shared between threads, so one connection
+    per thread avoids both locking and per-call connect overhead.
+    """
 
     def __init__(self, db_path: Path = DB_PATH):
         self.db_path = db_path
+        self._local = threading.local()
+        # thread ident -> connection, so close() can release every connection
+        self._connections: Dict[int, sqlite3.Connection] = {}
+        self._connections_lock = threading.Lock()
         self._init_db()
 
     def _init_db(self):
         """Initialize database schema."""
         with self._get_connection() as conn:
-            # Configure SQLite for power loss tolerance
-            # WAL mode provides better concurrency and crash recovery
-            conn.execute("PRAGMA journal_mode=WAL")
-            # Full sync for data integrity (slower but safer for power loss)
-            conn.execute("PRAGMA synchronous=FULL")
-            # Checkpoint WAL periodically to prevent it from growing too large
-            conn.execute("PRAGMA wal_autocheckpoint=1000")
-            
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS notes (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -46,7 +55,13 @@ class Database:
                     osm_note_url TEXT,
                     sent_at TIMESTAMP,
                     last_error TEXT,
-                    notified_sent INTEGER DEFAULT 0
+                    notified_sent INTEGER DEFAULT 0,
+                    dedup_key TEXT,
+                    notified_failed INTEGER DEFAULT 0,
+                    retry_count INTEGER DEFAULT 0,
+                    next_attempt_at REAL,
+                    address TEXT,
+                    submit_started_at REAL
                 )
             """)
             conn.execute("""
@@ -74,10 +89,14 @@ class Database:
                 )
             """)
             conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_notes_node_id ON notes(node_id)
+                CREATE TABLE IF NOT EXISTS geocode_cache (
+                    cell TEXT PRIMARY KEY,
+                    address TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
             """)
             conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_notes_status ON notes(status)
+                CREATE INDEX IF NOT EXISTS idx_notes_node_id ON notes(node_id)
             """)
             conn.execute("""
                 CREATE INDEX IF NOT EXISTS idx_notes_created_at ON notes(created_at)
@@ -85,37 +104,213 @@ class Database:
             conn.execute("""
                 CREATE INDEX IF NOT EXISTS idx_notes_node_created ON notes(node_id, created_at)
             """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_notes_node_status ON notes(node_id, status)
+            """)
+            self._migrate_dedup_key(conn)
+            self._migrate_failed_status(conn)
+            self._ensure_column(conn, "notes", "retry_count", "INTEGER DEFAULT 0")
+            self._ensure_column(conn, "notes", "next_attempt_at", "REAL")
+            self._ensure_column(conn, "notes", "address", "TEXT")
+            self._ensure_column(conn, "notes", "submit_started_at", "REAL")
+            # Partial indexes: each worker query only touches live rows, so
+            # sent/failed history does not slow the queue down. They replace
+            # the old idx_notes_status, which the planner preferred even
+            # though it meant scanning and sorting every row of a status.
+            conn.execute("DROP INDEX IF EXISTS idx_notes_status")
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_notes_pending
+                ON notes(created_at) WHERE status = 'pending'
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_notes_sent_unnotified
+                ON notes(sent_at) WHERE status = 'sent' AND notified_sent = 0
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_notes_failed_unnotified
+                ON notes(created_at) WHERE status = 'failed' AND notified_failed = 0
+            """)
+            self._init_queue_sequence(conn)
             conn.commit()
             logger.info(f"Database initialized at {self.db_path}")
 
-    @contextmanager
-    def _get_connection(self):
+    def _ensure_column(self, conn: sqlite3.Connection, table: str, column: str, definition: str) -> bool:
+        """Add a column to an existing table if missing. Returns True if it was added."""
+        columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column in columns:
+            return False
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        logger.info(f"Added column {table}.{column}")
+        return True
+
+    def _migrate_dedup_key(self, conn: sqlite3.Connection):
         """
-        Get database connection with proper error handling and power loss tolerance.
-        
+        Add the dedup_key column and its unique index, backfilling old rows.
+
+        Rows that already collide with an earlier row (duplicates that slipped
+        through before the index existed) keep a NULL key.
+        """
+        added = self._ensure_column(conn, "notes", "dedup_key", "TEXT")
+        conn.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_notes_dedup_key ON notes(dedup_key)
+        """)
+        if not added:
+            return
+        cursor = conn.execute("""
+            SELECT id, node_id, text_normalized, lat, lon,
+                   CAST(strftime('%s', created_at) AS INTEGER) AS created_epoch
+            FROM notes
+            WHERE dedup_key IS NULL
+            ORDER BY id
+        """)
+        rows = [
+            (
+                self.dedup_key(
+                    row["node_id"],
+                    row["text_normalized"],
+                    row["lat"],
+                    row["lon"],
+                    int((row["created_epoch"] or 0) / DEDUP_TIME_BUCKET_SECONDS),
+                ),
+                row["id"],
+            )
+            for row in cursor.fetchall()
+        ]
+        conn.executemany("UPDATE OR IGNORE notes SET dedup_key = ? WHERE id = ?", rows)
+        if rows:
+            logger.info(f"Backfilled dedup_key for {len(rows)} notes")
+
+    def _migrate_failed_status(self, conn: sqlite3.Connection):
+        """
+        Add the notified_failed column and move dead notes to status 'failed'.
+
+        Before the 'failed' status existed, notes that exhausted their retries
+        stayed 'pending' with a "Falló después de N intentos" error.
+        """
+        if not self._ensure_column(conn, "notes", "notified_failed", "INTEGER DEFAULT 0"):
+            return
+        cursor = conn.execute("""
+            UPDATE notes
+            SET status = 'failed'
+            WHERE status = 'pending'
+              AND last_error LIKE 'Falló después de %'
+        """)
+        if cursor.rowcount > 0:
+            logger.info(f"Marked {cursor.rowcount} exhausted pending notes as failed")
+
+    def _init_queue_sequence(self, conn: sqlite3.Connection):
+        """
+        Create the local_queue_id counter, or move it past existing IDs.
+
+        The counter is set to max(stored value, highest existing Q-NNNN), so
+        databases created before the counter existed, restored backups and
+        notes written by the old COUNT-based allocator never make it hand
+        out an ID that is already taken.
+        """
+        cursor = conn.execute("""
+            SELECT COALESCE(MAX(CAST(SUBSTR(local_queue_id, 3) AS INTEGER)), 0) AS last_seq
+            FROM notes
+            WHERE local_queue_id LIKE 'Q-%'
+        """)
+        last_seq = cursor.fetchone()["last_seq"]
+        conn.execute("""
+            INSERT INTO system_state (key, value, updated_at)
+            VALUES ('note_queue_seq', ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(key) DO UPDATE SET
+                value = excluded.value,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE CAST(value AS INTEGER) < CAST(excluded.value AS INTEGER)
+        """, (str(last_seq),))
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open a new connection configured for power loss tolerance.
+
         Configures SQLite with:
         - WAL mode for better concurrency and crash recovery
         - FULL synchronous mode for data integrity during power loss
+        - Periodic WAL checkpoints to prevent the WAL from growing too large
         - Proper timeout for busy database handling
+
+        PRAGMAs are applied once here, not on every query.
         """
-        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        # check_same_thread=False only so close() can release connections
+        # owned by other threads at shutdown; each connection is still used
+        # by a single thread (see _get_connection).
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=10.0,
+            check_same_thread=False,
+            cached_statements=DB_STATEMENT_CACHE_SIZE,
+        )
         conn.row_factory = sqlite3.Row
-        
-        # Configure for power loss tolerance (if not already set)
         try:
             conn.execute("PRAGMA journal_mode=WAL")
             conn.execute("PRAGMA synchronous=FULL")
+            conn.execute("PRAGMA wal_autocheckpoint=1000")
         except sqlite3.Error:
             pass  # May fail if database is locked, that's OK
-        
+        return conn
+
+    def _thread_connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.depth = 0
+            with self._connections_lock:
+                self._prune_dead_connections()
+                self._connections[threading.get_ident()] = conn
+        return conn
+
+    def _prune_dead_connections(self):
+        """Close connections owned by threads that have exited (lock held)."""
+        alive = {t.ident for t in threading.enumerate()}
+        for ident in [i for i in self._connections if i not in alive]:
+            try:
+                self._connections.pop(ident).close()
+            except sqlite3.Error:
+                pass
+
+    @contextmanager
+    def _get_connection(self):
+        """
+        Get the calling thread's database connection with proper error handling.
+
+        The connection stays open after the block ends. Any transaction the
+        block leaves open (no commit) is rolled back on exit, which matches
+        the previous connect-per-call behaviour where closing discarded
+        uncommitted work. Nested blocks share the outer block's transaction.
+        """
+        conn = self._thread_connection()
+        self._local.depth += 1
         try:
             yield conn
         except sqlite3.Error as e:
             logger.error(f"Database error: {e}")
             conn.rollback()
             raise
+        except BaseException:
+            conn.rollback()
+            raise
         finally:
-            conn.close()
+            self._local.depth -= 1
+            if self._local.depth == 0 and conn.in_transaction:
+                conn.rollback()
+
+    def close(self):
+        """Close every pooled connection (call on shutdown)."""
+        with self._connections_lock:
+            for conn in self._connections.values():
+                try:
+                    conn.close()
+                except sqlite3.Error as e:
+                    logger.debug(f"Error closing database connection: {e}")
+            self._connections.clear()
+        # Connections of other threads are closed; make sure this thread
+        # reopens lazily if the instance is used again.
+        self._local = threading.local()
 
     def create_note(
         self,
@@ -124,6 +319,7 @@ class Database:
         lon: float,
         text_original: str,
         text_normalized: str,
+        time_bucket: Optional[int] = None,
     ) -> Optional[str]:
         """
         Create a new note in the database.
@@ -134,70 +330,200 @@ class Database:
             lon: Longitude coordinate
             text_original: Original message text
             text_normalized: Normalized text for deduplication
+            time_bucket: Deduplication time bucket (defaults to the current one)
             
         Returns:
             local_queue_id (e.g., "Q-0001") if successful, None on error
             
         Note:
-            Automatically generates sequential queue IDs. If collision occurs,
-            retries with higher number.
+            Queue IDs come from a persistent monotonic counter in system_state,
+            incremented in the same write transaction as the INSERT. IDs are
+            never reused (even after rows are deleted) and stay unique under
+            concurrent inserts, at O(1) cost regardless of queue size.
+
+            The note is always created. Use create_note_deduplicated() to
+            skip duplicates atomically.
+        """
+        local_queue_id, _ = self._insert_note(
+            node_id, lat, lon, text_original, text_normalized, time_bucket,
+            skip_duplicate=False,
+        )
+        return local_queue_id
+
+    def create_note_deduplicated(
+        self,
+        node_id: str,
+        lat: float,
+        lon: float,
+        text_original: str,
+        text_normalized: str,
+        time_bucket: int,
+    ) -> Tuple[Optional[str], bool]:
         """
-        # Generate local_queue_id
+        Create a note unless an equivalent one already exists.
+
+        The duplicate check and the INSERT are a single
+        INSERT ... ON CONFLICT(dedup_key) step, so two concurrent copies of
+        the same report cannot both be queued.
+
+        Returns:
+            Tuple of (local_queue_id, is_duplicate). local_queue_id is None
+            when the note is a duplicate or on error.
+        """
+        return self._insert_note(
+            node_id, lat, lon, text_original, text_normalized, time_bucket,
+            skip_duplicate=True,
+        )
+
+    def _insert_note(
+        self,
+        node_id: str,
+        lat: float,
+        lon: float,
+        text_original: str,
+        text_normalized: str,
+        time_bucket: Optional[int],
+        skip_duplicate: bool,
+    ) -> Tuple[Optional[str], bool]:
+        """Insert a note row. Returns (local_queue_id, is_duplicate)."""
+        if time_bucket is None:
+            time_bucket = int(time.time() / DEDUP_TIME_BUCKET_SECONDS)
+        dedup_key = self.dedup_key(node_id, text_normalized, lat, lon, time_bucket)
+
+        if skip_duplicate:
+            dedup_value_sql = "?"
+            conflict_sql = "ON CONFLICT(dedup_key) DO NOTHING"
+            dedup_params: Tuple[Any, ...] = (dedup_key,)
+        else:
+            # Forced insert: claim the key only if nobody holds it yet
+            dedup_value_sql = "CASE WHEN EXISTS (SELECT 1 FROM notes WHERE dedup_key = ?) THEN NULL ELSE ? END"
+            conflict_sql = ""
+            dedup_params = (dedup_key, dedup_key)
+
         with self._get_connection() as conn:
-            cursor = conn.execute("SELECT COUNT(*) as count FROM notes")
-            count = cursor.fetchone()["count"]
-            local_queue_id = f"Q-{count + 1:04d}"
+            for attempt in range(2):
+                try:
+                    # Take the write lock up front so the counter and the INSERT
+                    # are one atomic step
+                    conn.execute("BEGIN IMMEDIATE")
+                    local_queue_id = self._next_queue_id(conn)
+                    cursor = conn.execute(f"""
+                        INSERT INTO notes (
+                            local_queue_id, node_id, created_at, lat, lon,
+                            text_original, text_normalized, status, dedup_key
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', {dedup_value_sql})
+                        {conflict_sql}
+                    """, (
+                        local_queue_id,
+                        node_id,
+                        datetime.utcnow(),
+                        lat,
+                        lon,
+                        text_original,
+                        text_normalized,
+                    ) + dedup_params)
+                    if cursor.rowcount == 0:
+                        # Duplicate: give the queue number back
+                        conn.rollback()
+                        logger.info(f"Duplicate note from node {node_id} ignored")
+                        return None, True
+                    conn.commit()
+                    break
+                except sqlite3.IntegrityError as e:
+                    conn.rollback()
+                    if attempt == 0 and "notes.local_queue_id" in str(e):
+                        # Counter behind the notes table (e.g. a note written
+                        # since startup by another allocator): resync, retry once
+                        logger.warning(f"Queue ID {local_queue_id} already taken, resyncing the counter")
+                        self._init_queue_sequence(conn)
+                        conn.commit()
+                        continue
+                    logger.error(f"Could not create note for node {node_id}: {e}")
+                    return None, False
+            logger.info(f"Created note {local_queue_id} for node {node_id}")
+            return local_queue_id, False
 
-            try:
-                conn.execute("""
-                    INSERT INTO notes (
-                        local_queue_id, node_id, created_at, lat, lon,
-                        text_original, text_normalized, status
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, 'pending')
-                """, (
-                    local_queue_id,
-                    node_id,
-                    datetime.utcnow(),
-                    lat,
-                    lon,
-                    text_original,
-                    text_normalized,
-                ))
-                conn.commit()
-                logger.info(f"Created note {local_queue_id} for node {node_id}")
-                return local_queue_id
-            except sqlite3.IntegrityError:
-                logger.warning(f"Duplicate local_queue_id {local_queue_id}, retrying...")
-                # Retry with higher number
-                cursor = conn.execute("SELECT COUNT(*) as count FROM notes")
-                count = cursor.fetchone()["count"]
-                local_queue_id = f"Q-{count + 100:04d}"
-                conn.execute("""
-                    INSERT INTO notes (
-                        local_queue_id, node_id, created_at, lat, lon,
-                        text_original, text_normalized, status
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, 'pending')
-                """, (
-                    local_queue_id,
-                    node_id,
-                    datetime.utcnow(),
-                    lat,
-                    lon,
-                    text_original,
-                    text_normalized,
-                ))
-                conn.commit()
-                return local_queue_id
+    @staticmethod
+    def dedup_key(
+        node_id: str,
+        text_normalized: str,
+        lat: float,
+        lon: float,
+        time_bucket: int,
+    ) -> str:
+        """
+        Build the deduplication key for a note.
+
+        Hash of node_id, normalized text, coordinates rounded to
+        DEDUP_LOCATION_PRECISION decimals and the time bucket.
+        """
+        raw = "|".join((
+            node_id,
+            text_normalized,
+            # + 0.0 folds -0.0 into 0.0 so both round to the same key
+            f"{round(lat, DEDUP_LOCATION_PRECISION) + 0.0:.{DEDUP_LOCATION_PRECISION}f}",
+            f"{round(lon, DEDUP_LOCATION_PRECISION) + 0.0:.{DEDUP_LOCATION_PRECISION}f}",
+            str(time_bucket),
+        ))
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _next_queue_id(self, conn: sqlite3.Connection) -> str:
+        """Allocate the next local_queue_id (caller holds the write transaction)."""
+        conn.execute("""
+            UPDATE system_state
+            SET value = CAST(value AS INTEGER) + 1,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE key = 'note_queue_seq'
+        """)
+        cursor = conn.execute("""
+            SELECT value FROM system_state
+            WHERE key = 'note_queue_seq'
+        """)
+        return f"Q-{int(cursor.fetchone()['value']):04d}"
 
     def get_pending_notes(self, limit: int = 100) -> List[Dict[str, Any]]:
-        """Get pending notes ordered by created_at."""
+        """
+        Get pending notes that are due for an attempt, ordered by created_at.
+
+        Notes waiting for a retry (next_attempt_at in the future) are skipped.
+        """
         with self._get_connection() as conn:
             cursor = conn.execute("""
                 SELECT * FROM notes
                 WHERE status = 'pending'
+                  AND (next_attempt_at IS NULL OR next_attempt_at <= ?)
                 ORDER BY created_at ASC
                 LIMIT ?
-            """, (limit,))
+            """, (time.time(), limit))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_pending_notes_fair(self, limit: int = 100, fresh_seconds: float = 0) -> List[Dict[str, Any]]:
+        """
+        Get due pending notes in fair order across nodes.
+
+        Notes are interleaved round-robin by node: every node's oldest note,
+        then every node's second oldest, and so on (ties by created_at). With
+        fresh_seconds > 0, notes created within that many seconds come first.
+        """
+        fresh_since = datetime.utcnow() - timedelta(seconds=fresh_seconds) if fresh_seconds > 0 else None
+        with self._get_connection() as conn:
+            # Rank only (id, created_at) so the window sort does not carry whole rows
+            cursor = conn.execute("""
+                WITH ranked AS (
+                    SELECT id, created_at,
+                           ROW_NUMBER() OVER (PARTITION BY node_id ORDER BY created_at) AS node_rank
+                    FROM notes INDEXED BY idx_notes_pending
+                    WHERE status = 'pending'
+                      AND (next_attempt_at IS NULL OR next_attempt_at <= ?)
+                ),
+                batch AS (
+                    SELECT id, node_rank FROM ranked
+                    ORDER BY (? IS NOT NULL AND created_at >= ?) DESC, node_rank, created_at
+                    LIMIT ?
+                )
+                SELECT notes.* FROM batch JOIN notes ON notes.id = batch.id
+                ORDER BY (? IS NOT NULL AND notes.created_at >= ?) DESC, batch.node_rank, notes.created_at
+            """, (time.time(), fresh_since, fresh_since, limit, fresh_since, fresh_since))
             return [dict(row) for row in cursor.fetchall()]
 
     def get_note_by_queue_id(self, local_queue_id: str) -> Optional[Dict[str, Any]]:
@@ -216,33 +542,104 @@ class Database:
         osm_note_id: int,
         osm_note_url: str,
     ):
-        """Mark note as sent with OSM details."""
+        """Mark note as sent with OSM details (closing its submission journal entry)."""
         with self._get_connection() as conn:
             conn.execute("""
                 UPDATE notes
                 SET status = 'sent',
                     osm_note_id = ?,
                     osm_note_url = ?,
-                    sent_at = ?
+                    sent_at = ?,
+                    submit_started_at = NULL
                 WHERE local_queue_id = ?
             """, (osm_note_id, osm_note_url, datetime.utcnow(), local_queue_id))
             conn.commit()
             logger.info(f"Marked note {local_queue_id} as sent (OSM #{osm_note_id})")
 
-    def update_note_error(self, local_queue_id: str, error: str, retry_count: Optional[int] = None):
-        """Update note with error message and optionally retry count."""
+    def update_note_error(
+        self,
+        local_queue_id: str,
+        error: str,
+        retry_count: Optional[int] = None,
+        next_attempt_at: Optional[float] = None,
+    ):
+        """
+        Update note with error message and optionally its retry schedule.
+
+        Args:
+            local_queue_id: Note to update
+            error: Last error message
+            retry_count: Failed attempts so far (stored if given)
+            next_attempt_at: Unix timestamp before which the note is not retried
+        """
         with self._get_connection() as conn:
             if retry_count is not None:
-                # Store retry count in error message for now (could add retry_count column later)
-                error_with_retry = f"{error} (intento {retry_count}/{OSM_MAX_RETRIES})"
+                conn.execute("""
+                    UPDATE notes
+                    SET last_error = ?,
+                        retry_count = ?,
+                        next_attempt_at = ?
+                    WHERE local_queue_id = ?
+                """, (error, retry_count, next_attempt_at, local_queue_id))
             else:
-                error_with_retry = error
+                conn.execute("""
+                    UPDATE notes
+                    SET last_error = ?,
+                        next_attempt_at = COALESCE(?, next_attempt_at)
+                    WHERE local_queue_id = ?
+                """, (error, next_attempt_at, local_queue_id))
+            conn.commit()
+
+    def journal_submission(self, local_queue_id: str, started_at: float):
+        """
+        Record that a note is about to be POSTed to OSM.
+
+        Committed (and, with synchronous=FULL, on disk) before the request is
+        sent, so a note still journaled after a crash or timeout has an
+        unknown outcome and must be reconciled with OSM before resubmitting.
+        """
+        with self._get_connection() as conn:
+            conn.execute("""
+                UPDATE notes SET submit_started_at = ? WHERE local_queue_id = ?
+            """, (started_at, local_queue_id))
+            conn.commit()
+
+    def clear_submission(self, local_queue_id: str):
+        """Close a note's journal entry once OSM definitely did not create it."""
+        with self._get_connection() as conn:
+            conn.execute("""
+                UPDATE notes SET submit_started_at = NULL WHERE local_queue_id = ?
+            """, (local_queue_id,))
+            conn.commit()
+
+    def count_unconfirmed_submissions(self) -> int:
+        """Pending notes whose last POST has an unknown outcome."""
+        with self._get_connection() as conn:
+            cursor = conn.execute("""
+                SELECT COUNT(*) AS count FROM notes INDEXED BY idx_notes_pending
+                WHERE status = 'pending' AND submit_started_at IS NOT NULL
+            """)
+            return cursor.fetchone()["count"]
+
+    def mark_note_failed(self, local_queue_id: str, error: str):
+        """Mark note as permanently failed (no more retries)."""
+        with self._get_connection() as conn:
             conn.execute("""
                 UPDATE notes
-                SET last_error = ?
+                SET status = 'failed',
+                    last_error = ?
                 WHERE local_queue_id = ?
             """, (error, local_queue_id))
             conn.commit()
+            logger.warning(f"Marked note {local_queue_id} as failed: {error}")
+
+    def set_note_address(self, local_queue_id: str, address: str):
+        """Store the reverse-geocoded address of a note."""
+        with self._get_connection() as conn:
+            conn.execute("""
+                UPDATE notes SET address = ? WHERE local_queue_id = ?
+            """, (address, local_queue_id))
+            conn.commit()
 
     def mark_notified_sent(self, local_queue_id: str):
         """Mark note as notified (sent notification sent)."""
@@ -263,65 +660,57 @@ class Database:
         
         Returns:
             Dictionary with 'total', 'today', 'queue', and 'timezone' keys.
+
+        Note:
+            "Today" is the current calendar day in the given timezone. Its
+            bounds are converted to UTC once (notes are stored in UTC) and
+            counted with a range scan on idx_notes_node_created, so the cost
+            does not grow with the node's history.
         """
         if timezone is None:
             timezone = TZ
-        
-        with self._get_connection() as conn:
-            # Total count
-            cursor = conn.execute("""
-                SELECT COUNT(*) as total FROM notes WHERE node_id = ?
-            """, (node_id,))
-            total = cursor.fetchone()["total"]
 
-            # Today count (using server timezone)
-            # Notes are stored in UTC, so we need to convert to server timezone
-            tz = pytz.timezone(timezone)
-            now_local = datetime.now(tz)
-            today_local = now_local.strftime("%Y-%m-%d")
-            
-            # Get all notes for this node and filter by date in server timezone
-            cursor = conn.execute("""
-                SELECT created_at FROM notes WHERE node_id = ?
-            """, (node_id,))
-            notes = cursor.fetchall()
-            
-            today_count = 0
-            for note_row in notes:
-                # Parse UTC datetime from database
-                # SQLite stores datetime as string, format: 'YYYY-MM-DD HH:MM:SS.ffffff'
-                created_str = note_row["created_at"]
-                try:
-                    # Try parsing with timezone info first
-                    if 'Z' in created_str or '+' in created_str or created_str.endswith('UTC'):
-                        created_utc = datetime.fromisoformat(created_str.replace('Z', '+00:00'))
-                    else:
-                        # No timezone info, assume UTC (as stored by datetime.utcnow())
-                        created_utc = datetime.fromisoformat(created_str)
-                        created_utc = pytz.UTC.localize(created_utc)
-                    
-                    # Convert to server timezone
-                    created_local = created_utc.astimezone(tz)
-                    if created_local.strftime("%Y-%m-%d") == today_local:
-                        today_count += 1
-                except (ValueError, AttributeError) as e:
-                    logger.warning(f"Error parsing date {created_str}: {e}")
-                    continue
-
-            # Queue size
+        day_start_utc, day_end_utc = self._local_day_bounds_utc(timezone)
+
+        with self._get_connection() as conn:
             cursor = conn.execute("""
-                SELECT COUNT(*) as queue FROM notes
-                WHERE node_id = ? AND status = 'pending'
-            """, (node_id,))
-            queue = cursor.fetchone()["queue"]
+                SELECT
+                    (SELECT COUNT(*) FROM notes
+                     WHERE node_id = ?) AS total,
+                    (SELECT COUNT(*) FROM notes
+                     WHERE node_id = ? AND created_at >= ? AND created_at < ?) AS today,
+                    (SELECT COUNT(*) FROM notes
+                     WHERE node_id = ? AND status = 'pending') AS queue
+            """, (node_id, node_id, day_start_utc, day_end_utc, node_id))
+            row = cursor.fetchone()
 
             return {
-                "total": total,
-                "today": today_count,
-                "queue": queue,
+                "total": row["total"],
+                "today": row["today"],
+                "queue": row["queue"],
                 "timezone": timezone,
             }
 
+    @staticmethod
+    def _local_day_bounds_utc(timezone: str) -> Tuple[str, str]:
+        """
+        Return the current local day as a [start, end) range of UTC timestamps.
+
+        Values use the 'YYYY-MM-DD HH:MM:SS' form SQLite stores for
+        created_at, so they compare correctly as strings.
+        """
+        tz = pytz.timezone(timezone)
+        today_local = datetime.now(tz).date()
+        # localize() (not replace(tzinfo=...)) picks the right UTC offset,
+        # including on DST transition days
+        start_local = tz.localize(datetime.combine(today_local, datetime.min.time()))
+        end_local = tz.localize(datetime.combine(today_local + timedelta(days=1), datetime.min.time()))
+        fmt = "%Y-%m-%d %H:%M:%S"
+        return (
+            start_local.astimezone(pytz.UTC).strftime(fmt),
+            end_local.astimezone(pytz.UTC).strftime(fmt),
+        )
+
     def get_node_notes(
         self,
         node_id: str,
@@ -346,10 +735,28 @@ class Database:
                 """, (node_id, limit))
             return [dict(row) for row in cursor.fetchall()]
 
+    def get_next_attempt_at(self) -> Optional[float]:
+        """
+        Get the earliest future retry time among pending notes.
+
+        Returns:
+            Unix timestamp of the next scheduled retry, or None if no pending
+            note is waiting for one (notes already due are not considered).
+        """
+        with self._get_connection() as conn:
+            cursor = conn.execute("""
+                SELECT MIN(next_attempt_at) AS next_at FROM notes INDEXED BY idx_notes_pending
+                WHERE status = 'pending' AND next_attempt_at > ?
+            """, (time.time(),))
+            return cursor.fetchone()["next_at"]
+
     def get_total_queue_size(self) -> int:
         """Get total pending queue size."""
         with self._get_connection() as conn:
-            cursor = conn.execute("SELECT COUNT(*) as count FROM notes WHERE status = 'pending'")
+            cursor = conn.execute("""
+                SELECT COUNT(*) as count FROM notes INDEXED BY idx_notes_pending
+                WHERE status = 'pending'
+            """)
             return cursor.fetchone()["count"]
 
     def check_duplicate(
@@ -360,30 +767,13 @@ class Database:
         lon: float,
         time_bucket: int,
     ) -> bool:
-        """Check if a note is a duplicate based on deduplication rules."""
-        # Round coordinates
-        lat_rounded = round(lat, DEDUP_LOCATION_PRECISION)
-        lon_rounded = round(lon, DEDUP_LOCATION_PRECISION)
-
+        """Check if a note is a duplicate based on deduplication rules (indexed lookup)."""
+        dedup_key = self.dedup_key(node_id, text_normalized, lat, lon, time_bucket)
         with self._get_connection() as conn:
-            # Check for duplicates in the same time bucket
             cursor = conn.execute("""
-                SELECT COUNT(*) as count FROM notes
-                WHERE node_id = ?
-                  AND text_normalized = ?
-                  AND ABS(lat - ?) < 0.0001
-                  AND ABS(lon - ?) < 0.0001
-                  AND CAST(strftime('%s', created_at) / ? AS INTEGER) = ?
-            """, (
-                node_id,
-                text_normalized,
-                lat_rounded,
-                lon_rounded,
-                DEDUP_TIME_BUCKET_SECONDS,
-                time_bucket,
-            ))
-            count = cursor.fetchone()["count"]
-            return count > 0
+                SELECT 1 FROM notes WHERE dedup_key = ? LIMIT 1
+            """, (dedup_key,))
+            return cursor.fetchone() is not None
 
     def get_pending_for_notification(self) -> List[Dict[str, Any]]:
         """Get pending notes that need sent notification."""
@@ -398,17 +788,23 @@ class Database:
     def get_failed_notes_for_notification(self) -> List[Dict[str, Any]]:
         """Get notes that failed after max retries and need error notification."""
         with self._get_connection() as conn:
-            # Get notes with errors that mention max retries
             cursor = conn.execute("""
                 SELECT * FROM notes
-                WHERE status = 'pending' 
-                  AND last_error IS NOT NULL
-                  AND last_error LIKE '%intento%/%'
-                  AND notified_sent = 0
+                WHERE status = 'failed' AND notified_failed = 0
                 ORDER BY created_at ASC
             """)
             return [dict(row) for row in cursor.fetchall()]
 
+    def mark_notified_failed(self, local_queue_id: str):
+        """Mark note as notified (failure notification sent)."""
+        with self._get_connection() as conn:
+            conn.execute("""
+                UPDATE notes
+                SET notified_failed = 1
+                WHERE local_queue_id = ?
+            """, (local_queue_id,))
+            conn.commit()
+
     def save_position(self, node_id: str, lat: float, lon: float, received_at: float, seen_count: int = 1):
         """Save or update position in persistent cache."""
         with self._get_connection() as conn:
@@ -424,6 +820,29 @@ class Database:
             """, (node_id, lat, lon, received_at, seen_count))
             conn.commit()
 
+    def save_positions(self, positions: List[Tuple[str, float, float, float, int]]):
+        """
+        Save a batch of positions in a single transaction (write-behind flush).
+
+        Args:
+            positions: (node_id, lat, lon, received_at, seen_count) tuples.
+                seen_count is taken as-is, since the in-memory cache is authoritative.
+        """
+        if not positions:
+            return
+        with self._get_connection() as conn:
+            conn.executemany("""
+                INSERT INTO position_cache (node_id, lat, lon, received_at, seen_count, updated_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(node_id) DO UPDATE SET
+                    lat = excluded.lat,
+                    lon = excluded.lon,
+                    received_at = excluded.received_at,
+                    seen_count = excluded.seen_count,
+                    updated_at = CURRENT_TIMESTAMP
+            """, positions)
+            conn.commit()
+
     def get_position(self, node_id: str) -> Optional[Dict[str, Any]]:
         """Get position from persistent cache."""
         with self._get_connection() as conn:
@@ -444,19 +863,83 @@ class Database:
             """)
             return {row["node_id"]: dict(row) for row in cursor.fetchall()}
 
-    def cleanup_old_positions(self, max_age_seconds: float = 86400):
-        """Remove positions older than max_age_seconds (default: 24 hours)."""
+    def cleanup_old_positions(self, max_age_seconds: float = 86400) -> int:
+        """
+        Remove positions older than max_age_seconds (default: 24 hours).
+
+        Returns:
+            Number of positions removed
+        """
         import time
         cutoff_time = time.time() - max_age_seconds
         with self._get_connection() as conn:
-            conn.execute("""
+            cursor = conn.execute("""
                 DELETE FROM position_cache
                 WHERE received_at < ?
             """, (cutoff_time,))
             conn.commit()
-            deleted = conn.total_changes
+            # rowcount of this DELETE: total_changes is cumulative on the pooled connection
+            deleted = cursor.rowcount
             if deleted > 0:
                 logger.debug(f"Cleaned up {deleted} old positions from cache")
+            return deleted
+
+    def load_geocode_cache(self, min_created_at: float, limit: int) -> List[Tuple[str, str, float]]:
+        """
+        Load cached reverse-geocode results, oldest first.
+
+        Args:
+            min_created_at: Entries created before this timestamp are skipped
+            limit: Maximum number of (most recent) entries to return
+
+        Returns:
+            (cell, address, created_at) tuples ordered by created_at
+        """
+        with self._get_connection() as conn:
+            cursor = conn.execute("""
+                SELECT cell, address, created_at FROM (
+                    SELECT cell, address, created_at FROM geocode_cache
+                    WHERE created_at >= ?
+                    ORDER BY created_at DESC
+                    LIMIT ?
+                ) ORDER BY created_at
+            """, (min_created_at, limit))
+            return [(row["cell"], row["address"], row["created_at"]) for row in cursor.fetchall()]
+
+    def save_geocode(self, cell: str, address: str, created_at: float):
+        """Save or replace a reverse-geocode result for a coordinate cell."""
+        with self._get_connection() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO geocode_cache (cell, address, created_at)
+                VALUES (?, ?, ?)
+            """, (cell, address, created_at))
+            conn.commit()
+
+    def delete_geocodes(self, cells: List[str]):
+        """Remove reverse-geocode results (evicted or expired cells)."""
+        if not cells:
+            return
+        with self._get_connection() as conn:
+            conn.executemany("DELETE FROM geocode_cache WHERE cell = ?", [(cell,) for cell in cells])
+            conn.commit()
+
+    def cleanup_geocode_cache(self, min_created_at: float, keep: int) -> int:
+        """
+        Remove expired entries and all but the keep most recent ones.
+
+        Returns:
+            Number of rows deleted
+        """
+        with self._get_connection() as conn:
+            cursor = conn.execute("""
+                DELETE FROM geocode_cache
+                WHERE created_at < ?
+                   OR cell NOT IN (
+                       SELECT cell FROM geocode_cache ORDER BY created_at DESC LIMIT ?
+                   )
+            """, (min_created_at, keep))
+            conn.commit()
+            return cursor.rowcount
 
     def get_user_language(self, node_id: str) -> str:
         """Get user's preferred language (default: 'es')."""
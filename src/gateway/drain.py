@@ -0,0 +1,156 @@
+"""Backlog drain mode for the OSM worker loop."""
+
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from .config import (
+    OSM_DRAIN_ENTER_BACKLOG,
+    OSM_DRAIN_EXIT_BACKLOG,
+    OSM_DRAIN_BATCH_SIZE,
+    OSM_DRAIN_RATE_WINDOW,
+    OSM_DRAIN_LOG_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class BacklogDrain:
+    """
+    Decide when the worker loop should drain a large backlog continuously.
+
+    The worker reports every pass with record_pass(sent, backlog). Drain mode
+    turns on when the backlog exceeds enter_backlog and off again once it is
+    down to exit_backlog (hysteresis, so the mode does not flap around one
+    threshold). While draining, the worker uses batch_size notes per pass and
+    starts the next pass as soon as one sends anything; the OSM rate
+    controller is what paces submissions.
+
+    Throughput is measured over the last window seconds of passes, and the
+    ETA is the current backlog divided by it.
+
+    Attributes:
+        normal_batch_size: Batch size outside drain mode
+    """
+
+    def __init__(
+        self,
+        normal_batch_size: int = 10,
+        enter_backlog: int = OSM_DRAIN_ENTER_BACKLOG,
+        exit_backlog: int = OSM_DRAIN_EXIT_BACKLOG,
+        drain_batch_size: int = OSM_DRAIN_BATCH_SIZE,
+        window: float = OSM_DRAIN_RATE_WINDOW,
+        log_interval: float = OSM_DRAIN_LOG_INTERVAL,
+    ):
+        self.normal_batch_size = normal_batch_size
+        self.enter_backlog = enter_backlog
+        self.exit_backlog = exit_backlog
+        self.drain_batch_size = drain_batch_size
+        self.window = window
+        self.log_interval = log_interval
+
+        self._lock = threading.Lock()
+        self._active = False
+        self._backlog = 0
+        # (time, notes sent) per pass within the window
+        self._passes: Deque[Tuple[float, int]] = deque()
+        self._started_at: Optional[float] = None
+        self._drained = 0
+        self._drains = 0
+        self._last_log = 0.0
+
+    @property
+    def active(self) -> bool:
+        """Whether drain mode is on."""
+        with self._lock:
+            return self._active
+
+    @property
+    def batch_size(self) -> int:
+        """Notes to take in the next pass."""
+        with self._lock:
+            return self.drain_batch_size if self._active else self.normal_batch_size
+
+    def record_pass(self, sent: int, backlog: int, now: Optional[float] = None) -> bool:
+        """
+        Record one worker pass and update the mode.
+
+        Args:
+            sent: Notes sent in the pass
+            backlog: Pending notes left after the pass
+
+        Returns:
+            True if drain mode is on for the next pass
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._passes.append((now, sent))
+            while self._passes and self._passes[0][0] < now - self.window:
+                self._passes.popleft()
+            self._backlog = backlog
+
+            if self._active:
+                self._drained += sent
+            if not self._active and backlog > self.enter_backlog:
+                self._active = True
+                self._started_at = now
+                self._drained = sent
+                self._drains += 1
+                self._last_log = now
+                logger.info(f"Backlog drain mode on: {backlog} notes pending")
+            elif self._active and backlog <= self.exit_backlog:
+                self._active = False
+                elapsed = now - (self._started_at or now)
+                logger.info(
+                    f"Backlog drain mode off: {self._drained} notes sent in {elapsed / 60:.1f} min, "
+                    f"{backlog} pending"
+                )
+            elif self._active and now - self._last_log >= self.log_interval:
+                self._last_log = now
+                rate = self._throughput(now)
+                eta = self._eta(now)
+                logger.info(
+                    f"Draining backlog: {backlog} pending, {rate * 60:.1f} notes/min"
+                    + (f", ETA {eta / 60:.0f} min" if eta is not None else "")
+                )
+            return self._active
+
+    def _throughput(self, now: float) -> float:
+        """Notes per second over the window. Caller holds _lock."""
+        # The oldest pass only marks the start: its notes were sent before it
+        if len(self._passes) < 2:
+            return 0.0
+        span = now - self._passes[0][0]
+        if span <= 0:
+            return 0.0
+        return sum(sent for _, sent in list(self._passes)[1:]) / span
+
+    def _eta(self, now: float) -> Optional[float]:
+        """Seconds to empty the backlog at the current throughput. Caller holds _lock."""
+        rate = self._throughput(now)
+        if self._backlog == 0:
+            return 0.0
+        return self._backlog / rate if rate > 0 else None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Snapshot of drain state.
+
+        Returns:
+            Dict with 'active', 'backlog', 'throughput' (notes/min over the
+            window), 'eta' (seconds, None while nothing is being sent),
+            'drained' (notes sent in the current or last drain) and 'drains'
+            (times drain mode turned on)
+        """
+        now = time.time()
+        with self._lock:
+            return {
+                "active": self._active,
+                "backlog": self._backlog,
+                "throughput": self._throughput(now) * 60,
+                "eta": self._eta(now),
+                "drained": self._drained,
+                "drains": self._drains,
+            }
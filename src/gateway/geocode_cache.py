@@ -0,0 +1,138 @@
+"""Persistent reverse-geocode cache keyed by quantised coordinates."""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple
+
+from .database import Database
+from .config import GEOCODE_CACHE_PRECISION, GEOCODE_CACHE_TTL, GEOCODE_CACHE_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+
+class GeocodeCache:
+    """
+    Reverse-geocode results cached per coordinate cell.
+
+    Coordinates are rounded to `precision` decimals, so reports from the same
+    block resolve to one cell and one Nominatim lookup. Lookups are served from
+    an in-memory LRU (no I/O); new results are written through to the
+    geocode_cache table and loaded back on startup.
+
+    Attributes:
+        db: Database used for persistence
+        precision: Decimal places kept from lat/lon for the cell key
+        ttl: Seconds an address stays valid
+        max_entries: Maximum number of cells kept (least recently used evicted)
+
+    Note:
+        Only successful lookups are cached; errors and "no address" results
+        are retried on the next call.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        precision: int = GEOCODE_CACHE_PRECISION,
+        ttl: float = GEOCODE_CACHE_TTL,
+        max_entries: int = GEOCODE_CACHE_MAX_ENTRIES,
+    ):
+        self.db = db
+        self.precision = precision
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, Tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expired = 0
+
+        self._load_from_db()
+
+    def _load_from_db(self):
+        """Drop stale rows and load the rest into memory."""
+        min_created_at = time.time() - self.ttl
+        try:
+            deleted = self.db.cleanup_geocode_cache(min_created_at, self.max_entries)
+            if deleted:
+                logger.debug(f"Removed {deleted} stale geocode cache entries")
+            for cell, address, created_at in self.db.load_geocode_cache(min_created_at, self.max_entries):
+                self._entries[cell] = (address, created_at)
+            if self._entries:
+                logger.info(f"Loaded {len(self._entries)} geocode cache entries from database")
+        except Exception as e:
+            logger.warning(f"Failed to load geocode cache from database: {e}")
+
+    def cell(self, lat: float, lon: float) -> str:
+        """Cache key for a coordinate pair."""
+        return f"{lat:.{self.precision}f},{lon:.{self.precision}f}"
+
+    def get(self, lat: float, lon: float) -> Optional[str]:
+        """Cached address for the cell containing (lat, lon), or None."""
+        cell = self.cell(lat, lon)
+        expired = False
+        with self._lock:
+            entry = self._entries.get(cell)
+            if entry is not None and time.time() - entry[1] > self.ttl:
+                del self._entries[cell]
+                self._expired += 1
+                expired = True
+                entry = None
+            if entry is None:
+                self._misses += 1
+            else:
+                self._entries.move_to_end(cell)
+                self._hits += 1
+
+        if expired:
+            self._delete([cell])
+        return entry[0] if entry else None
+
+    def put(self, lat: float, lon: float, address: str):
+        """Store the address for the cell containing (lat, lon)."""
+        cell = self.cell(lat, lon)
+        now = time.time()
+        evicted = []
+        with self._lock:
+            self._entries[cell] = (address, now)
+            self._entries.move_to_end(cell)
+            while len(self._entries) > self.max_entries:
+                old_cell, _ = self._entries.popitem(last=False)
+                evicted.append(old_cell)
+            self._evictions += len(evicted)
+
+        try:
+            self.db.save_geocode(cell, address, now)
+        except Exception as e:
+            logger.warning(f"Failed to persist geocode cache entry {cell}: {e}")
+        self._delete(evicted)
+
+    def _delete(self, cells):
+        try:
+            self.db.delete_geocodes(cells)
+        except Exception as e:
+            logger.warning(f"Failed to remove geocode cache entries: {e}")
+
+    def get_metrics(self) -> Dict[str, float]:
+        """
+        Snapshot of cache metrics.
+
+        Returns:
+            Dict with 'size', 'hits', 'misses', 'hit_ratio' (0.0 before any
+            lookup), 'evictions' and 'expired'.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "expired": self._expired,
+            }
@@ -1,20 +1,322 @@
-"""Reverse geocoding using OSM Nominatim API."""
+"""Reverse geocoding using OSM Nominatim API or a local boundaries file."""
 
-import time
+import json
+import math
 import logging
+import threading
 import requests
-from typing import Optional, Dict, Any
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, Union
 
-from .config import NOMINATIM_API_URL, NOMINATIM_RATE_LIMIT_SECONDS, NOMINATIM_TIMEOUT
+from .config import (
+    NOMINATIM_API_URL,
+    NOMINATIM_TIMEOUT,
+    OFFLINE_GEOCODER_GRID_DEGREES,
+    GEOCODER_NOMINATIM_FALLBACK,
+    GEOCODE_CACHE_PRECISION,
+)
+from .connectivity import ConnectivityMonitor
+from .geocode_cache import GeocodeCache
+from .http_client import HttpClient, get_client
 
 logger = logging.getLogger(__name__)
 
 
-class GeocodingService:
-    """Service for reverse geocoding coordinates to addresses."""
+def format_address(address: Dict[str, Any]) -> Optional[str]:
+    """
+    Build "barrio, localidad, ciudad, departamento, país" from address components.
+
+    Args:
+        address: Nominatim-style address dict (neighbourhood, suburb, district,
+            city, town, state, country, ...)
+
+    Returns:
+        Comma-separated address, or None if there are no usable components
+    """
+    # Build address string from components with detailed hierarchy
+    # Priority: neighbourhood/suburb > district/locality > city > state > country
+    parts = []
+
+    # Level 1: Most specific - neighbourhood/barrio
+    neighbourhood = (
+        address.get("neighbourhood") or
+        address.get("suburb") or
+        address.get("quarter") or
+        address.get("village") or
+        address.get("residential") or
+        address.get("city_district")
+    )
+    if neighbourhood:
+        parts.append(neighbourhood)
+
+    # Level 2: District/Locality (for Bogotá: localidades como Suba, Usaquén, etc.)
+    district = (
+        address.get("district") or
+        address.get("locality") or
+        address.get("city_district") or
+        address.get("subdistrict")
+    )
+    # Only add if different from neighbourhood and not already a city
+    if district and district != neighbourhood:
+        # Check if district is actually a city-level name (avoid duplicates)
+        city_name = address.get("city") or address.get("town") or address.get("municipality")
+        if not city_name or district != city_name:
+            parts.append(district)
+
+    # Level 3: City/Municipality
+    city = (
+        address.get("city") or
+        address.get("town") or
+        address.get("municipality")
+    )
+    if city and city != neighbourhood and city != district:
+        parts.append(city)
+
+    # Level 4: State/Department
+    state = address.get("state") or address.get("region")
+    if state:
+        parts.append(state)
+
+    # Level 5: Country
+    country = address.get("country")
+    if country:
+        parts.append(country)
+
+    return ", ".join(parts) if parts else None
+
+
+# OSM admin_level -> address component (Colombia: 2 país, 4 departamento,
+# 6 municipio, 8 localidad, 9/10 barrio)
+ADMIN_LEVEL_COMPONENTS = {
+    "2": "country",
+    "3": "region",
+    "4": "state",
+    "5": "region",
+    "6": "city",
+    "7": "municipality",
+    "8": "district",
+    "9": "neighbourhood",
+    "10": "neighbourhood",
+}
+
+# OSM place=* polygons -> address component
+PLACE_COMPONENTS = {
+    "neighbourhood": "neighbourhood",
+    "suburb": "suburb",
+    "quarter": "quarter",
+    "village": "village",
+    "town": "town",
+    "city": "city",
+}
+
+# Polygons whose bounding box covers more grid cells than this (countries,
+# departments) are kept in a short list checked on every lookup instead
+_MAX_GRID_CELLS = 400
+
+
+class _Area:
+    """
+    One named (multi)polygon with a precomputed edge index.
+
+    Edges are bucketed into horizontal bands, so the ray-casting test only
+    looks at the edges that cross the point's latitude band instead of every
+    vertex of the boundary.
+    """
+
+    __slots__ = ("name", "component", "bbox", "size", "_bands", "_band_height")
+
+    def __init__(self, name: str, component: str, rings: List[List[Tuple[float, float]]]):
+        self.name = name
+        self.component = component
+        points = [point for ring in rings for point in ring]
+        min_lon = min(x for x, _ in points)
+        max_lon = max(x for x, _ in points)
+        min_lat = min(y for _, y in points)
+        max_lat = max(y for _, y in points)
+        self.bbox = (min_lon, min_lat, max_lon, max_lat)
+        self.size = (max_lon - min_lon) * (max_lat - min_lat)
+
+        edges = []
+        for ring in rings:
+            for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+                if y1 != y2:
+                    edges.append((x1, y1, x2, y2))
+
+        band_count = max(1, min(256, len(edges) // 8))
+        self._band_height = (max_lat - min_lat) / band_count or 1.0
+        self._bands: List[List[Tuple[float, float, float, float]]] = [[] for _ in range(band_count)]
+        for edge in edges:
+            low = self._band(min(edge[1], edge[3]))
+            high = self._band(max(edge[1], edge[3]))
+            for band in range(low, high + 1):
+                self._bands[band].append(edge)
+
+    def _band(self, lat: float) -> int:
+        return max(0, min(len(self._bands) - 1, int((lat - self.bbox[1]) / self._band_height)))
+
+    def contains(self, lat: float, lon: float) -> bool:
+        """Point-in-polygon test (even-odd rule, so holes and multipolygons work)."""
+        min_lon, min_lat, max_lon, max_lat = self.bbox
+        if not (min_lon <= lon <= max_lon and min_lat <= lat <= max_lat):
+            return False
+        inside = False
+        for x1, y1, x2, y2 in self._bands[self._band(lat)]:
+            if (y1 > lat) != (y2 > lat) and lon < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+        return inside
+
+
+class OfflineGeocoder:
+    """
+    In-process reverse geocoder over local boundary polygons.
+
+    Loads named polygons (OSM boundary=administrative with admin_level, or
+    place=neighbourhood/suburb/...) from a GeoJSON FeatureCollection into a
+    grid index. A lookup collects the smallest polygon containing the point
+    for each address component and formats it like the Nominatim path, e.g.
+    "Prado Veraniego, Suba, Bogotá, Colombia".
+
+    OSM extracts (.osm.pbf) can be converted beforehand, for example with
+    `osmium tags-filter` + `osmium export -f geojson`.
+
+    Attributes:
+        grid_degrees: Size of a spatial index cell in degrees
+    """
+
+    def __init__(self, features: List[Dict[str, Any]], grid_degrees: float = OFFLINE_GEOCODER_GRID_DEGREES):
+        self.grid_degrees = grid_degrees
+        self._grid: Dict[Tuple[int, int], List[_Area]] = {}
+        self._large: List[_Area] = []
+        self.area_count = 0
+
+        for feature in features:
+            area = self._parse_feature(feature)
+            if area:
+                self._index(area)
+                self.area_count += 1
+        logger.info(f"Offline geocoder loaded {self.area_count} areas")
+
+    @classmethod
+    def from_file(cls, path: Union[str, Path], **kwargs) -> "OfflineGeocoder":
+        """
+        Load a GeoJSON FeatureCollection.
+
+        Raises:
+            OSError: If the file cannot be read
+            ValueError: If it is not valid GeoJSON
+        """
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("type") != "FeatureCollection":
+            raise ValueError(f"{path} is not a GeoJSON FeatureCollection")
+        return cls(data.get("features", []), **kwargs)
+
+    @staticmethod
+    def _parse_feature(feature: Dict[str, Any]) -> Optional[_Area]:
+        properties = feature.get("properties") or {}
+        name = properties.get("name")
+        component = (
+            PLACE_COMPONENTS.get(properties.get("place"))
+            or ADMIN_LEVEL_COMPONENTS.get(str(properties.get("admin_level")))
+        )
+        geometry = feature.get("geometry") or {}
+        if not name or not component:
+            return None
+
+        if geometry.get("type") == "Polygon":
+            polygons = [geometry["coordinates"]]
+        elif geometry.get("type") == "MultiPolygon":
+            polygons = geometry["coordinates"]
+        else:
+            return None
+        rings = [
+            [(float(point[0]), float(point[1])) for point in ring]
+            for polygon in polygons
+            for ring in polygon
+            if len(ring) >= 3
+        ]
+        if not rings:
+            return None
+        return _Area(name, component, rings)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.grid_degrees), math.floor(lon / self.grid_degrees))
+
+    def _index(self, area: _Area):
+        min_lon, min_lat, max_lon, max_lat = area.bbox
+        low = self._cell(min_lat, min_lon)
+        high = self._cell(max_lat, max_lon)
+        if (high[0] - low[0] + 1) * (high[1] - low[1] + 1) > _MAX_GRID_CELLS:
+            self._large.append(area)
+            return
+        for i in range(low[0], high[0] + 1):
+            for j in range(low[1], high[1] + 1):
+                self._grid.setdefault((i, j), []).append(area)
+
+    def lookup(self, lat: float, lon: float) -> Dict[str, str]:
+        """
+        Address components for a point.
+
+        Returns:
+            Nominatim-style dict (neighbourhood, district, city, state,
+            country, ...); empty if no polygon contains the point
+        """
+        best: Dict[str, _Area] = {}
+        for area in self._grid.get(self._cell(lat, lon), []) + self._large:
+            current = best.get(area.component)
+            if current is not None and current.size <= area.size:
+                continue
+            if area.contains(lat, lon):
+                best[area.component] = area
+        return {component: area.name for component, area in best.items()}
+
+    def reverse_geocode(self, lat: float, lon: float) -> Optional[str]:
+        """Formatted address for a point, or None if it is not covered."""
+        return format_address(self.lookup(lat, lon))
+
+
+class _Flight:
+    """One in-flight Nominatim lookup that concurrent callers wait on."""
 
     def __init__(self):
-        self.last_request_time = 0.0
+        self.done = threading.Event()
+        self.address: Optional[str] = None
+
+
+class GeocodingService:
+    """
+    Service for reverse geocoding coordinates to addresses.
+
+    With an OfflineGeocoder, points covered by the local boundaries are
+    resolved in-process; Nominatim is only asked for the rest, and not at all
+    when nominatim_fallback is False. With a GeocodeCache, repeat Nominatim
+    lookups for the same coordinate cell are answered from memory without a
+    request or rate-limit sleep.
+
+    Concurrent lookups for the same coordinate cell are single-flighted: the
+    first caller queries Nominatim and the others wait for its result instead
+    of each spending a rate-limited request.
+    """
+
+    def __init__(
+        self,
+        connectivity: Optional[ConnectivityMonitor] = None,
+        cache: Optional[GeocodeCache] = None,
+        offline: Optional[OfflineGeocoder] = None,
+        nominatim_fallback: bool = GEOCODER_NOMINATIM_FALLBACK,
+        http: Optional[HttpClient] = None,
+    ):
+        self.connectivity = connectivity
+        # Shared session; the Nominatim rate limit is per host, for all instances
+        self.http = http or get_client()
+        self.cache = cache
+        self.offline = offline
+        self.nominatim_fallback = nominatim_fallback
+
+        self._inflight: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._nominatim_requests = 0
+        self._coalesced = 0
 
     def reverse_geocode(self, lat: float, lon: float) -> Optional[str]:
         """
@@ -32,15 +334,91 @@ class GeocodingService:
             
         Note:
             Respects Nominatim rate limiting (max 1 request per second).
-            Returns None on errors (does not raise exceptions).
+            Returns None on errors (does not raise exceptions), and immediately
+            while the connectivity circuit is open. Offline and cached results
+            are returned even without Internet.
+        """
+        address = self.lookup_local(lat, lon)
+        if address or (self.offline and not self.nominatim_fallback):
+            return address
+
+        cell = self._cell(lat, lon)
+        with self._lock:
+            flight = self._inflight.get(cell)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[cell] = _Flight()
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            logger.debug(f"Geocode lookup for cell {cell} already in flight, waiting")
+            flight.done.wait()
+            return flight.address
+
+        try:
+            # A lookup for this cell may have finished between our cache miss
+            # and taking the lead
+            address = self.cache.get(lat, lon) if self.cache else None
+            if address is None:
+                with self._lock:
+                    self._nominatim_requests += 1
+                address = self._query_nominatim(lat, lon)
+                if address and self.cache:
+                    self.cache.put(lat, lon, address)
+            flight.address = address
+        finally:
+            with self._lock:
+                del self._inflight[cell]
+            flight.done.set()
+        return address
+
+    def _cell(self, lat: float, lon: float) -> str:
+        """Single-flight key: the cache cell, so nearby points share a lookup."""
+        if self.cache:
+            return self.cache.cell(lat, lon)
+        return f"{lat:.{GEOCODE_CACHE_PRECISION}f},{lon:.{GEOCODE_CACHE_PRECISION}f}"
+
+    def get_metrics(self) -> Dict[str, int]:
+        """
+        Snapshot of Nominatim usage.
+
+        Returns:
+            Dict with 'nominatim_requests' (lookups attempted), 'coalesced'
+            (callers that shared another caller's in-flight lookup, i.e.
+            requests saved) and 'in_flight'
         """
-        # Rate limiting
-        now = time.time()
-        time_since_last = now - self.last_request_time
-        if time_since_last < NOMINATIM_RATE_LIMIT_SECONDS:
-            sleep_time = NOMINATIM_RATE_LIMIT_SECONDS - time_since_last
-            logger.debug(f"Geocoding rate limiting: sleeping {sleep_time:.1f}s")
-            time.sleep(sleep_time)
+        with self._lock:
+            return {
+                "nominatim_requests": self._nominatim_requests,
+                "coalesced": self._coalesced,
+                "in_flight": len(self._inflight),
+            }
+
+    def lookup_local(self, lat: float, lon: float) -> Optional[str]:
+        """
+        Address from the offline geocoder or the cache, without any request.
+
+        Returns:
+            Formatted address, or None if a Nominatim lookup would be needed
+        """
+        if self.offline:
+            address = self.offline.reverse_geocode(lat, lon)
+            if address:
+                return address
+
+        if self.cache:
+            cached = self.cache.get(lat, lon)
+            if cached is not None:
+                logger.debug(f"Geocode cache hit: ({lat}, {lon}) -> {cached}")
+                return cached
+        return None
+
+    def _query_nominatim(self, lat: float, lon: float) -> Optional[str]:
+        """Reverse geocode through the Nominatim API (rate limited, no cache)."""
+        if self.connectivity and not self.connectivity.allow_request():
+            logger.debug("Skipping geocoding: connectivity circuit is open")
+            return None
 
         try:
             params = {
@@ -53,84 +431,37 @@ class GeocodingService:
 
             logger.debug(f"Reverse geocoding: ({lat}, {lon})")
 
-            response = requests.get(
+            # User-Agent (required by Nominatim) is set on the shared session
+            response = self.http.get(
                 NOMINATIM_API_URL,
                 params=params,
                 timeout=NOMINATIM_TIMEOUT,
-                headers={"User-Agent": "OSM-Mesh-Notes-Gateway/1.0"},  # Required by Nominatim
             )
 
-            self.last_request_time = time.time()
+            if self.connectivity:
+                self.connectivity.record_success()
 
             if response.status_code == 200:
                 data = response.json()
-                address = data.get("address", {})
-                
-                # Build address string from components with detailed hierarchy
-                # Priority: neighbourhood/suburb > district/locality > city > state > country
-                parts = []
-                
-                # Level 1: Most specific - neighbourhood/barrio
-                neighbourhood = (
-                    address.get("neighbourhood") or
-                    address.get("suburb") or
-                    address.get("quarter") or
-                    address.get("village") or
-                    address.get("residential") or
-                    address.get("city_district")
-                )
-                if neighbourhood:
-                    parts.append(neighbourhood)
-                
-                # Level 2: District/Locality (for Bogotá: localidades como Suba, Usaquén, etc.)
-                district = (
-                    address.get("district") or
-                    address.get("locality") or
-                    address.get("city_district") or
-                    address.get("subdistrict")
-                )
-                # Only add if different from neighbourhood and not already a city
-                if district and district != neighbourhood:
-                    # Check if district is actually a city-level name (avoid duplicates)
-                    city_name = address.get("city") or address.get("town") or address.get("municipality")
-                    if not city_name or district != city_name:
-                        parts.append(district)
-                
-                # Level 3: City/Municipality
-                city = (
-                    address.get("city") or
-                    address.get("town") or
-                    address.get("municipality")
-                )
-                if city and city != neighbourhood and city != district:
-                    parts.append(city)
-                
-                # Level 4: State/Department
-                state = address.get("state") or address.get("region")
-                if state:
-                    parts.append(state)
-                
-                # Level 5: Country
-                country = address.get("country")
-                if country:
-                    parts.append(country)
-                
-                if parts:
-                    address_str = ", ".join(parts)
+                address_str = format_address(data.get("address", {}))
+                if address_str:
                     logger.debug(f"Geocoded address: {address_str}")
-                    return address_str
                 else:
                     logger.debug("No address components found")
-                    return None
+                return address_str
             else:
                 logger.debug(f"Geocoding API error {response.status_code}: {response.text[:100]}")
                 return None
 
         except requests.exceptions.Timeout:
             logger.debug("Geocoding API timeout")
+            if self.connectivity:
+                self.connectivity.record_failure()
             return None
         except requests.exceptions.ConnectionError:
             logger.debug("Geocoding API connection error")
+            if self.connectivity:
+                self.connectivity.record_failure()
             return None
         except Exception as e:
             logger.debug(f"Unexpected error in geocoding: {e}")
@@ -0,0 +1,302 @@
+"""Shared HTTP client: keep-alive pooling, per-host rate limits and timing."""
+
+import time
+import logging
+import threading
+from collections import defaultdict, deque
+from datetime import timedelta
+from typing import Any, Deque, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .config import (
+    HTTP_POOL_MAXSIZE,
+    HTTP_USER_AGENT,
+    OSM_API_URL,
+    OSM_RATE_LIMIT_SECONDS,
+    NOMINATIM_API_URL,
+    NOMINATIM_RATE_LIMIT_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Number of recent timing samples kept per host for percentiles
+_TIMING_SAMPLES = 200
+
+# Connection setup times of the current thread's request, filled in by the
+# connection classes below (None when a pooled connection was reused)
+_setup = threading.local()
+
+
+class _TimedConnectionMixin:
+    """Record TCP connect and TLS handshake times of new connections."""
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        _setup.connect = time.perf_counter() - start
+        return sock
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        total = time.perf_counter() - start
+        connect = getattr(_setup, "connect", None) or 0.0
+        _setup.connect = connect
+        _setup.tls = max(0.0, total - connect) if isinstance(self, HTTPSConnection) else 0.0
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools use the timed connection classes."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Attributes:
+        rate: Tokens added per second
+        capacity: Maximum burst size
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float):
+        """Change the refill rate, keeping the tokens accumulated so far."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """
+        Take one token, sleeping until it is available.
+
+        Returns:
+            Seconds waited
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # Reserve the token now (possibly going negative) so concurrent
+            # callers queue up behind each other instead of all waking at once
+            self._tokens -= 1.0
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            logger.debug(f"HTTP rate limiting: sleeping {wait:.1f}s")
+            time.sleep(wait)
+        return wait
+
+    def try_acquire(self) -> float:
+        """
+        Take one token if it is available, without sleeping.
+
+        Returns:
+            0 if the token was taken, otherwise seconds until one is
+            available (no token is taken then)
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.rate
+
+
+class HttpClient:
+    """
+    One requests.Session for all outbound HTTP (OSM, Nominatim, probes).
+
+    Connections are kept alive and pooled per host, so repeated calls skip
+    DNS, TCP and TLS setup. Hosts can be given a TokenBucket; request() waits
+    for a token before sending, which makes the limit shared by every caller
+    in the process. Per-host timings (connect, TLS, time to first byte,
+    total) and connection reuse are recorded for get_metrics().
+
+    Attributes:
+        session: The shared requests.Session
+    """
+
+    def __init__(self, pool_maxsize: int = HTTP_POOL_MAXSIZE, user_agent: str = HTTP_USER_AGENT):
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = user_agent
+        adapter = _TimedAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._limits: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"requests": 0, "errors": 0, "new_connections": 0, "reused_connections": 0, "limit_wait": 0.0}
+        )
+        self._timings: Dict[str, Dict[str, Deque[float]]] = defaultdict(
+            lambda: {name: deque(maxlen=_TIMING_SAMPLES) for name in ("connect", "tls", "ttfb", "total")}
+        )
+
+    def set_limit(self, host: str, rate: Optional[float], capacity: float = 1.0):
+        """Limit requests to host to rate per second (None removes the limit)."""
+        with self._lock:
+            if rate is None:
+                self._limits.pop(host, None)
+            elif host in self._limits:
+                self._limits[host].set_rate(rate)
+                self._limits[host].capacity = capacity
+            else:
+                self._limits[host] = TokenBucket(rate, capacity)
+
+    def get_limit(self, host: str) -> Optional[TokenBucket]:
+        """Token bucket of host, if it is rate limited."""
+        with self._lock:
+            return self._limits.get(host)
+
+    def request(self, method: str, url: str, rate_limited: bool = True, **kwargs) -> requests.Response:
+        """
+        Send a request through the shared session.
+
+        Waits for the host's rate limit first, unless rate_limited is False
+        (the caller already took a token from the bucket). Exceptions from
+        requests (Timeout, ConnectionError, ...) are recorded and re-raised.
+        """
+        host = urlsplit(url).hostname or ""
+        bucket = self.get_limit(host) if rate_limited else None
+        waited = bucket.acquire() if bucket else 0.0
+
+        _setup.connect = None
+        _setup.tls = None
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self._counters[host]["requests"] += 1
+                self._counters[host]["errors"] += 1
+                self._counters[host]["limit_wait"] += waited
+            raise
+        total = time.perf_counter() - start
+
+        connect = _setup.connect
+        tls = _setup.tls
+        # requests measures elapsed from sending until the headers are parsed
+        elapsed = getattr(response, "elapsed", None)
+        ttfb = elapsed.total_seconds() if isinstance(elapsed, timedelta) else total
+        ttfb = max(0.0, ttfb - (connect or 0.0) - (tls or 0.0))
+        with self._lock:
+            counters = self._counters[host]
+            counters["requests"] += 1
+            counters["limit_wait"] += waited
+            timings = self._timings[host]
+            if connect is None:
+                counters["reused_connections"] += 1
+            else:
+                counters["new_connections"] += 1
+                timings["connect"].append(connect)
+                timings["tls"].append(tls or 0.0)
+            timings["ttfb"].append(ttfb)
+            timings["total"].append(total)
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        return self.request("HEAD", url, **kwargs)
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-host snapshot of client metrics.
+
+        Returns:
+            Dict host -> 'requests', 'errors', 'new_connections',
+            'reused_connections', 'limit_wait' (total seconds waited for the
+            rate limit), 'rate' (requests/s allowed, None if unlimited) and
+            '<connect|tls|ttfb|total>_p50' / '_p95' in seconds (None without
+            samples).
+        """
+        def percentile(samples, pct):
+            if not samples:
+                return None
+            ordered = sorted(samples)
+            return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+        with self._lock:
+            metrics = {}
+            for host in set(self._counters) | set(self._limits):
+                host_metrics: Dict[str, Any] = dict(self._counters[host])
+                bucket = self._limits.get(host)
+                host_metrics["rate"] = bucket.rate if bucket else None
+                for name, samples in self._timings[host].items():
+                    host_metrics[f"{name}_p50"] = percentile(samples, 0.50)
+                    host_metrics[f"{name}_p95"] = percentile(samples, 0.95)
+                metrics[host] = host_metrics
+            return metrics
+
+    def close(self):
+        """Close pooled connections."""
+        self.session.close()
+
+
+_client: Optional[HttpClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> HttpClient:
+    """
+    Process-wide HttpClient, created on first use.
+
+    OSM and Nominatim hosts are limited to OSM_RATE_LIMIT_SECONDS and
+    NOMINATIM_RATE_LIMIT_SECONDS between requests.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+            _client.set_limit(urlsplit(OSM_API_URL).hostname, 1.0 / OSM_RATE_LIMIT_SECONDS)
+            _client.set_limit(urlsplit(NOMINATIM_API_URL).hostname, 1.0 / NOMINATIM_RATE_LIMIT_SECONDS)
+        return _client
+
+
+def reset_client():
+    """Drop the process-wide client (its pooled connections and rate limit state)."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
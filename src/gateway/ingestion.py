@@ -0,0 +1,308 @@
+"""Bounded ingestion queue between the Meshtastic reader and message handling."""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from .config import (
+    INGEST_QUEUE_MAXSIZE,
+    INGEST_WORKERS,
+    INGEST_OVERFLOW_POLICY,
+    INGEST_BLOCK_TIMEOUT,
+    INGEST_DEDUP_TTL,
+    INGEST_DEDUP_MAX_ENTRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+# Priorities (lower value is handled first)
+PRIORITY_NOTE = 0  # #osmnote reports
+PRIORITY_COMMAND = 1  # informational commands (#osmstatus, #osmlist, ...)
+PRIORITY_OTHER = 2  # messages that will most likely be ignored
+
+PRIORITY_NAMES = {PRIORITY_NOTE: "note", PRIORITY_COMMAND: "command", PRIORITY_OTHER: "other"}
+
+# Overflow policies
+OVERFLOW_DROP_NEWEST = "drop_newest"  # refuse the incoming message
+OVERFLOW_DROP_LOWEST = "drop_lowest"  # evict the oldest queued message of a lower priority
+OVERFLOW_BLOCK = "block"  # wait up to INGEST_BLOCK_TIMEOUT for room, then refuse
+
+OVERFLOW_POLICIES = (OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_LOWEST, OVERFLOW_BLOCK)
+
+# Number of recent queue wait times kept for percentiles
+_WAIT_SAMPLES = 1000
+
+
+class IngestionQueue:
+    """
+    Bounded priority queue with a worker pool for incoming messages.
+
+    submit() is called on the meshtastic reader thread and only enqueues, so
+    slow handling (geocoding, the OSM POST of an immediate send, delays
+    between DM parts) never backs up packet reception. Worker threads pop
+    messages by priority (FIFO within a priority) and call handler(msg).
+
+    When the queue is full the overflow policy decides what is lost:
+        - drop_newest: the incoming message
+        - drop_lowest: the oldest queued message of the lowest priority, if it
+          is less important than the incoming one (otherwise the incoming)
+        - block: wait up to block_timeout for room, then the incoming message
+
+    Attributes:
+        maxsize: Maximum number of queued (not yet handled) messages
+        workers: Number of worker threads
+        overflow_policy: One of OVERFLOW_POLICIES
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Dict[str, Any]], None],
+        priority_fn: Callable[[Dict[str, Any]], int] = lambda msg: PRIORITY_OTHER,
+        maxsize: int = INGEST_QUEUE_MAXSIZE,
+        workers: int = INGEST_WORKERS,
+        overflow_policy: str = INGEST_OVERFLOW_POLICY,
+        block_timeout: float = INGEST_BLOCK_TIMEOUT,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.handler = handler
+        self.priority_fn = priority_fn
+        self.maxsize = maxsize
+        self.workers = workers
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+
+        # Heap of (priority, seq, enqueued_at, msg)
+        self._heap: List[Tuple[int, int, float, Dict[str, Any]]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._threads: List[threading.Thread] = []
+        self._in_flight = 0
+
+        # Metrics
+        self._submitted = 0
+        self._processed = 0
+        self._errors = 0
+        self._dropped: Dict[str, int] = dict.fromkeys(PRIORITY_NAMES.values(), 0)
+        self._max_depth = 0
+        self._waits: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+
+    def start(self):
+        """Start the worker threads."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"ingest-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Stop the worker threads.
+
+        Messages still queued are handled first if the workers can do it
+        within timeout; whatever is left afterwards is discarded.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while (self._heap or self._in_flight) and self._threads:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            self._running = False
+            leftover = len(self._heap)
+            self._heap.clear()
+            self._cond.notify_all()
+        if leftover:
+            logger.warning(f"Ingestion queue stopped with {leftover} unhandled messages")
+        for thread in self._threads:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()) + 1.0)
+        self._threads = []
+
+    def submit(self, msg: Dict[str, Any]) -> bool:
+        """
+        Enqueue a message for handling.
+
+        Returns:
+            True if the message was queued, False if it was dropped.
+        """
+        priority = self.priority_fn(msg)
+        with self._cond:
+            self._submitted += 1
+            if len(self._heap) >= self.maxsize and not self._make_room(priority):
+                self._record_drop(priority, msg)
+                return False
+            heapq.heappush(self._heap, (priority, next(self._seq), time.monotonic(), msg))
+            self._max_depth = max(self._max_depth, len(self._heap))
+            self._cond.notify()
+        return True
+
+    def _make_room(self, priority: int) -> bool:
+        """Apply the overflow policy with the queue full. Caller holds _cond."""
+        if self.overflow_policy == OVERFLOW_DROP_LOWEST:
+            # Oldest entry among those with the largest priority value
+            victim_index = max(
+                range(len(self._heap)),
+                key=lambda i: (self._heap[i][0], -self._heap[i][1]),
+            )
+            victim = self._heap[victim_index]
+            if victim[0] <= priority:
+                return False
+            self._heap[victim_index] = self._heap[-1]
+            self._heap.pop()
+            heapq.heapify(self._heap)
+            self._record_drop(victim[0], victim[3])
+            return True
+
+        if self.overflow_policy == OVERFLOW_BLOCK:
+            deadline = time.monotonic() + self.block_timeout
+            while len(self._heap) >= self.maxsize:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._running:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+        return False
+
+    def _record_drop(self, priority: int, msg: Dict[str, Any]):
+        """Count and log a dropped message. Caller holds _cond."""
+        self._dropped[PRIORITY_NAMES.get(priority, "other")] += 1
+        logger.warning(
+            f"Ingestion queue full ({self.maxsize}), dropped {PRIORITY_NAMES.get(priority, 'other')} "
+            f"message from {msg.get('node_id')}"
+        )
+
+    def _worker(self):
+        """Worker thread: pop by priority and call the handler."""
+        while True:
+            with self._cond:
+                while self._running and not self._heap:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                priority, _, enqueued_at, msg = heapq.heappop(self._heap)
+                self._waits.append(time.monotonic() - enqueued_at)
+                self._in_flight += 1
+                # Wake a blocked submit() waiting for room
+                self._cond.notify_all()
+            try:
+                self.handler(msg)
+            except Exception as e:
+                logger.error(f"Error handling message from {msg.get('node_id')}: {e}", exc_info=True)
+                with self._cond:
+                    self._errors += 1
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._processed += 1
+                    self._cond.notify_all()
+
+    def depth(self) -> int:
+        """Number of messages waiting to be handled."""
+        with self._cond:
+            return len(self._heap)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Snapshot of queue metrics.
+
+        Returns:
+            Dict with 'depth', 'max_depth', 'in_flight', 'submitted',
+            'processed', 'errors', 'dropped' (per priority name) and
+            'wait_p50'/'wait_p95'/'wait_max' in seconds over the last
+            handled messages (None before any message was handled).
+        """
+        with self._cond:
+            waits = sorted(self._waits)
+            metrics = {
+                "depth": len(self._heap),
+                "max_depth": self._max_depth,
+                "in_flight": self._in_flight,
+                "submitted": self._submitted,
+                "processed": self._processed,
+                "errors": self._errors,
+                "dropped": dict(self._dropped),
+            }
+
+        def percentile(pct: float) -> Optional[float]:
+            if not waits:
+                return None
+            return waits[min(len(waits) - 1, int(pct * len(waits)))]
+
+        metrics["wait_p50"] = percentile(0.50)
+        metrics["wait_p95"] = percentile(0.95)
+        metrics["wait_max"] = waits[-1] if waits else None
+        return metrics
+
+
+class PacketDedup:
+    """
+    Bounded, time-expiring set of recently seen (from, packet id) pairs.
+
+    The Meshtastic reader calls first_seen() before parsing a text packet;
+    repeats (the same packet delivered through meshtastic.receive.text and
+    the catch-all meshtastic.receive topic, or rebroadcast by the mesh) are
+    dropped there and counted as suppressed. Entries expire ttl seconds after
+    they were first seen; beyond max_entries the oldest is evicted.
+    """
+
+    def __init__(self, ttl: float = INGEST_DEDUP_TTL, max_entries: int = INGEST_DEDUP_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # (from, packet id) -> first seen (monotonic), oldest first
+        self._seen: OrderedDict[Tuple[Hashable, Hashable], float] = OrderedDict()
+        self._suppressed = 0
+        self._evicted = 0
+
+    def first_seen(self, from_node: Hashable, packet_id: Hashable) -> bool:
+        """
+        Record a packet and tell whether it is new.
+
+        Packets without an id (0 or None) cannot be matched and always count
+        as new.
+
+        Returns:
+            False if the same (from, packet id) was seen within ttl
+        """
+        if not packet_id:
+            return True
+        key = (from_node, packet_id)
+        now = time.monotonic()
+        with self._lock:
+            # Entries are in first-seen order: expire from the front
+            while self._seen:
+                oldest_key, oldest_at = next(iter(self._seen.items()))
+                if now - oldest_at < self.ttl:
+                    break
+                del self._seen[oldest_key]
+            if key in self._seen:
+                self._suppressed += 1
+                return False
+            self._seen[key] = now
+            if len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+                self._evicted += 1
+            return True
+
+    def get_metrics(self) -> Dict[str, int]:
+        """
+        Snapshot of dedup metrics.
+
+        Returns:
+            Dict with 'size', 'suppressed' (repeats dropped) and 'evicted'
+            (entries dropped before expiring because the set was full)
+        """
+        with self._lock:
+            return {"size": len(self._seen), "suppressed": self._suppressed, "evicted": self._evicted}
@@ -14,14 +14,24 @@ from .config import (
     WORKER_INTERVAL,
     DAILY_BROADCAST_ENABLED,
     LOG_LEVEL,
+    POSITION_WRITE_BEHIND,
+    OFFLINE_GEOCODER_PATH,
 )
 from .database import Database
+from .connectivity import ConnectivityMonitor
+from .http_client import get_client
+from .geocoding import GeocodingService, OfflineGeocoder
+from .geocode_cache import GeocodeCache
+from .address_resolver import AddressResolver
 from .position_cache import PositionCache
 from .meshtastic_serial import MeshtasticSerial
 from .commands import CommandProcessor, MSG_DAILY_BROADCAST
 from .i18n import _
 from .osm_worker import OSMWorker
+from .drain import BacklogDrain
+from .ingestion import IngestionQueue, PRIORITY_NOTE, PRIORITY_COMMAND, PRIORITY_OTHER
 from .notifications import NotificationManager
+from .tx_scheduler import TxScheduler
 
 # Set timezone
 os.environ["TZ"] = TZ
@@ -60,32 +70,70 @@ class Gateway:
         - CommandProcessor: Command/message processing
         - OSMWorker: OSM API integration
         - NotificationManager: DM notifications
+        - ConnectivityMonitor: Shared Internet state (circuit breaker)
+        - IngestionQueue: Bounded priority queue for incoming messages
+        - TxScheduler: Outbound DM/broadcast scheduling (airtime budget)
+        - GeocodingService: Reverse geocoding with a persistent GeocodeCache
+        - AddressResolver: Background address lookup for new notes
+        - HttpClient: Shared keep-alive session with per-host rate limits
 
     Threads:
         - Main thread: Signal handling and main loop
         - Serial read thread: Continuous message reading (daemon)
+        - Ingestion workers: Message/command handling (daemon)
+        - TX scheduler thread: Paced DM/broadcast transmission (daemon)
         - Worker thread: Periodic queue processing (daemon)
+        - Connectivity thread: Background probes (daemon)
+        - Address resolver thread: Nominatim lookups for new notes (daemon)
     """
 
     def __init__(self):
         self.running = False
         self.db = Database()
         # PositionCache now uses the same database for persistence
-        self.position_cache = PositionCache(db=self.db)
+        self.position_cache = PositionCache(db=self.db, write_behind=POSITION_WRITE_BEHIND)
         # Pass PositionCache to MeshtasticSerial so both use the same cache
         self.serial = MeshtasticSerial(position_cache=self.position_cache)
-        self.command_processor = CommandProcessor(self.db, self.position_cache)
-        self.osm_worker = OSMWorker(self.db)
-        self.notifications = NotificationManager(self.serial, self.db)
+        # One keep-alive HTTP session (and per-host rate limits) for all outbound calls
+        self.http = get_client()
+        # Shared Internet state for OSM, Nominatim and #osmstatus
+        self.connectivity = ConnectivityMonitor(http=self.http)
+        self.command_processor = CommandProcessor(self.db, self.position_cache, self.connectivity)
+        self.osm_worker = OSMWorker(self.db, self.connectivity, http=self.http)
+        # Large backlogs (after an outage) are drained continuously
+        self.drain = BacklogDrain()
+        # All outbound DMs/broadcasts go through one airtime-aware scheduler thread
+        self.tx_scheduler = TxScheduler(self.serial)
+        # Reverse geocoding: local boundaries first (if configured), then
+        # Nominatim with a persistent per-cell cache
+        self.geocoding = GeocodingService(
+            self.connectivity,
+            cache=GeocodeCache(self.db),
+            offline=self._load_offline_geocoder(),
+            http=self.http,
+        )
+        # Note addresses are looked up off the message path and stored on the note
+        self.address_resolver = AddressResolver(self.db, self.geocoding)
+        self.notifications = NotificationManager(
+            self.serial, self.db, self.connectivity,
+            tx_scheduler=self.tx_scheduler, geocoding=self.geocoding,
+        )
 
-        # Set up message callback
-        self.serial.set_message_callback(self._handle_message)
+        # Incoming messages are queued by the reader thread and handled by a worker pool
+        self.ingestion = IngestionQueue(
+            handler=self._handle_message,
+            priority_fn=self._message_priority,
+        )
+        self.serial.set_message_callback(self.ingestion.submit)
 
-        # Worker thread
+        # Worker thread; woken early by _worker_wakeup, WORKER_INTERVAL is only the idle fallback
         self.worker_thread: Optional[threading.Thread] = None
+        self._worker_wakeup = threading.Event()
+        self.connectivity.add_listener(self._on_connectivity_change)
 
         # Track if this is the first worker cycle (to skip broadcast on startup)
         self._first_worker_cycle = True
+        self._broadcast_queued = False
 
         # Track startup timestamp for time correction
         self._startup_timestamp = time.time()
@@ -100,6 +148,26 @@ class Gateway:
         logger.info(f"Received signal {signum}, shutting down...")
         self.stop()
 
+    @staticmethod
+    def _load_offline_geocoder():
+        """Load OFFLINE_GEOCODER_PATH if set; a bad file only disables offline geocoding."""
+        if not OFFLINE_GEOCODER_PATH:
+            return None
+        try:
+            return OfflineGeocoder.from_file(OFFLINE_GEOCODER_PATH)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Offline geocoder disabled, cannot load {OFFLINE_GEOCODER_PATH}: {e}")
+            return None
+
+    def _message_priority(self, msg: dict) -> int:
+        """Ingestion priority: #osmnote reports first, then #osm commands, then the rest."""
+        text = msg.get("text") or ""
+        if self.command_processor.extract_osmnote(text) is not None:
+            return PRIORITY_NOTE
+        if text.strip().lower().startswith("#osm"):
+            return PRIORITY_COMMAND
+        return PRIORITY_OTHER
+
     def _handle_message(self, msg: dict):
         """Handle incoming message from Meshtastic."""
         node_id = msg.get("node_id")
@@ -140,6 +208,8 @@ class Gateway:
         elif command_type == "osmnote_queued":
             if response:
                 local_queue_id = response  # response is the queue_id
+                # Look up the address in the background; the ACK uses it if ready
+                self.address_resolver.resolve(local_queue_id)
                 # Try immediate send
                 sent_note = self._try_immediate_send(local_queue_id)
                 # Send appropriate ACK
@@ -153,6 +223,7 @@ class Gateway:
                     )
                 else:
                     self.notifications.send_ack(node_id, "queued", local_queue_id=local_queue_id)
+                    self.wake_worker()
 
         elif command_type == "osmnote_reject":
             if response:
@@ -184,6 +255,7 @@ class Gateway:
                 lon=note["lon"],
                 text=note["text_normalized"],
                 locale=user_locale,
+                local_queue_id=note["local_queue_id"],
             )
 
             if result:
@@ -200,15 +272,48 @@ class Gateway:
             logger.error(f"Error in immediate send: {e}")
             return None
 
+    def wake_worker(self):
+        """Run a worker pass now instead of waiting for the next interval."""
+        self._worker_wakeup.set()
+
+    def _on_connectivity_change(self, online: bool):
+        """Flush the queue as soon as Internet comes back."""
+        if online:
+            self.wake_worker()
+
+    def _worker_wait_timeout(self) -> float:
+        """Seconds until the next pass: WORKER_INTERVAL, or sooner if a retry falls due."""
+        next_attempt_at = self.db.get_next_attempt_at()
+        if next_attempt_at is None:
+            return WORKER_INTERVAL
+        return min(WORKER_INTERVAL, max(0.0, next_attempt_at - time.time()))
+
     def _worker_loop(self):
-        """Background worker loop."""
+        """
+        Background worker loop.
+
+        Waits on _worker_wakeup, which is set when a note is queued, when
+        connectivity is restored and when a pass leaves a full batch behind.
+        WORKER_INTERVAL (or the next scheduled retry, if sooner) bounds the wait.
+        In drain mode (large backlog) passes run back to back with bigger
+        batches while they keep sending.
+        """
         logger.info("Worker thread started")
         while self.running:
+            # Clear before the pass so events raised during it trigger another pass
+            self._worker_wakeup.clear()
+            wait_timeout = WORKER_INTERVAL
             try:
                 # Process pending notes
-                sent_count = self.osm_worker.process_pending(limit=10)
+                batch_size = self.drain.batch_size
+                sent_count = self.osm_worker.process_pending(limit=batch_size)
                 if sent_count > 0:
                     logger.info(f"Sent {sent_count} notes to OSM")
+                draining = self.drain.record_pass(sent_count, self.db.get_total_queue_size())
+                if sent_count >= batch_size or (draining and sent_count > 0):
+                    # More notes are probably waiting: go again right away
+                    # (after the notification passes below)
+                    self.wake_worker()
 
                 # Process sent notifications
                 self.notifications.process_sent_notifications()
@@ -224,14 +329,28 @@ class Gateway:
                 if DAILY_BROADCAST_ENABLED and not self._first_worker_cycle:
                     self._check_daily_broadcast()
 
+                logger.debug(f"Ingestion queue metrics: {self.ingestion.get_metrics()}")
+                logger.debug(f"Packet dedup metrics: {self.serial.packet_dedup.get_metrics()}")
+                logger.debug(f"Serial link metrics: {self.serial.get_metrics()}")
+                logger.debug(f"TX scheduler metrics: {self.tx_scheduler.get_metrics()}")
+                logger.debug(f"Address resolver metrics: {self.address_resolver.get_metrics()}")
+                logger.debug(f"HTTP client metrics: {self.http.get_metrics()}")
+                logger.debug(f"OSM rate controller metrics: {self.osm_worker.rate.get_metrics()}")
+                logger.debug(f"OSM worker metrics: {self.osm_worker.get_metrics()}")
+                logger.debug(f"Backlog drain metrics: {self.drain.get_metrics()}")
+                logger.debug(f"Geocoding metrics: {self.geocoding.get_metrics()}")
+                if self.geocoding.cache:
+                    logger.debug(f"Geocode cache metrics: {self.geocoding.cache.get_metrics()}")
+
                 # Mark that we've completed the first cycle
                 self._first_worker_cycle = False
 
+                wait_timeout = self._worker_wait_timeout()
+
             except Exception as e:
                 logger.error(f"Error in worker loop: {e}")
 
-            # Sleep
-            time.sleep(WORKER_INTERVAL)
+            self._worker_wakeup.wait(wait_timeout)
 
         logger.info("Worker thread stopped")
 
@@ -318,15 +437,24 @@ class Gateway:
             logger.debug(f"Daily broadcast already sent today ({today_str}), skipping")
             return
 
+        # Already waiting in the TX scheduler
+        if self._broadcast_queued:
+            return
+
+        def on_sent(success: bool):
+            self._broadcast_queued = False
+            if success:
+                # Save today's date to database
+                self.db.set_last_broadcast_date(today_str)
+                logger.info(f"Sent daily broadcast for {today_str}")
+            else:
+                logger.warning("Failed to send daily broadcast (send_broadcast returned False)")
+
         # Send broadcast
         from .i18n import get_current_locale
         broadcast_msg = MSG_DAILY_BROADCAST(get_current_locale())
-        if self.serial.send_broadcast(broadcast_msg):
-            # Save today's date to database
-            self.db.set_last_broadcast_date(today_str)
-            logger.info(f"Sent daily broadcast for {today_str}")
-        else:
-            logger.warning("Failed to send daily broadcast (send_broadcast returned False)")
+        self._broadcast_queued = True
+        self.tx_scheduler.send_broadcast(broadcast_msg, on_sent=on_sent)
 
     def start(self):
         """Start the gateway."""
@@ -336,6 +464,21 @@ class Gateway:
 
         self.running = True
 
+        unconfirmed = self.db.count_unconfirmed_submissions()
+        if unconfirmed:
+            logger.warning(
+                f"{unconfirmed} notes have an unknown submission outcome; "
+                "they will be checked on OSM before resubmitting"
+            )
+
+        # Start connectivity probes before anything talks to the network
+        self.connectivity.start()
+
+        # Start message handlers and the transmitter before packets can arrive
+        self.tx_scheduler.start()
+        self.address_resolver.start()
+        self.ingestion.start()
+
         # Start serial connection
         self.serial.start()
 
@@ -365,10 +508,23 @@ class Gateway:
         # Stop serial
         self.serial.stop()
 
+        # Finish handling messages already received
+        self.ingestion.stop()
+        self.address_resolver.stop()
+        self.tx_scheduler.stop()
+
         # Wait for worker thread
+        self.wake_worker()
         if self.worker_thread:
             self.worker_thread.join(timeout=5.0)
 
+        self.connectivity.stop()
+        self.http.close()
+
+        # Persist buffered positions, then release pooled database connections
+        self.position_cache.close()
+        self.db.close()
+
         logger.info("Gateway stopped")
 
 
@@ -13,7 +13,15 @@ except ImportError:
     MESHTASTIC_AVAILABLE = False
     pub = None
 
-from .config import SERIAL_PORT
+from .config import (
+    SERIAL_PORT,
+    SERIAL_PROBE_INTERVAL,
+    SERIAL_RECONNECT_MIN_SECONDS,
+    SERIAL_RECONNECT_MAX_SECONDS,
+    PACKET_CAPTURE_PATH,
+)
+from .capture import PacketRecorder
+from .ingestion import PacketDedup
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +34,10 @@ class MeshtasticSerial:
     official meshtastic-python library. Handles connection, reconnection,
     message parsing (protobuf), and sending DMs/broadcasts.
 
+    start() launches a supervisor thread that probes the link and reconnects
+    with capped exponential backoff when the device drops off (USB hiccup,
+    firmware reboot), without restarting the gateway.
+
     Attributes:
         port: Serial port path (e.g., "/dev/ttyUSB0")
         interface: meshtastic SerialInterface object
@@ -53,7 +65,18 @@ class MeshtasticSerial:
         self.port = port
         self.interface: Optional[meshtastic.serial_interface.SerialInterface] = None
         self.running = False
-        self.reconnect_delay = 5.0
+        # Link supervisor (see _supervise)
+        self.probe_interval = SERIAL_PROBE_INTERVAL
+        self.reconnect_min_delay = SERIAL_RECONNECT_MIN_SECONDS
+        self.reconnect_max_delay = SERIAL_RECONNECT_MAX_SECONDS
+        self._link_wakeup = threading.Event()
+        self._supervisor: Optional[threading.Thread] = None
+        self._lost_at: Optional[float] = None  # monotonic time the current outage began
+        self._outages = 0
+        self._reconnect_attempts = 0
+        self._reconnects = 0
+        self._last_recovery: Optional[float] = None
+        self._max_recovery: Optional[float] = None
         self.message_callback: Optional[Callable[[Dict[str, Any]], None]] = None
         # Use provided PositionCache if available, otherwise use simple dict for backward compatibility
         self.position_cache = position_cache
@@ -61,6 +84,11 @@ class MeshtasticSerial:
         if not self._use_position_cache:
             self.position_cache: Dict[str, Dict[str, Any]] = {}  # node_id -> {lat, lon, timestamp}
         self._lock = threading.Lock()
+        # Text packets arrive on two topics (and again via mesh rebroadcasts)
+        self.packet_dedup = PacketDedup()
+        # Optional capture of every received packet (opened in start())
+        self.capture_path = PACKET_CAPTURE_PATH
+        self.recorder: Optional[PacketRecorder] = None
 
     def set_message_callback(self, callback: Callable[[Dict[str, Any]], None]):
         """Set callback for incoming messages."""
@@ -223,26 +251,42 @@ class MeshtasticSerial:
             pub.subscribe(self._on_receive_position, "meshtastic.receive.position")
             # Also subscribe to general receive topic as fallback
             pub.subscribe(self._on_receive_all, "meshtastic.receive")
+            # Lets the supervisor react to a dropped port without waiting for a probe
+            pub.subscribe(self._on_connection_lost, "meshtastic.connection.lost")
             logger.info(f"Successfully subscribed to pubsub topics")
         except Exception as e:
             logger.error(f"Failed to subscribe to pubsub topics: {e}")
             return
 
+        if self.capture_path and not self.recorder:
+            try:
+                self.recorder = PacketRecorder(self.capture_path)
+                logger.info(f"Recording received packets to {self.capture_path}")
+            except OSError as e:
+                logger.error(f"Could not open packet capture {self.capture_path}: {e}")
+
         # Set running=True BEFORE connect() to ensure we process messages received
         # during or immediately after connection establishment. If connect() fails,
-        # we'll revert this flag.
+        # the supervisor keeps retrying with running still set.
         self.running = True
 
         if not self.connect():
-            logger.error("Failed to connect, cannot start")
-            self.running = False
-            return
+            # The device may simply not be plugged in yet
+            logger.error("Failed to connect, retrying in the background")
+
+        self._link_wakeup.clear()
+        self._supervisor = threading.Thread(target=self._supervise, name="serial-supervisor", daemon=True)
+        self._supervisor.start()
 
         logger.info("Meshtastic serial reader started")
 
     def stop(self):
         """Stop message listener."""
         self.running = False
+        self._link_wakeup.set()
+        if self._supervisor:
+            self._supervisor.join(timeout=5.0)
+            self._supervisor = None
         # Unsubscribe from messages
         if pub:
             try:
@@ -260,12 +304,115 @@ class MeshtasticSerial:
             except Exception as e:
                 # Topic may not exist if subscription never succeeded
                 logger.debug(f"Could not unsubscribe from general receive topic: {e}")
+            try:
+                pub.unsubscribe(self._on_connection_lost, "meshtastic.connection.lost")
+            except Exception as e:
+                logger.debug(f"Could not unsubscribe from connection lost topic: {e}")
         self.disconnect()
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+
+    def _on_connection_lost(self, interface):
+        """Handle meshtastic.connection.lost: wake the supervisor at once."""
+        # Closing a replaced interface publishes this too; only the current one matters
+        if self.running and interface is self.interface:
+            logger.warning("Meshtastic connection lost")
+            self._link_wakeup.set()
+
+    def _link_alive(self) -> bool:
+        """Probe the current interface. Returns False if the link is dead."""
+        interface = self.interface
+        if interface is None:
+            return False
+        # Cleared by meshtastic when its reader thread loses the port
+        connected = getattr(interface, "isConnected", None)
+        if connected is not None and not connected.is_set():
+            return False
+        try:
+            # getMyNodeInfo() only reads local state; a heartbeat actually writes
+            # to the device (it is not transmitted over LoRa)
+            interface.sendHeartbeat()
+        except Exception as e:
+            logger.debug(f"Serial heartbeat failed: {e}")
+            return False
+        return True
+
+    def _backoff(self, attempt: int) -> float:
+        """Delay after the given failed reconnect attempt (1-based)."""
+        return min(self.reconnect_min_delay * 2 ** (attempt - 1), self.reconnect_max_delay)
+
+    def _reconnect(self) -> bool:
+        """Replace a dead interface with a new one. Returns True if connected."""
+        dead, self.interface = self.interface, None
+        if dead:
+            try:
+                dead.close()
+            except Exception as e:
+                logger.debug(f"Error closing dead interface: {e}")
+        self._reconnect_attempts += 1
+        return self.connect()
+
+    def _supervise(self):
+        """
+        Link supervisor loop.
+
+        Probes the link every probe_interval seconds (sooner on
+        meshtastic.connection.lost) and, once it is dead, reconnects with
+        exponential backoff between reconnect_min_delay and
+        reconnect_max_delay. Subscriptions, callbacks and caches live on this
+        object, so they carry over to the new interface untouched.
+        """
+        failures = 0
+        while self.running:
+            self._link_wakeup.clear()
+            delay = self.probe_interval
+            try:
+                if not self._link_alive():
+                    if self._lost_at is None:
+                        self._lost_at = time.monotonic()
+                        self._outages += 1
+                        logger.warning(f"Meshtastic link at {self.port} is down, reconnecting")
+                    if self._reconnect():
+                        recovery = time.monotonic() - self._lost_at
+                        self._last_recovery = recovery
+                        self._max_recovery = max(self._max_recovery or 0.0, recovery)
+                        self._reconnects += 1
+                        self._lost_at = None
+                        failures = 0
+                        logger.info(f"Meshtastic link recovered after {recovery:.1f} s")
+                    else:
+                        failures += 1
+                        delay = self._backoff(failures)
+                        logger.info(f"Reconnect attempt {failures} failed, retrying in {delay:.0f} s")
+            except Exception as e:
+                logger.error(f"Error in serial supervisor: {e}")
+                delay = self.reconnect_min_delay
+            self._link_wakeup.wait(delay)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Snapshot of serial link health.
+
+        Returns:
+            Dict with 'connected', 'down_for' (seconds into the current outage,
+            None while up), 'outages', 'reconnect_attempts', 'reconnects' and
+            'last_recovery'/'max_recovery' (time-to-recover in seconds, from
+            detecting the outage to a working interface)
+        """
+        lost_at = self._lost_at
+        return {
+            "connected": self.interface is not None and lost_at is None,
+            "down_for": time.monotonic() - lost_at if lost_at is not None else None,
+            "outages": self._outages,
+            "reconnect_attempts": self._reconnect_attempts,
+            "reconnects": self._reconnects,
+            "last_recovery": self._last_recovery,
+            "max_recovery": self._max_recovery,
+        }
 
     def _on_receive_text(self, packet, interface):
         """Handle received text message from Meshtastic."""
-        logger.info(f"Received text packet from Meshtastic: {packet}")
-
         if not self.running:
             logger.warning("Received message but gateway is not running")
             return
@@ -274,6 +421,13 @@ class MeshtasticSerial:
             logger.warning("Received message but no callback is set")
             return
 
+        # Repeats of a packet already handled are dropped before any parsing
+        if not self.packet_dedup.first_seen(packet.get("from"), packet.get("id")):
+            logger.debug(f"Dropping repeated packet {packet.get('id')} from {packet.get('from')}")
+            return
+
+        logger.info(f"Received text packet from Meshtastic: {packet}")
+
         try:
             # meshtastic.receive.text provides decoded text messages
             decoded = packet.get("decoded", {})
@@ -412,6 +566,10 @@ class MeshtasticSerial:
 
     def _on_receive_all(self, packet, interface):
         """Handle all received packets - fallback to catch messages that don't go to specific topics."""
+        # Every packet reaches this parent-topic handler, so it is the one recorded
+        if self.recorder:
+            self.recorder.record(packet)
+
         from_node = packet.get('from')
         from_id = packet.get('fromId')
         channel = packet.get('channel')
@@ -473,12 +631,13 @@ class MeshtasticSerial:
                 lon = lon_i / 1e7
 
                 # Update position cache
-                with self._lock:
-                    if self._use_position_cache:
-                        # Use PositionCache API
-                        self.position_cache.update(node_id, lat, lon)
-                    else:
-                        # Use simple dict cache (backward compatibility)
+                if self._use_position_cache:
+                    # Use PositionCache API (thread-safe on its own; don't hold
+                    # self._lock while it may touch the database)
+                    self.position_cache.update(node_id, lat, lon)
+                else:
+                    # Use simple dict cache (backward compatibility)
+                    with self._lock:
                         self.position_cache[node_id] = {
                             "lat": lat,
                             "lon": lon,
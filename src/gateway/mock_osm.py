@@ -0,0 +1,406 @@
+"""Local stand-in for the OSM Notes API and Nominatim, with fault injection.
+
+Serves the endpoints the gateway calls:
+    - POST /api/0.6/notes.json: creates a note (JSON, form or query lat/lon/text)
+    - GET /api/0.6/notes.json?bbox=...: notes created so far inside the bbox
+    - GET /reverse?lat=...&lon=...: a Nominatim-style address
+    - GET/HEAD anything else (e.g. /api/capabilities): 200, for connectivity probes
+
+Each endpoint group ('notes' and 'reverse') has its own FaultProfile: a
+latency distribution, injected error statuses with optional Retry-After, and
+hung requests that never get a response (client-side timeouts).
+
+Point the gateway at it with OSM_API_URL=http://127.0.0.1:<port>/api/0.6/notes.json
+and NOMINATIM_API_URL=http://localhost:<port>/reverse (different host names keep
+the two per-host rate limits apart; see --reverse-host when binding elsewhere).
+Run standalone with:
+
+    python -m gateway.mock_osm --port 8099 --latency exp:0.3 --error 429:0.05 --retry-after 30
+"""
+
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Union
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+Latency = Union[float, Callable[[], float]]
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    Latency sampler from a spec string (seconds).
+
+    Forms: "0.2" (fixed), "uniform:LOW:HIGH", "exp:MEAN" and
+    "lognormal:MEDIAN:SIGMA".
+    """
+    kind, _, args = spec.partition(":")
+    try:
+        if not args:
+            value = float(kind)
+            return lambda: value
+        params = [float(part) for part in args.split(":")]
+        if kind == "uniform":
+            low, high = params
+            return lambda: random.uniform(low, high)
+        if kind == "exp":
+            (mean,) = params
+            return lambda: random.expovariate(1.0 / mean) if mean > 0 else 0.0
+        if kind == "lognormal":
+            median, sigma = params
+            return lambda: random.lognormvariate(math.log(median), sigma)
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid latency spec: {spec!r}")
+
+
+class FaultProfile:
+    """
+    Faults injected into one endpoint group.
+
+    Attributes:
+        latency: Seconds before answering, fixed or a sampler (see parse_latency)
+        errors: Status code -> probability per request (e.g. {429: 0.05, 503: 0.01})
+        retry_after: Retry-After seconds on injected 429/503 (None: no header)
+        hang_rate: Probability that a request is held for hang_seconds and
+            then dropped without a response
+        hang_seconds: How long a hung request is held
+    """
+
+    def __init__(
+        self,
+        latency: Latency = 0.0,
+        errors: Optional[Dict[int, float]] = None,
+        retry_after: Optional[float] = None,
+        hang_rate: float = 0.0,
+        hang_seconds: float = 15.0,
+    ):
+        self.latency = latency
+        self.errors = dict(errors or {})
+        self.retry_after = retry_after
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+
+    def sample_latency(self) -> float:
+        value = self.latency() if callable(self.latency) else self.latency
+        return max(0.0, value)
+
+    def pick_fault(self, rng: random.Random) -> Optional[Union[int, str]]:
+        """'hang', an error status, or None for a normal response."""
+        roll = rng.random()
+        if roll < self.hang_rate:
+            return "hang"
+        roll -= self.hang_rate
+        for status, rate in sorted(self.errors.items()):
+            if roll < rate:
+                return status
+            roll -= rate
+        return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def _body_params(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not raw:
+            return {}
+        if "json" in (self.headers.get("Content-Type") or ""):
+            try:
+                return json.loads(raw)
+            except ValueError:
+                return {}
+        return {k: v[0] for k, v in parse_qs(raw.decode("utf-8", "replace")).items()}
+
+    def _send(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _handle(self):
+        started = time.monotonic()
+        url = urlsplit(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if self.command == "POST":
+            params.update(self._body_params())
+        mock: MockOSMServer = self.server.mock
+        group = "reverse" if url.path.endswith("/reverse") else "notes" if url.path.endswith("/notes.json") else None
+        profile = mock.profiles.get(group) if group else None
+
+        fault = None
+        if profile:
+            delay = profile.sample_latency()
+            fault = profile.pick_fault(mock.rng)
+            if delay:
+                time.sleep(delay)
+            if fault == "hang":
+                mock._log(self.command, url.path, None, started, fault)
+                time.sleep(profile.hang_seconds)
+                self.close_connection = True
+                return
+
+        headers = {}
+        if fault is not None:
+            if fault in (429, 503) and profile.retry_after is not None:
+                headers["Retry-After"] = str(int(profile.retry_after))
+            status, payload = fault, {"error": f"injected {fault}"}
+        elif group == "reverse":
+            status, payload = 200, mock.reverse(params)
+        elif group == "notes" and self.command == "POST":
+            status, payload = mock.create_note(params)
+        elif group == "notes":
+            status, payload = 200, mock.search_notes(params)
+        else:
+            status, payload = 200, {"api": {"version": "0.6"}}
+        self._send(status, payload, headers)
+        mock._log(self.command, url.path, status, started, fault)
+
+    do_GET = _handle
+    do_POST = _handle
+    do_HEAD = _handle
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    mock: "MockOSMServer"
+
+
+class MockOSMServer:
+    """
+    Threaded local HTTP server mimicking OSM Notes and Nominatim.
+
+    Attributes:
+        profiles: 'notes' and 'reverse' FaultProfile
+        requests: Request log, one dict per request with 't', 'method',
+            'path', 'status' (None for hung requests), 'elapsed' and 'fault'
+        reverse_host: Host name used in reverse_url. It must differ from host
+            so the gateway gives Nominatim its own rate limit; by default
+            'localhost' when bound to 127.0.0.1 or all interfaces, else host
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        notes: Optional[FaultProfile] = None,
+        reverse: Optional[FaultProfile] = None,
+        log_path: Optional[str] = None,
+        seed: Optional[int] = None,
+        reverse_host: Optional[str] = None,
+    ):
+        self.reverse_host = reverse_host
+        self.profiles = {"notes": notes or FaultProfile(), "reverse": reverse or FaultProfile()}
+        self.rng = random.Random(seed)
+        self.requests: List[Dict[str, Any]] = []
+        self._notes: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._log_file = open(log_path, "a", encoding="utf-8") if log_path else None
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.mock = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    @property
+    def host(self) -> str:
+        """Bound address, or 127.0.0.1 when bound to all interfaces."""
+        host = self._httpd.server_address[0]
+        return "127.0.0.1" if host in ("", "0.0.0.0") else host
+
+    def _reverse_host(self) -> str:
+        if self.reverse_host:
+            return self.reverse_host
+        # localhost only reaches the server if it listens on 127.0.0.1
+        return "localhost" if self.host == "127.0.0.1" else self.host
+
+    @property
+    def notes_url(self) -> str:
+        return f"http://{self.host}:{self.port}/api/0.6/notes.json"
+
+    @property
+    def reverse_url(self) -> str:
+        return f"http://{self._reverse_host()}:{self.port}/reverse"
+
+    @property
+    def probe_url(self) -> str:
+        return f"http://{self.host}:{self.port}/api/capabilities"
+
+    def start(self) -> "MockOSMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-osm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread:
+            self._httpd.shutdown()
+            self._thread = None
+        self._httpd.server_close()
+        if self._log_file:
+            self._log_file.close()
+
+    def _log(self, method: str, path: str, status: Optional[int], started: float, fault: Any):
+        entry = {
+            "t": time.time(),
+            "method": method,
+            "path": path,
+            "status": status,
+            "elapsed": time.monotonic() - started,
+            "fault": fault,
+        }
+        with self._lock:
+            self.requests.append(entry)
+            if self._log_file:
+                self._log_file.write(json.dumps(entry) + "\n")
+                self._log_file.flush()
+
+    def create_note(self, params: Dict[str, Any]):
+        try:
+            lat, lon = float(params["lat"]), float(params["lon"])
+        except (KeyError, TypeError, ValueError):
+            return 400, {"error": "lat and lon are required"}
+        text = str(params.get("text") or "")
+        if not text:
+            return 400, {"error": "text is required"}
+        with self._lock:
+            note_id = len(self._notes) + 1
+            note = {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": {
+                    "id": note_id,
+                    "status": "open",
+                    "date_created": time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime()),
+                    "comments": [{"action": "opened", "text": text}],
+                },
+            }
+            self._notes.append(note)
+        return 200, note
+
+    def search_notes(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            west, south, east, north = (float(v) for v in str(params.get("bbox", "")).split(","))
+        except ValueError:
+            west, south, east, north = -180.0, -90.0, 180.0, 90.0
+        with self._lock:
+            features = [
+                note for note in self._notes
+                if west <= note["geometry"]["coordinates"][0] <= east
+                and south <= note["geometry"]["coordinates"][1] <= north
+            ]
+        return {"type": "FeatureCollection", "features": features}
+
+    def reverse(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "lat": params.get("lat"),
+            "lon": params.get("lon"),
+            "display_name": "Carrera 7, La Candelaria, Bogotá, Colombia",
+            "address": {"road": "Carrera 7", "suburb": "La Candelaria", "city": "Bogotá", "country": "Colombia"},
+        }
+
+    @property
+    def notes(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._notes)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Request counters.
+
+        Returns:
+            Dict with 'requests', 'notes_created', 'by_status' (status -> count,
+            'hang' for hung requests) and 'faults' (injected faults)
+        """
+        with self._lock:
+            by_status: Dict[Any, int] = {}
+            for entry in self.requests:
+                key = entry["status"] if entry["status"] is not None else "hang"
+                by_status[key] = by_status.get(key, 0) + 1
+            return {
+                "requests": len(self.requests),
+                "notes_created": len(self._notes),
+                "by_status": by_status,
+                "faults": sum(1 for entry in self.requests if entry["fault"] is not None),
+            }
+
+
+def _parse_errors(values: List[str]) -> Dict[int, float]:
+    errors = {}
+    for value in values:
+        status, _, rate = value.partition(":")
+        errors[int(status)] = float(rate)
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock OSM Notes API and Nominatim with fault injection")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--reverse-host", default=None,
+                        help="another name for this server used in NOMINATIM_API_URL "
+                             "(default: localhost on 127.0.0.1, else --host)")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", default="0", help="0.2, uniform:LOW:HIGH, exp:MEAN or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--error", action="append", default=[], metavar="STATUS:RATE",
+                        help="inject an error status, e.g. 429:0.05 (repeatable)")
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After seconds on 429/503")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="fraction of requests that never get a response")
+    parser.add_argument("--hang-seconds", type=float, default=15.0)
+    parser.add_argument("--faults-on", choices=("notes", "reverse", "all"), default="notes",
+                        help="endpoint group the faults apply to")
+    parser.add_argument("--log", default=None, help="append a JSONL line per request to this file")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    def profile():
+        return FaultProfile(
+            latency=parse_latency(args.latency),
+            errors=_parse_errors(args.error),
+            retry_after=args.retry_after,
+            hang_rate=args.hang_rate,
+            hang_seconds=args.hang_seconds,
+        )
+
+    server = MockOSMServer(
+        host=args.host,
+        port=args.port,
+        notes=profile() if args.faults_on in ("notes", "all") else None,
+        reverse=profile() if args.faults_on in ("reverse", "all") else None,
+        log_path=args.log,
+        seed=args.seed,
+        reverse_host=args.reverse_host,
+    ).start()
+    logger.info(f"Mock OSM listening: OSM_API_URL={server.notes_url} NOMINATIM_API_URL={server.reverse_url}")
+    if urlsplit(server.notes_url).hostname == urlsplit(server.reverse_url).hostname:
+        logger.warning("OSM and Nominatim URLs share a host (and its rate limit): set --reverse-host")
+    try:
+        while True:
+            time.sleep(60)
+            logger.info(f"Mock OSM metrics: {server.get_metrics()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,8 @@
 
 import time
 import logging
-from typing import Dict, List, Optional
+import threading
+from typing import Callable, Dict, List, Optional, Set
 from collections import defaultdict
 from datetime import datetime
 
@@ -10,12 +11,15 @@ from .config import (
     DRY_RUN,
     NOTIFICATION_ANTI_SPAM_WINDOW,
     NOTIFICATION_ANTI_SPAM_MAX,
+    TX_DESTINATION_GAP_SECONDS,
 )
 from .database import Database
 from .commands import MSG_ACK_SUCCESS, MSG_ACK_QUEUED, MSG_Q_TO_NOTE, MSG_DUPLICATE
 from .i18n import _
 from .meshtastic_serial import MeshtasticSerial
 from .geocoding import GeocodingService
+from .connectivity import ConnectivityMonitor
+from .tx_scheduler import TxScheduler, PRIORITY_ACK, PRIORITY_RESPONSE, PRIORITY_BULK
 
 logger = logging.getLogger(__name__)
 
@@ -117,13 +121,70 @@ def split_long_message(message: str, max_size: int = MESHTASTIC_MAX_MESSAGE_SIZE
 
 
 class NotificationManager:
-    """Manage DM notifications with anti-spam."""
+    """
+    Manage DM notifications with anti-spam.
+
+    With a TxScheduler, messages are queued for the scheduler thread (ACKs
+    and rejections first, Q→Note and failure notifications last) and every
+    method returns immediately; database flags such as notified_sent are set
+    from the scheduler's on_sent callback once the DM actually went out.
+    Without one, parts are sent inline on the calling thread.
+    """
 
-    def __init__(self, serial: MeshtasticSerial, db: Database):
+    def __init__(
+        self,
+        serial: MeshtasticSerial,
+        db: Database,
+        connectivity: Optional[ConnectivityMonitor] = None,
+        tx_scheduler: Optional[TxScheduler] = None,
+        geocoding: Optional[GeocodingService] = None,
+    ):
         self.serial = serial
         self.db = db
+        self.tx_scheduler = tx_scheduler
         self.node_notification_times: Dict[str, List[float]] = defaultdict(list)
-        self.geocoding = GeocodingService()
+        self.geocoding = geocoding or GeocodingService(connectivity=connectivity)
+        # Notifications handed to the scheduler but not sent yet, so the next
+        # worker pass does not queue them again. The lock also guards
+        # node_notification_times (ingestion workers and the worker thread)
+        self._in_flight: Set[str] = set()
+        self._in_flight_lock = threading.Lock()
+
+    def _send_parts(
+        self,
+        node_id: str,
+        parts: List[str],
+        priority: int,
+        on_sent: Optional[Callable[[bool], None]] = None,
+    ):
+        """Queue parts on the TX scheduler, or send them inline when there is none."""
+        if self.tx_scheduler:
+            self.tx_scheduler.send_dm(node_id, parts, priority=priority, on_sent=on_sent)
+            return
+
+        success = True
+        for i, part in enumerate(parts):
+            if i > 0:
+                # Wait between parts to avoid overwhelming the node
+                time.sleep(TX_DESTINATION_GAP_SECONDS)
+            if not self.serial.send_dm(node_id, part):
+                logger.error(f"Failed to send part {i+1}/{len(parts)} to {node_id}")
+                success = False
+                break
+        if on_sent:
+            on_sent(success)
+
+    def _claim(self, key: str) -> bool:
+        """Mark a notification as in flight. Returns False if it already is."""
+        with self._in_flight_lock:
+            if key in self._in_flight:
+                return False
+            self._in_flight.add(key)
+            return True
+
+    def _release(self, key: str):
+        with self._in_flight_lock:
+            self._in_flight.discard(key)
 
     def send_ack(
         self,
@@ -167,17 +228,14 @@ class NotificationManager:
         show_warning = (total_notes > 0 and total_notes % 5 == 0)
 
         if status == "success" and osm_note_id and osm_note_url:
-            # Get note location for geocoding
+            # Address resolved in the background when the note was created;
+            # the ACK never waits for geocoding, it only uses it if ready
             location_str = ""
             if local_queue_id:
                 note_data = self.db.get_note_by_queue_id(local_queue_id)
-                if note_data:
-                    lat = note_data.get("lat")
-                    lon = note_data.get("lon")
-                    if lat and lon:
-                        address = self.geocoding.reverse_geocode(lat, lon)
-                        if address:
-                            location_str = _("📍 Ubicación: {address}\n", user_lang).format(address=address)
+                address = note_data.get("address") if note_data else None
+                if address:
+                    location_str = _("📍 Ubicación: {address}\n", user_lang).format(address=address)
 
             message = MSG_ACK_SUCCESS(
                 id=osm_note_id,
@@ -206,22 +264,15 @@ class NotificationManager:
                 logger.debug(f"Anti-spam: skipping ACK to {node_id}")
                 return
 
-            # Send all parts with delays
-            for i, part in enumerate(parts):
-                if i > 0:
-                    # Wait between parts to avoid overwhelming the node
-                    # Increased delay to 3 seconds for better reliability
-                    logger.debug(f"Waiting before sending ACK part {i+1}/{len(parts)}")
-                    time.sleep(3.0)
-                success = self.serial.send_dm(node_id, part)
+            self._record_notification(node_id)
+
+            def on_sent(success: bool):
                 if success:
-                    logger.info(f"Successfully sent ACK part {i+1}/{len(parts)} to {node_id} ({len(part.encode('utf-8'))} bytes)")
-                    # Only record notification for the first part
-                    if i == 0:
-                        self._record_notification(node_id)
+                    logger.info(f"Sent ACK ({status}) to {node_id} in {len(parts)} part(s)")
                 else:
-                    logger.error(f"Failed to send ACK part {i+1}/{len(parts)} to {node_id}")
-                    break
+                    logger.error(f"Failed to send ACK ({status}) to {node_id}")
+
+            self._send_parts(node_id, parts, PRIORITY_ACK, on_sent)
 
     def send_reject(self, node_id: str, message: str):
         """Send rejection message."""
@@ -245,24 +296,10 @@ class NotificationManager:
             logger.debug(f"Anti-spam: skipping command response to {node_id}")
             return
 
-        # Send all parts (they're part of the same response)
-        # Only record one notification to avoid triggering anti-spam for parts
+        # Parts are paced by the scheduler; they count as one notification
         logger.info(f"Sending {len(parts)} parts to {node_id}")
-        for i, part in enumerate(parts):
-            if i > 0:
-                # Longer delay between parts to ensure mesh network can handle them
-                # Meshtastic mesh networks may need more time to propagate messages
-                # Increased delay to 3.5 seconds to reduce packet loss (especially for osmhelp/osmmorehelp)
-                logger.debug(f"Waiting before sending part {i+1}/{len(parts)}")
-                time.sleep(3.5)
-            success = self.serial.send_dm(node_id, part)
-            if success:
-                logger.info(f"Successfully sent part {i+1}/{len(parts)} to {node_id} ({len(part.encode('utf-8'))} bytes)")
-                # Only record notification for the first part
-                if i == 0:
-                    self._record_notification(node_id)
-            else:
-                logger.error(f"Failed to send part {i+1}/{len(parts)} to {node_id}")
+        self._record_notification(node_id)
+        self._send_parts(node_id, parts, PRIORITY_RESPONSE)
 
     def process_sent_notifications(self):
         """Process pending sent notifications (Q→Note)."""
@@ -282,18 +319,17 @@ class NotificationManager:
             # Check anti-spam
             if self._check_antispam(node_id):
                 # Send summary instead
-                self._send_summary(node_id, len(notes))
+                self._send_summary(node_id, notes)
             else:
                 # Send individual notifications
                 for note in notes[:NOTIFICATION_ANTI_SPAM_MAX]:
-                    # Get location for geocoding
+                    key = f"sent:{note['local_queue_id']}"
+                    if not self._claim(key):
+                        continue
                     location_str = ""
-                    lat = note.get("lat")
-                    lon = note.get("lon")
-                    if lat and lon:
-                        address = self.geocoding.reverse_geocode(lat, lon)
-                        if address:
-                            location_str = _("\n📍 Ubicación: {address}", user_lang).format(address=address)
+                    address = self._note_address(note)
+                    if address:
+                        location_str = _("\n📍 Ubicación: {address}", user_lang).format(address=address)
 
                     message = MSG_Q_TO_NOTE(
                         queue_id=note["local_queue_id"],
@@ -302,9 +338,31 @@ class NotificationManager:
                         locale=user_lang
                     ) + location_str
 
-                    if self.serial.send_dm(node_id, message):
-                        self.db.mark_notified_sent(note["local_queue_id"])
-                        self._record_notification(node_id)
+                    def on_sent(success: bool, queue_id: str = note["local_queue_id"], key: str = key):
+                        if success:
+                            self.db.mark_notified_sent(queue_id)
+                        self._release(key)
+
+                    self._record_notification(node_id)
+                    self._send_parts(node_id, [message], PRIORITY_BULK, on_sent)
+
+    def _note_address(self, note: Dict) -> Optional[str]:
+        """
+        Stored address of a note, or its offline/cached address.
+
+        Never queries Nominatim: this runs on the worker thread, and a miss
+        is left to AddressResolver (the notification goes without address).
+        """
+        if note.get("address"):
+            return note["address"]
+        lat = note.get("lat")
+        lon = note.get("lon")
+        if lat is None or lon is None:
+            return None
+        address = self.geocoding.lookup_local(lat, lon)
+        if address:
+            self.db.set_note_address(note["local_queue_id"], address)
+        return address
 
     def process_failed_notifications(self):
         """Process notifications for notes that failed after max retries."""
@@ -327,11 +385,19 @@ class NotificationManager:
                 + _("Usa #osmlist para ver detalles.\n", user_lang)
                 + _("⚠️ No envíes datos personales ni emergencias médicas.", user_lang)
             )
-            if self.serial.send_dm(node_id, error_msg):
-                # Mark as notified
-                for note in notes:
-                    self.db.mark_notified_sent(note["local_queue_id"])
-                self._record_notification(node_id)
+            key = f"failed:{node_id}"
+            if not self._claim(key):
+                continue
+
+            def on_sent(success: bool, notes: List[Dict] = notes, key: str = key):
+                if success:
+                    # Mark as notified
+                    for note in notes:
+                        self.db.mark_notified_failed(note["local_queue_id"])
+                self._release(key)
+
+            self._record_notification(node_id)
+            self._send_parts(node_id, [error_msg], PRIORITY_BULK, on_sent)
 
     def _send_dm_with_antispam(self, node_id: str, message: str):
         """Send DM with anti-spam check."""
@@ -339,33 +405,58 @@ class NotificationManager:
             logger.debug(f"Anti-spam: skipping DM to {node_id}")
             return
 
-        if self.serial.send_dm(node_id, message):
-            self._record_notification(node_id)
+        self._record_notification(node_id)
+        self._send_parts(node_id, [message], PRIORITY_ACK)
 
     def _check_antispam(self, node_id: str) -> bool:
         """Check if node has exceeded anti-spam limit."""
         now = time.time()
-        times = self.node_notification_times[node_id]
+        with self._in_flight_lock:
+            times = self.node_notification_times[node_id]
 
-        # Remove old entries
-        cutoff = now - NOTIFICATION_ANTI_SPAM_WINDOW
-        times[:] = [t for t in times if t > cutoff]
+            # Remove old entries
+            cutoff = now - NOTIFICATION_ANTI_SPAM_WINDOW
+            times[:] = [t for t in times if t > cutoff]
 
-        return len(times) >= NOTIFICATION_ANTI_SPAM_MAX
+            return len(times) >= NOTIFICATION_ANTI_SPAM_MAX
 
     def _record_notification(self, node_id: str):
         """Record notification timestamp."""
-        self.node_notification_times[node_id].append(time.time())
+        with self._in_flight_lock:
+            self.node_notification_times[node_id].append(time.time())
+
+    def _send_summary(self, node_id: str, notes: List[Dict]):
+        """
+        Send summary message when anti-spam triggered.
+
+        Covers exactly the given notes, minus those whose own Q→Note DM is
+        still in flight; only those are marked notified once it is sent.
+        """
+        key = f"summary:{node_id}"
+        if not self._claim(key):
+            return
+        # Claim each note like an individual notification, so neither a later
+        # pass nor another summary reports it again while this one is queued
+        note_keys = {}
+        for note in notes:
+            note_key = f"sent:{note['local_queue_id']}"
+            if self._claim(note_key):
+                note_keys[note["local_queue_id"]] = note_key
+        if not note_keys:
+            self._release(key)
+            return
 
-    def _send_summary(self, node_id: str, count: int):
-        """Send summary message when anti-spam triggered."""
         message = (
-            f"✅ Se enviaron {count} reportes en cola. "
+            f"✅ Se enviaron {len(note_keys)} reportes en cola. "
             "Usa #osmlist para ver detalles."
         )
-        if self.serial.send_dm(node_id, message):
-            # Mark all as notified
-            pending = self.db.get_pending_for_notification()
-            for note in pending:
-                if note["node_id"] == node_id:
-                    self.db.mark_notified_sent(note["local_queue_id"])
+
+        def on_sent(success: bool):
+            if success:
+                for queue_id in note_keys:
+                    self.db.mark_notified_sent(queue_id)
+            for note_key in note_keys.values():
+                self._release(note_key)
+            self._release(key)
+
+        self._send_parts(node_id, [message], PRIORITY_BULK, on_sent)
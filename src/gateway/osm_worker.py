@@ -1,30 +1,111 @@
 """OSM Notes API worker."""
 
 import time
+import random
 import logging
+import threading
 import requests
-from typing import Optional, Dict, Any, Tuple
-from datetime import datetime
-from collections import defaultdict
+from typing import Optional, Dict, Any, Tuple, Callable
+from datetime import datetime, timezone
+from collections import OrderedDict, defaultdict, deque
+from collections.abc import Mapping
+from urllib.parse import urlsplit
 
 from .config import (
-    OSM_API_URL, OSM_RATE_LIMIT_SECONDS, DRY_RUN,
-    OSM_MAX_RETRIES, OSM_RETRY_DELAY_SECONDS,
+    OSM_API_URL, DRY_RUN,
+    OSM_MAX_RETRIES, OSM_RETRY_DELAY_SECONDS, OSM_RETRY_MAX_DELAY_SECONDS, OSM_RETRY_JITTER,
+    OSM_RECONCILE_RADIUS, OSM_RECONCILE_CLOCK_SLACK,
+    OSM_FRESH_PRIORITY_SECONDS, OSM_QUEUE_WAIT_SAMPLES, OSM_QUEUE_WAIT_MAX_NODES,
 )
+from .connectivity import ConnectivityMonitor
 from .database import Database
+from .http_client import HttpClient, get_client
+from .rate_controller import AdaptiveRateController
 from .i18n import _
 
 logger = logging.getLogger(__name__)
 
 
+# note_lookup(lat, lon, text, since) -> {'id', 'url'} of an existing OSM note
+# matching a submission started at `since`, or None
+NoteLookup = Callable[[float, float, str, float], Optional[Dict[str, Any]]]
+
+
 class OSMWorker:
-    """Worker for sending notes to OSM API."""
+    """
+    Worker for sending notes to OSM API.
+
+    Submissions of queued notes are journaled: notes.submit_started_at is
+    committed before the POST and cleared once the outcome is known. A note
+    still journaled on its next attempt (the process died, or the request
+    timed out, after OSM may have created it) is first looked up with
+    note_lookup and only resubmitted if OSM does not have it.
+    """
 
-    def __init__(self, db: Database):
+    def __init__(
+        self,
+        db: Database,
+        connectivity: Optional[ConnectivityMonitor] = None,
+        http: Optional[HttpClient] = None,
+        note_lookup: Optional[NoteLookup] = None,
+        fresh_priority_seconds: float = OSM_FRESH_PRIORITY_SECONDS,
+    ):
         self.db = db
-        self.last_send_time = 0.0
-        self.retry_counts: Dict[str, int] = {}  # Track retry counts per queue_id
-        self._last_error_detail: Optional[str] = None  # Store last error detail for process_pending
+        self.fresh_priority_seconds = fresh_priority_seconds
+        self.connectivity = connectivity
+        # Shared session; the OSM host's rate limit (OSM_RATE_LIMIT_SECONDS) lives
+        # there and is adapted to OSM's responses by the rate controller
+        self.http = http or get_client()
+        self.rate = AdaptiveRateController(self.http, urlsplit(OSM_API_URL).hostname)
+        # send_note is called from the worker thread and from ingestion workers
+        # (immediate sends): sends are serialized, and the last-failure details
+        # are kept per thread
+        self._send_lock = threading.Lock()
+        self._local = threading.local()
+        self.note_lookup = note_lookup or self.find_submitted_note
+        # Metrics have their own lock: _send_lock is held across HTTP requests
+        self._metrics_lock = threading.Lock()
+        self._reconciled = 0
+        self._resubmitted = 0
+        # node_id -> recent queue waits (seconds from creation to sent), most
+        # recently sent node last
+        self._queue_waits: OrderedDict[str, deque] = OrderedDict()
+
+    @property
+    def _last_error_detail(self) -> Optional[str]:
+        """Error detail of this thread's last failed send_note, for process_pending."""
+        return getattr(self._local, "error_detail", None)
+
+    @_last_error_detail.setter
+    def _last_error_detail(self, value: Optional[str]):
+        self._local.error_detail = value
+
+    @property
+    def _last_failure_offline(self) -> bool:
+        """Whether this thread's last failed send_note never reached the OSM server."""
+        return getattr(self._local, "failure_offline", False)
+
+    @_last_failure_offline.setter
+    def _last_failure_offline(self, value: bool):
+        self._local.failure_offline = value
+
+    @property
+    def _last_throttle_wait(self) -> Optional[float]:
+        """Seconds OSM asked this thread's last failed send_note to back off (None if not throttled)."""
+        return getattr(self._local, "throttle_wait", None)
+
+    @_last_throttle_wait.setter
+    def _last_throttle_wait(self, value: Optional[float]):
+        self._local.throttle_wait = value
+
+    @property
+    def _last_throttle_charged(self) -> bool:
+        """Whether this thread's last throttled send_note still spends an attempt (5xx without Retry-After)."""
+        return getattr(self._local, "throttle_charged", False)
+
+    @_last_throttle_charged.setter
+    def _last_throttle_charged(self, value: bool):
+        self._local.throttle_charged = value
 
     def send_note(
         self,
@@ -32,17 +113,23 @@ class OSMWorker:
         lon: float,
         text: str,
         locale: Optional[str] = None,
+        local_queue_id: Optional[str] = None,
     ) -> Optional[Dict[str, Any]]:
         """
         Send note to OSM Notes API with rate limiting.
         
-        Implements rate limiting (minimum 3 seconds between sends) and
-        handles various error conditions gracefully.
+        Sends are spaced by the OSM host's adaptive rate limit (see
+        AdaptiveRateController): when no token is available the send is
+        skipped instead of waiting for one, as it is while a Retry-After
+        pause is running. Handles various error conditions gracefully.
         
         Args:
             lat: Latitude coordinate
             lon: Longitude coordinate
             text: Note text content (should be normalized)
+            local_queue_id: Queued note being sent; its submission is
+                journaled, and reconciled with OSM first if a previous
+                attempt has an unknown outcome
             
         Returns:
             Dictionary with 'id' and 'url' keys on success, None on failure.
@@ -64,14 +151,67 @@ class OSMWorker:
                 "url": "https://www.openstreetmap.org/note/999999",
             }
 
-        # Rate limiting
-        now = time.time()
-        time_since_last = now - self.last_send_time
-        if time_since_last < OSM_RATE_LIMIT_SECONDS:
-            sleep_time = OSM_RATE_LIMIT_SECONDS - time_since_last
-            logger.debug(f"Rate limiting: sleeping {sleep_time:.1f}s")
-            time.sleep(sleep_time)
+        self._last_failure_offline = False
+        self._last_throttle_wait = None
+        self._last_throttle_charged = False
+
+        # Retry-After still running: do not spend a request OSM will refuse
+        paused_for = self.rate.paused_for()
+        if paused_for > 0:
+            logger.debug(f"Skipping OSM send: Retry-After pause, {paused_for:.0f}s left")
+            self._last_error_detail = self._parse_osm_error(429, "")
+            self._last_throttle_wait = paused_for
+            return None
+
+        # Circuit open: fail fast instead of waiting for a network timeout
+        if self.connectivity and not self.connectivity.allow_request():
+            logger.debug("Skipping OSM send: connectivity circuit is open")
+            self._last_error_detail = "Error de conexión (sin Internet?)"
+            self._last_failure_offline = True
+            return None
+
+        with self._send_lock:
+            # Never sleep for a token while holding the lock: the note stays
+            # queued and the worker retries once the rate allows it
+            wait = self.rate.try_acquire()
+            if wait > 0:
+                logger.debug(f"Skipping OSM send: rate limited, next slot in {wait:.1f}s")
+                self._last_error_detail = "Límite de envíos a OSM, en cola"
+                self._last_throttle_wait = wait
+                return None
+
+            if local_queue_id:
+                note = self.db.get_note_by_queue_id(local_queue_id)
+                if note and note.get("submit_started_at"):
+                    try:
+                        existing = self.note_lookup(lat, lon, text, note["submit_started_at"])
+                    except requests.exceptions.RequestException as e:
+                        # Cannot tell whether OSM has it: do not risk a duplicate
+                        logger.warning(f"Cannot reconcile {local_queue_id} with OSM: {e}")
+                        self._last_error_detail = "No se pudo verificar el envío anterior en OSM"
+                        self._last_failure_offline = True
+                        return None
+                    if existing:
+                        with self._metrics_lock:
+                            self._reconciled += 1
+                        logger.warning(
+                            f"Note {local_queue_id} was already created on OSM (#{existing['id']}), not resubmitting"
+                        )
+                        return existing
+                    with self._metrics_lock:
+                        self._resubmitted += 1
+                    logger.info(f"Note {local_queue_id} not found on OSM, resubmitting")
+            return self._post_note(lat, lon, text, locale, local_queue_id)
 
+    def _post_note(
+        self,
+        lat: float,
+        lon: float,
+        text: str,
+        locale: Optional[str],
+        local_queue_id: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """POST of one note. Caller holds _send_lock and took the rate-limit token."""
         try:
             # Add project attribution to note text (translated to user's language)
             if locale is None:
@@ -88,16 +228,22 @@ class OSMWorker:
 
             logger.info(f"Sending note to OSM: ({lat}, {lon}) - {text[:50]}...")
 
-            response = requests.post(
+            if local_queue_id:
+                self.db.journal_submission(local_queue_id, time.time())
+
+            response = self.http.post(
                 OSM_API_URL,
                 json=payload,
                 timeout=10,
                 headers={"Content-Type": "application/json"},
+                rate_limited=False,
             )
 
-            self.last_send_time = time.time()
+            if self.connectivity:
+                self.connectivity.record_success()
 
             if response.status_code == 200:
+                self.rate.record_success()
                 data = response.json()
                 note_id = data.get("properties", {}).get("id")
                 note_url = f"https://www.openstreetmap.org/note/{note_id}"
@@ -114,17 +260,38 @@ class OSMWorker:
                 logger.error(error_msg)
                 # Store error detail for later retrieval
                 self._last_error_detail = error_detail
+                # A 4xx is a definite rejection: the note was not created. A 5xx
+                # may come after OSM (or a proxy in front of it) created it, so
+                # the journal stays and the next attempt reconciles first
+                if local_queue_id and 400 <= response.status_code < 500:
+                    self.db.clear_submission(local_queue_id)
+                if self.rate.is_throttle(response.status_code):
+                    headers = getattr(response, "headers", None)
+                    retry_after = headers.get("Retry-After") if isinstance(headers, Mapping) else None
+                    pause = self.rate.record_throttle(response.status_code, retry_after)
+                    # The rest of the batch waits for the pause (or the reduced
+                    # rate). 429/503 and any Retry-After are about load, not this
+                    # note: it is retried without spending an attempt; another
+                    # 5xx may be caused by the note and still counts as one
+                    self._last_throttle_wait = pause
+                    self._last_throttle_charged = not (pause or response.status_code in (429, 503))
                 return None
 
         except requests.exceptions.Timeout:
             error_msg = "OSM API timeout"
             logger.error(error_msg)
             self._last_error_detail = "Timeout al conectar con OSM API"
+            self._last_failure_offline = True
+            if self.connectivity:
+                self.connectivity.record_failure()
             return None
         except requests.exceptions.ConnectionError:
             error_msg = "OSM API connection error (no internet?)"
             logger.error(error_msg)
             self._last_error_detail = "Error de conexión (sin Internet?)"
+            self._last_failure_offline = True
+            if self.connectivity:
+                self.connectivity.record_failure()
             return None
         except Exception as e:
             error_msg = f"Unexpected error sending to OSM: {e}"
@@ -132,6 +299,103 @@ class OSMWorker:
             self._last_error_detail = f"Error inesperado: {str(e)[:50]}"
             return None
 
+    def find_submitted_note(self, lat: float, lon: float, text: str, since: float) -> Optional[Dict[str, Any]]:
+        """
+        Look for an OSM note created by an earlier submission of this note.
+
+        Queries the notes around (lat, lon) and matches the exact position and
+        the first comment's text (which starts with the submitted text, before
+        the attribution).
+
+        Args:
+            since: When the earlier submission started (Unix time); notes
+                created more than OSM_RECONCILE_CLOCK_SLACK before do not match
+
+        Returns:
+            {'id', 'url'} of the matching note, or None if OSM has none
+
+        Raises:
+            requests.exceptions.RequestException: if OSM cannot be queried
+        """
+        r = OSM_RECONCILE_RADIUS
+        # A read, not a submission: it does not spend the OSM host's rate
+        # limit (send_note calls this while holding _send_lock)
+        response = self.http.get(
+            OSM_API_URL,
+            params={"bbox": f"{lon - r},{lat - r},{lon + r},{lat + r}", "closed": -1, "limit": 100},
+            timeout=10,
+            rate_limited=False,
+        )
+        if response.status_code != 200:
+            raise requests.exceptions.HTTPError(f"OSM notes query returned {response.status_code}")
+
+        for feature in response.json().get("features", []):
+            note_lon, note_lat = feature.get("geometry", {}).get("coordinates", (None, None))
+            if note_lat is None or abs(note_lat - lat) > 1e-5 or abs(note_lon - lon) > 1e-5:
+                continue
+            properties = feature.get("properties", {})
+            comments = properties.get("comments") or []
+            if not comments or not (comments[0].get("text") or "").strip().startswith(text.strip()):
+                continue
+            created = self._parse_osm_date(properties.get("date_created"))
+            if created is not None and created < since - OSM_RECONCILE_CLOCK_SLACK:
+                continue
+            note_id = properties.get("id")
+            return {"id": note_id, "url": f"https://www.openstreetmap.org/note/{note_id}"}
+        return None
+
+    @staticmethod
+    def _parse_osm_date(value: Optional[str]) -> Optional[float]:
+        """Unix time of an OSM API date ("2026-01-31 12:00:00 UTC"), or None."""
+        try:
+            return datetime.strptime(value, "%Y-%m-%d %H:%M:%S UTC").replace(tzinfo=timezone.utc).timestamp()
+        except (TypeError, ValueError):
+            return None
+
+    def _record_queue_wait(self, note: Dict[str, Any]):
+        """Remember how long a note waited in the queue before it was sent."""
+        try:
+            created = datetime.fromisoformat(str(note["created_at"]))
+        except (KeyError, ValueError):
+            return
+        wait = max(0.0, (datetime.utcnow() - created).total_seconds())
+        node_id = note["node_id"]
+        with self._metrics_lock:
+            waits = self._queue_waits.pop(node_id, None) or deque(maxlen=OSM_QUEUE_WAIT_SAMPLES)
+            waits.append(wait)
+            self._queue_waits[node_id] = waits
+            while len(self._queue_waits) > OSM_QUEUE_WAIT_MAX_NODES:
+                self._queue_waits.popitem(last=False)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Submission journal counters and per-node queue waits.
+
+        Returns:
+            Dict with 'reconciled' (unknown outcomes found on OSM, duplicates
+            avoided), 'resubmitted' (unknown outcomes not found, sent again)
+            and 'queue_wait': node_id -> 'count', 'p50', 'p95' and 'max'
+            seconds from creation to sent, over the node's recent notes
+        """
+        def percentile(ordered, pct):
+            return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+        with self._metrics_lock:
+            queue_wait = {}
+            for node_id, waits in self._queue_waits.items():
+                ordered = sorted(waits)
+                queue_wait[node_id] = {
+                    "count": len(ordered),
+                    "p50": percentile(ordered, 0.50),
+                    "p95": percentile(ordered, 0.95),
+                    "max": ordered[-1],
+                }
+            return {
+                "reconciled": self._reconciled,
+                "resubmitted": self._resubmitted,
+                "queue_wait": queue_wait,
+            }
+
     def _parse_osm_error(self, status_code: int, response_text: str) -> str:
         """
         Parse OSM API error response and return user-friendly message.
@@ -143,7 +407,7 @@ class OSMWorker:
         if status_code == 400:
             return "Solicitud inválida (coordenadas o texto incorrectos)"
         elif status_code == 403:
-            return "Acceso denegado (posible rate limiting)"
+            return "Acceso denegado (cuenta bloqueada o acción no permitida)"
         elif status_code == 429:
             return "Demasiadas solicitudes (rate limiting)"
         elif status_code == 500:
@@ -162,80 +426,124 @@ class OSMWorker:
                 pass
             return response_text[:100] if response_text else "Error desconocido"
 
+    @staticmethod
+    def retry_delay(retry_count: int) -> float:
+        """
+        Delay in seconds before the next attempt after `retry_count` failures.
+
+        Exponential backoff from OSM_RETRY_DELAY_SECONDS, capped at
+        OSM_RETRY_MAX_DELAY_SECONDS, with +/- OSM_RETRY_JITTER random jitter so
+        notes that failed together do not retry in lockstep.
+        """
+        delay = OSM_RETRY_DELAY_SECONDS * (2 ** max(retry_count - 1, 0))
+        delay = min(delay, OSM_RETRY_MAX_DELAY_SECONDS)
+        return delay * random.uniform(1 - OSM_RETRY_JITTER, 1 + OSM_RETRY_JITTER)
+
     def process_pending(self, limit: int = 10) -> int:
         """
-        Process pending notes.
+        Process pending notes that are due for an attempt.
+
+        The batch is picked fairly across nodes (round-robin by node_id, with
+        fresh reports first if fresh_priority_seconds is set), so a node with
+        a large backlog does not hold back other nodes' reports.
+
+        Failed attempts are rescheduled in the database (retry_count and
+        next_attempt_at), so this method never sleeps waiting for a retry and
+        the schedule survives restarts. Connection errors and timeouts do not
+        count as attempts: the note stays due and the rest of the batch is left
+        for the next cycle. Throttling responses and an exhausted rate limit
+        also end the batch, which resumes when the pause or the next token is
+        due.
+
         Returns: number of notes successfully sent.
         """
-        pending = self.db.get_pending_notes(limit=limit)
+        pending = self.db.get_pending_notes_fair(limit=limit, fresh_seconds=self.fresh_priority_seconds)
         if not pending:
             return 0
 
         sent_count = 0
         for note in pending:
             queue_id = note["local_queue_id"]
-            
-            # Get retry count
-            retry_count = self.retry_counts.get(queue_id, 0)
-            
+            retry_count = note.get("retry_count") or 0
+
             # Check if max retries exceeded
             if retry_count >= OSM_MAX_RETRIES:
                 error_msg = f"Falló después de {OSM_MAX_RETRIES} intentos. Revisa logs."
-                self.db.update_note_error(queue_id, error_msg, retry_count=retry_count)
+                # Terminal state: the note leaves the pending queue for good
+                self.db.mark_note_failed(queue_id, error_msg)
                 logger.warning(f"Max retries exceeded for {queue_id}")
-                # Remove from retry tracking
-                del self.retry_counts[queue_id]
                 continue
-            
+
             # Get user's preferred language for attribution
             user_locale = self.db.get_user_language(note["node_id"])
-            
+
             result = self.send_note(
                 lat=note["lat"],
                 lon=note["lon"],
                 text=note["text_normalized"],
                 locale=user_locale,
+                local_queue_id=queue_id,
             )
 
             if result:
-                # Success - update note and clear retry count
                 self.db.update_note_sent(
                     local_queue_id=queue_id,
                     osm_note_id=result["id"],
                     osm_note_url=result["url"],
                 )
-                if queue_id in self.retry_counts:
-                    del self.retry_counts[queue_id]
+                self._record_queue_wait(note)
                 sent_count += 1
+                continue
+
+            # Get error message - use last error detail from send_note if available
+            if self._last_error_detail:
+                last_error = self._last_error_detail
+                self._last_error_detail = None  # Clear after use
             else:
-                # Failure - increment retry count
-                retry_count += 1
-                self.retry_counts[queue_id] = retry_count
-                
-                # Get error message - use last error detail from send_note if available
-                if self._last_error_detail:
-                    last_error = self._last_error_detail
-                    self._last_error_detail = None  # Clear after use
-                else:
-                    # Get last error from note if available, otherwise use default
-                    note_data = self.db.get_note_by_queue_id(queue_id)
-                    if note_data and note_data.get("last_error"):
-                        last_error = note_data.get("last_error")
-                    else:
-                        # Default error message if not set yet
-                        last_error = "Error al enviar a OSM API"
-                
-                # Update with error and retry count
+                last_error = note.get("last_error") or "Error al enviar a OSM API"
+
+            if self._last_failure_offline:
+                # No internet: keep the note due without spending an attempt
+                self.db.update_note_error(local_queue_id=queue_id, error=last_error)
+                logger.info("OSM API unreachable, leaving remaining pending notes for next cycle")
+                break
+
+            throttle_wait = self._last_throttle_wait
+            if throttle_wait is not None and not self._last_throttle_charged:
+                # Throttled or rate limited: wait as long as OSM asked (or
+                # until the next token) without spending an attempt
+                rate = self.rate.rate
+                delay = throttle_wait or (1.0 / rate if rate else 0.0)
                 self.db.update_note_error(
                     local_queue_id=queue_id,
                     error=last_error,
-                    retry_count=retry_count,
+                    next_attempt_at=time.time() + delay,
                 )
-                
-                # If not max retries, note will be retried later
-                if retry_count < OSM_MAX_RETRIES:
-                    logger.info(f"Will retry {queue_id} later (attempt {retry_count}/{OSM_MAX_RETRIES})")
-                    # Sleep before next retry
-                    time.sleep(OSM_RETRY_DELAY_SECONDS)
+                logger.info(f"OSM API throttling, leaving remaining pending notes for {delay:.0f}s")
+                break
+
+            retry_count += 1
+            if retry_count >= OSM_MAX_RETRIES:
+                error_msg = f"Falló después de {OSM_MAX_RETRIES} intentos: {last_error}"
+                self.db.mark_note_failed(queue_id, error_msg)
+                logger.warning(f"Max retries exceeded for {queue_id}")
+                if throttle_wait is not None:
+                    break
+                continue
+
+            delay = self.retry_delay(retry_count)
+            self.db.update_note_error(
+                local_queue_id=queue_id,
+                error=last_error,
+                retry_count=retry_count,
+                next_attempt_at=time.time() + delay,
+            )
+            logger.info(
+                f"Will retry {queue_id} in {delay:.0f}s (attempt {retry_count}/{OSM_MAX_RETRIES})"
+            )
+            if throttle_wait is not None:
+                # OSM server error: do not hammer it with the rest of the batch
+                logger.info("OSM API throttling, leaving remaining pending notes for next cycle")
+                break
 
         return sent_count
@@ -2,11 +2,12 @@
 
 import time
 import logging
-from typing import Optional, Tuple, Dict
+import threading
+from typing import Optional, Tuple, Dict, Set
 from dataclasses import dataclass
 
 from .database import Database
-from .config import DB_PATH
+from .config import DB_PATH, POSITION_FLUSH_INTERVAL, POSITION_FLUSH_MAX_PENDING
 
 logger = logging.getLogger(__name__)
 
@@ -31,16 +32,35 @@ class PositionCache:
     Attributes:
         positions: Dictionary mapping node_id to Position objects (in-memory cache)
         db: Database instance for persistence
+        write_behind: If True, updates are batched instead of written one by one
         
     Note:
-        Positions are automatically persisted to SQLite on update.
+        By default positions are persisted to SQLite on every update
+        (write-through). In write-behind mode memory is authoritative: updated
+        nodes are marked dirty and a background thread writes them in one
+        transaction every flush_interval seconds, or sooner once
+        flush_max_pending nodes are dirty. Call close() on shutdown to flush.
         Cache is loaded from database on initialization.
         Positions older than 24 hours are automatically cleaned up.
     """
 
-    def __init__(self, db: Optional[Database] = None):
+    def __init__(
+        self,
+        db: Optional[Database] = None,
+        write_behind: bool = False,
+        flush_interval: float = POSITION_FLUSH_INTERVAL,
+        flush_max_pending: int = POSITION_FLUSH_MAX_PENDING,
+    ):
         self.positions: Dict[str, Position] = {}
         self.db = db or Database(db_path=DB_PATH)
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.flush_max_pending = flush_max_pending
+        self._lock = threading.Lock()
+        self._dirty: Set[str] = set()
+        self._flush_wakeup = threading.Event()
+        self._stopping = False
+        self._flush_thread: Optional[threading.Thread] = None
         
         # Load positions from database on startup
         self._load_from_db()
@@ -48,6 +68,12 @@ class PositionCache:
         # Cleanup old positions (older than 24 hours)
         self.db.cleanup_old_positions(max_age_seconds=86400)
 
+        if self.write_behind:
+            self._flush_thread = threading.Thread(
+                target=self._flush_loop, name="position-flush", daemon=True
+            )
+            self._flush_thread.start()
+
     def _load_from_db(self):
         """Load positions from database into memory cache."""
         try:
@@ -65,32 +91,88 @@ class PositionCache:
             logger.warning(f"Failed to load positions from database: {e}")
 
     def update(self, node_id: str, lat: float, lon: float):
-        """Update position for a node (both memory and database)."""
+        """Update position for a node (memory now, database now or on next flush)."""
         now = time.time()
         
         # Update in-memory cache
-        if node_id in self.positions:
-            self.positions[node_id].lat = lat
-            self.positions[node_id].lon = lon
-            self.positions[node_id].received_at = now
-            self.positions[node_id].seen_count += 1
-            seen_count = self.positions[node_id].seen_count
+        with self._lock:
+            if node_id in self.positions:
+                self.positions[node_id].lat = lat
+                self.positions[node_id].lon = lon
+                self.positions[node_id].received_at = now
+                self.positions[node_id].seen_count += 1
+                seen_count = self.positions[node_id].seen_count
+            else:
+                self.positions[node_id] = Position(
+                    lat=lat,
+                    lon=lon,
+                    received_at=now,
+                    seen_count=1,
+                )
+                seen_count = 1
+            if self.write_behind:
+                self._dirty.add(node_id)
+                flush_now = len(self._dirty) >= self.flush_max_pending
+        
+        if self.write_behind:
+            # Persisted by the flush thread, never on the packet handler's thread
+            if flush_now:
+                self._flush_wakeup.set()
         else:
-            self.positions[node_id] = Position(
-                lat=lat,
-                lon=lon,
-                received_at=now,
-                seen_count=1,
-            )
-            seen_count = 1
+            # Persist to database
+            try:
+                self.db.save_position(node_id, lat, lon, now, seen_count)
+            except Exception as e:
+                logger.warning(f"Failed to persist position for {node_id}: {e}")
         
-        # Persist to database
+        logger.debug(f"Updated position for {node_id}: ({lat}, {lon})")
+
+    def flush(self) -> int:
+        """
+        Write all dirty positions to the database in one transaction.
+
+        Returns:
+            Number of positions written (0 in write-through mode)
+        """
+        with self._lock:
+            if not self._dirty:
+                return 0
+            batch = [
+                (node_id, pos.lat, pos.lon, pos.received_at, pos.seen_count)
+                for node_id, pos in (
+                    (node_id, self.positions.get(node_id)) for node_id in self._dirty
+                )
+                if pos is not None
+            ]
+            dirty = self._dirty
+            self._dirty = set()
+
         try:
-            self.db.save_position(node_id, lat, lon, now, seen_count)
+            self.db.save_positions(batch)
         except Exception as e:
-            logger.warning(f"Failed to persist position for {node_id}: {e}")
-        
-        logger.debug(f"Updated position for {node_id}: ({lat}, {lon})")
+            logger.warning(f"Failed to flush {len(batch)} positions: {e}")
+            # Keep them dirty so the next flush retries
+            with self._lock:
+                self._dirty |= dirty
+            return 0
+        logger.debug(f"Flushed {len(batch)} positions to database")
+        return len(batch)
+
+    def _flush_loop(self):
+        """Background flush: every flush_interval seconds or when woken early."""
+        while not self._stopping:
+            self._flush_wakeup.wait(self.flush_interval)
+            self._flush_wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """Stop the flush thread and persist any remaining dirty positions."""
+        self._stopping = True
+        if self._flush_thread:
+            self._flush_wakeup.set()
+            self._flush_thread.join(timeout=5.0)
+            self._flush_thread = None
+        self.flush()
 
     def get(self, node_id: str) -> Optional[Position]:
         """Get latest position for a node."""
@@ -109,7 +191,8 @@ class PositionCache:
                     seen_count=db_pos.get("seen_count", 1),
                 )
                 # Add to memory cache for future access
-                self.positions[node_id] = pos
+                with self._lock:
+                    self.positions.setdefault(node_id, pos)
                 return pos
         except Exception as e:
             logger.debug(f"Failed to get position from database for {node_id}: {e}")
@@ -125,5 +208,7 @@ class PositionCache:
 
     def clear(self):
         """Clear all positions (both memory and database)."""
+        # Persist pending writes first so they are not lost with the memory copy
+        self.flush()
         self.positions.clear()
         # Note: We don't clear database positions as they may be useful after restart
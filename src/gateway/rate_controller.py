@@ -0,0 +1,169 @@
+"""Adaptive (AIMD) rate control for OSM note submissions."""
+
+import time
+import logging
+import threading
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+from .config import (
+    OSM_RATE_MIN_SECONDS,
+    OSM_RATE_MAX_SECONDS,
+    OSM_RATE_INCREASE,
+    OSM_RATE_DECREASE_FACTOR,
+    OSM_RETRY_MAX_DELAY_SECONDS,
+)
+from .http_client import HttpClient
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """
+    Seconds to wait according to a Retry-After header.
+
+    Args:
+        value: Header value, either delay-seconds ("120") or an HTTP date
+        now: Current Unix time (defaults to time.time())
+
+    Returns:
+        Non-negative seconds, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = time.time() if now is None else now
+    return max(0.0, when.timestamp() - now)
+
+
+class AdaptiveRateController:
+    """
+    AIMD controller for the OSM host's token bucket in the HttpClient.
+
+    Successful submissions raise the bucket's rate additively (increase
+    requests/s per success) up to 1/min_interval; throttling responses (429,
+    5xx) multiply it by decrease_factor, down to 1/max_interval. The
+    bucket starts at the client's configured limit (OSM_RATE_LIMIT_SECONDS);
+    a host without a limit is left unlimited. A Retry-After header
+    additionally pauses submissions until it expires: paused_for() tells
+    callers to leave notes queued instead of spending a request.
+    """
+
+    def __init__(
+        self,
+        http: HttpClient,
+        host: str,
+        min_interval: float = OSM_RATE_MIN_SECONDS,
+        max_interval: float = OSM_RATE_MAX_SECONDS,
+        increase: float = OSM_RATE_INCREASE,
+        decrease_factor: float = OSM_RATE_DECREASE_FACTOR,
+        max_pause: float = OSM_RETRY_MAX_DELAY_SECONDS,
+    ):
+        self.http = http
+        self.host = host
+        self.max_rate = 1.0 / min_interval
+        self.min_rate = 1.0 / max_interval
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.max_pause = max_pause
+
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._successes = 0
+        self._throttled = 0
+        self._retry_after_pauses = 0
+
+    @property
+    def rate(self) -> Optional[float]:
+        """Current allowed submissions per second (None if the host is unlimited)."""
+        bucket = self.http.get_limit(self.host)
+        return bucket.rate if bucket else None
+
+    @staticmethod
+    def is_throttle(status_code: int) -> bool:
+        """Whether a response status means the server wants us to slow down."""
+        # 403 is not one: on the notes API it means a blocked account or a
+        # forbidden action, which slowing down does not fix
+        return status_code == 429 or 500 <= status_code < 600
+
+    def try_acquire(self) -> float:
+        """
+        Take a submission token from the host's bucket without waiting.
+
+        Returns:
+            0 if the token was taken (or the host is unlimited), otherwise
+            seconds until one is available
+        """
+        bucket = self.http.get_limit(self.host)
+        return bucket.try_acquire() if bucket else 0.0
+
+    def record_success(self):
+        """Additive increase after an accepted submission."""
+        with self._lock:
+            self._successes += 1
+            bucket = self.http.get_limit(self.host)
+            if bucket and bucket.rate < self.max_rate:
+                bucket.set_rate(min(self.max_rate, bucket.rate + self.increase))
+
+    def record_throttle(self, status_code: int, retry_after: Optional[str] = None) -> float:
+        """
+        Multiplicative decrease after a throttling response.
+
+        Args:
+            status_code: HTTP status of the response
+            retry_after: Raw Retry-After header, if any
+
+        Returns:
+            Seconds submissions are paused for (0 without Retry-After)
+        """
+        pause = parse_retry_after(retry_after)
+        with self._lock:
+            self._throttled += 1
+            bucket = self.http.get_limit(self.host)
+            if bucket:
+                bucket.set_rate(max(self.min_rate, bucket.rate * self.decrease_factor))
+            if pause:
+                pause = min(pause, self.max_pause)
+                self._paused_until = max(self._paused_until, time.time() + pause)
+                self._retry_after_pauses += 1
+            logger.warning(
+                f"OSM API throttled ({status_code})"
+                + (f": rate now {bucket.rate:.3f}/s" if bucket else "")
+                + (f", paused {pause:.0f}s (Retry-After)" if pause else "")
+            )
+            return pause or 0.0
+
+    def paused_for(self) -> float:
+        """Seconds left of a Retry-After pause (0 when submissions may proceed)."""
+        with self._lock:
+            return max(0.0, self._paused_until - time.time())
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Snapshot of controller state.
+
+        Returns:
+            Dict with 'rate' (requests/s, None if unlimited), 'interval'
+            (seconds between requests), 'paused_for', 'successes', 'throttled' and
+            'retry_after_pauses'
+        """
+        paused_for = self.paused_for()
+        rate = self.rate
+        with self._lock:
+            return {
+                "rate": rate,
+                "interval": 1.0 / rate if rate else None,
+                "paused_for": paused_for,
+                "successes": self._successes,
+                "throttled": self._throttled,
+                "retry_after_pauses": self._retry_after_pauses,
+            }
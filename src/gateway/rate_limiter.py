@@ -2,6 +2,7 @@
 
 import time
 import logging
+import threading
 from typing import Dict, List, Optional, Tuple
 from collections import defaultdict
 
@@ -24,6 +25,8 @@ class RateLimiter:
         self.user_messages: Dict[str, List[float]] = defaultdict(list)
         self._cleanup_interval = 300  # Clean up old entries every 5 minutes
         self._last_cleanup = time.time()
+        # Messages are handled by a pool of ingestion workers
+        self._lock = threading.Lock()
 
     def check_rate_limit(self, node_id: str, locale: str = "es") -> Tuple[bool, Optional[str]]:
         """
@@ -38,34 +41,35 @@ class RateLimiter:
             - allowed: True if within rate limit, False if exceeded
             - message: Optional error message if rate limit exceeded
         """
-        now = time.time()
+        with self._lock:
+            now = time.time()
         
-        # Cleanup old entries periodically
-        if now - self._last_cleanup > self._cleanup_interval:
-            self._cleanup_old_entries(now)
-            self._last_cleanup = now
+            # Cleanup old entries periodically
+            if now - self._last_cleanup > self._cleanup_interval:
+                self._cleanup_old_entries(now)
+                self._last_cleanup = now
         
-        # Get user's message timestamps
-        timestamps = self.user_messages[node_id]
+            # Get user's message timestamps
+            timestamps = self.user_messages[node_id]
         
-        # Remove timestamps outside the window
-        window_start = now - USER_RATE_LIMIT_WINDOW
-        timestamps[:] = [ts for ts in timestamps if ts > window_start]
+            # Remove timestamps outside the window
+            window_start = now - USER_RATE_LIMIT_WINDOW
+            timestamps[:] = [ts for ts in timestamps if ts > window_start]
         
-        # Check if limit exceeded
-        if len(timestamps) >= USER_RATE_LIMIT_MAX_MESSAGES:
-            remaining_time = int(timestamps[0] + USER_RATE_LIMIT_WINDOW - now)
-            error_msg = (
-                _("❌ Límite de mensajes alcanzado.\n", locale)
-                + _("Espera {time} segundos antes de enviar otro mensaje.\n", locale).format(time=remaining_time)
-                + _("⚠️ No envíes datos personales ni emergencias médicas.", locale)
-            )
-            logger.warning(f"Rate limit exceeded for {node_id}: {len(timestamps)} messages in window")
-            return False, error_msg
+            # Check if limit exceeded
+            if len(timestamps) >= USER_RATE_LIMIT_MAX_MESSAGES:
+                remaining_time = int(timestamps[0] + USER_RATE_LIMIT_WINDOW - now)
+                error_msg = (
+                    _("❌ Límite de mensajes alcanzado.\n", locale)
+                    + _("Espera {time} segundos antes de enviar otro mensaje.\n", locale).format(time=remaining_time)
+                    + _("⚠️ No envíes datos personales ni emergencias médicas.", locale)
+                )
+                logger.warning(f"Rate limit exceeded for {node_id}: {len(timestamps)} messages in window")
+                return False, error_msg
         
-        # Record this message
-        timestamps.append(now)
-        return True, None
+            # Record this message
+            timestamps.append(now)
+            return True, None
 
     def _cleanup_old_entries(self, now: float):
         """Remove entries for users with no recent messages."""
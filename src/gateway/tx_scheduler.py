@@ -0,0 +1,285 @@
+"""Outbound LoRa transmission scheduler."""
+
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from .config import (
+    TX_DUTY_CYCLE,
+    TX_DUTY_CYCLE_WINDOW,
+    TX_BULK_BUDGET_FRACTION,
+    TX_DESTINATION_GAP_SECONDS,
+    TX_BITRATE_BPS,
+    TX_PACKET_OVERHEAD_BYTES,
+    TX_PREAMBLE_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Priorities (lower value is sent first)
+PRIORITY_ACK = 0  # ACKs and rejections for a report just received
+PRIORITY_RESPONSE = 1  # command responses
+PRIORITY_BULK = 2  # Q→Note / failure notifications, daily broadcast
+
+BROADCAST = None  # destination of broadcast jobs
+
+
+def estimate_airtime(message: str) -> float:
+    """
+    Rough LoRa airtime in seconds for one text packet.
+
+    Preamble plus payload (UTF-8 text and Meshtastic header/encryption
+    overhead) at TX_BITRATE_BPS. The defaults approximate the LongFast preset.
+    """
+    payload = len(message.encode("utf-8")) + TX_PACKET_OVERHEAD_BYTES
+    return TX_PREAMBLE_SECONDS + payload * 8 / TX_BITRATE_BPS
+
+
+@dataclass(eq=False)
+class _TxJob:
+    """One logical message (possibly split into parts) for one destination."""
+    priority: int
+    seq: int
+    destination: Optional[str]
+    parts: List[str]
+    on_sent: Optional[Callable[[bool], None]]
+    enqueued_at: float
+    next_part: int = 0
+
+
+class TxScheduler:
+    """
+    Single owner of MeshtasticSerial.send_dm / send_broadcast.
+
+    Callers enqueue with send_dm() / send_broadcast() and return immediately;
+    one thread transmits part by part, choosing the most important job that
+    may go out now:
+        - airtime budget: transmissions in the last duty_cycle_window seconds
+          may not exceed duty_cycle of it; bulk jobs may only use
+          bulk_budget_fraction of the budget so ACKs always find room
+        - per-destination pacing: at least destination_gap seconds between
+          two packets to the same node (this also spaces the parts of a long
+          message, which stay in order)
+        - the radio is never handed a packet before the previous one's
+          estimated airtime has elapsed
+
+    on_sent(success) is called on the scheduler thread once the last part was
+    sent (True) or a part failed (False; remaining parts are dropped).
+    """
+
+    def __init__(
+        self,
+        serial,
+        duty_cycle: float = TX_DUTY_CYCLE,
+        duty_cycle_window: float = TX_DUTY_CYCLE_WINDOW,
+        bulk_budget_fraction: float = TX_BULK_BUDGET_FRACTION,
+        destination_gap: float = TX_DESTINATION_GAP_SECONDS,
+        airtime_fn: Callable[[str], float] = estimate_airtime,
+    ):
+        self.serial = serial
+        self.duty_cycle = duty_cycle
+        self.duty_cycle_window = duty_cycle_window
+        self.bulk_budget_fraction = bulk_budget_fraction
+        self.destination_gap = destination_gap
+        self.airtime_fn = airtime_fn
+
+        self._jobs: List[_TxJob] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+        # (sent_at, airtime) of transmissions inside the window
+        self._history: Deque[Tuple[float, float]] = deque()
+        self._last_to: Dict[Optional[str], float] = {}
+        self._radio_free_at = 0.0
+
+        # Metrics
+        self._sent_packets = 0
+        self._failed_packets = 0
+        self._waits: Deque[float] = deque(maxlen=1000)
+
+    # --- public API -------------------------------------------------------
+
+    def send_dm(
+        self,
+        node_id: str,
+        parts: List[str],
+        priority: int = PRIORITY_RESPONSE,
+        on_sent: Optional[Callable[[bool], None]] = None,
+    ):
+        """Queue a direct message (already split into parts) for node_id."""
+        self._enqueue(node_id, parts, priority, on_sent)
+
+    def send_broadcast(
+        self,
+        message: str,
+        priority: int = PRIORITY_BULK,
+        on_sent: Optional[Callable[[bool], None]] = None,
+    ):
+        """Queue a broadcast message."""
+        self._enqueue(BROADCAST, [message], priority, on_sent)
+
+    def start(self):
+        """Start the transmit thread."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="tx-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the transmit thread. Jobs still queued are discarded."""
+        with self._cond:
+            self._running = False
+            leftover = len(self._jobs)
+            self._jobs.clear()
+            self._cond.notify_all()
+        if leftover:
+            logger.warning(f"TX scheduler stopped with {leftover} unsent messages")
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def pending(self) -> int:
+        """Number of queued messages (not parts)."""
+        with self._cond:
+            return len(self._jobs)
+
+    def get_metrics(self) -> Dict[str, float]:
+        """
+        Snapshot of scheduler metrics.
+
+        Returns:
+            Dict with 'pending' messages, 'sent_packets', 'failed_packets',
+            'airtime_used' seconds in the current window, 'airtime_budget'
+            seconds per window and 'wait_max' (longest queue wait among
+            recent messages, seconds).
+        """
+        with self._cond:
+            now = time.monotonic()
+            self._expire_history(now)
+            return {
+                "pending": len(self._jobs),
+                "sent_packets": self._sent_packets,
+                "failed_packets": self._failed_packets,
+                "airtime_used": sum(airtime for _, airtime in self._history),
+                "airtime_budget": self.duty_cycle * self.duty_cycle_window,
+                "wait_max": max(self._waits) if self._waits else 0.0,
+            }
+
+    # --- scheduling -------------------------------------------------------
+
+    def _enqueue(self, destination, parts, priority, on_sent):
+        parts = [part for part in parts if part]
+        if not parts:
+            return
+        job = _TxJob(
+            priority=priority,
+            seq=next(self._seq),
+            destination=destination,
+            parts=parts,
+            on_sent=on_sent,
+            enqueued_at=time.monotonic(),
+        )
+        with self._cond:
+            self._jobs.append(job)
+            self._cond.notify()
+
+    def _expire_history(self, now: float):
+        cutoff = now - self.duty_cycle_window
+        while self._history and self._history[0][0] <= cutoff:
+            self._history.popleft()
+
+    def _budget_ready_at(self, airtime: float, priority: int, now: float) -> float:
+        """Earliest time at which airtime fits in the budget for this priority."""
+        budget = self.duty_cycle * self.duty_cycle_window
+        if priority >= PRIORITY_BULK:
+            budget *= self.bulk_budget_fraction
+        used = sum(a for _, a in self._history)
+        if used + airtime <= budget:
+            return now
+        # Wait until enough old transmissions leave the window
+        for sent_at, a in self._history:
+            used -= a
+            if used + airtime <= budget:
+                return sent_at + self.duty_cycle_window
+        return now + self.duty_cycle_window
+
+    def _select(self, now: float) -> Tuple[Optional[_TxJob], Optional[float]]:
+        """
+        Pick the job to transmit now. Caller holds _cond.
+
+        Returns:
+            (job, None) if a job can go now, else (None, seconds to wait) or
+            (None, None) when nothing is queued.
+        """
+        if not self._jobs:
+            return None, None
+        self._expire_history(now)
+        earliest = None
+        for job in sorted(self._jobs, key=lambda j: (j.priority, j.seq)):
+            airtime = self.airtime_fn(job.parts[job.next_part])
+            ready_at = max(
+                self._radio_free_at,
+                self._last_to.get(job.destination, float("-inf")) + self.destination_gap,
+                self._budget_ready_at(airtime, job.priority, now),
+            )
+            if ready_at <= now:
+                return job, None
+            earliest = ready_at if earliest is None else min(earliest, ready_at)
+        return None, earliest - now
+
+    def _run(self):
+        """Transmit loop."""
+        while True:
+            with self._cond:
+                while True:
+                    if not self._running:
+                        return
+                    job, wait = self._select(time.monotonic())
+                    if job:
+                        break
+                    self._cond.wait(wait)
+                part = job.parts[job.next_part]
+                if job.next_part == 0:
+                    self._waits.append(time.monotonic() - job.enqueued_at)
+
+            ok = self._transmit(job.destination, part)
+
+            finished = False
+            with self._cond:
+                now = time.monotonic()
+                airtime = self.airtime_fn(part)
+                self._history.append((now, airtime))
+                self._last_to[job.destination] = now
+                self._radio_free_at = now + airtime
+                if ok:
+                    self._sent_packets += 1
+                    job.next_part += 1
+                    finished = job.next_part >= len(job.parts)
+                else:
+                    self._failed_packets += 1
+                    finished = True
+                if finished and job in self._jobs:
+                    self._jobs.remove(job)
+
+            if finished and job.on_sent:
+                try:
+                    job.on_sent(ok)
+                except Exception as e:
+                    logger.error(f"Error in TX on_sent callback: {e}")
+
+    def _transmit(self, destination: Optional[str], part: str) -> bool:
+        try:
+            if destination is BROADCAST:
+                return bool(self.serial.send_broadcast(part))
+            return bool(self.serial.send_dm(destination, part))
+        except Exception as e:
+            logger.error(f"Error transmitting to {destination or 'broadcast'}: {e}")
+            return False
@@ -0,0 +1,13 @@
+"""Shared pytest fixtures."""
+
+import pytest
+
+from gateway import http_client
+
+
+@pytest.fixture(autouse=True)
+def fresh_http_client():
+    """Give each test its own process-wide HTTP client (empty rate-limit buckets)."""
+    http_client.reset_client()
+    yield
+    http_client.reset_client()
@@ -0,0 +1,141 @@
+"""Tests for background note address resolution."""
+
+import threading
+import time
+import pytest
+from unittest.mock import Mock
+
+from gateway.database import Database
+from gateway.address_resolver import AddressResolver
+from gateway.notifications import NotificationManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Create temporary database."""
+    return Database(db_path=tmp_path / "test.db")
+
+
+@pytest.fixture
+def geocoding():
+    """Geocoding stand-in: nothing known locally, Nominatim answers."""
+    service = Mock()
+    service.lookup_local.return_value = None
+    service.reverse_geocode.return_value = "Prado Veraniego, Bogotá"
+    return service
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_local_address_stored_immediately(db, geocoding):
+    """Test that offline/cached addresses are stored without the lookup thread."""
+    geocoding.lookup_local.return_value = "Suba, Bogotá"
+    resolver = AddressResolver(db, geocoding)
+    queue_id = db.create_note("node1", 4.7, -74.07, "bache", "bache")
+
+    resolver.resolve(queue_id)
+
+    assert db.get_note_by_queue_id(queue_id)["address"] == "Suba, Bogotá"
+    geocoding.reverse_geocode.assert_not_called()
+    assert resolver.get_metrics()["local"] == 1
+
+
+def test_remote_lookup_in_background(db, geocoding):
+    """Test that resolve() returns at once and the thread stores the address."""
+    release = threading.Event()
+
+    def slow_geocode(lat, lon):
+        release.wait(2.0)
+        return "Prado Veraniego, Bogotá"
+
+    geocoding.reverse_geocode.side_effect = slow_geocode
+    resolver = AddressResolver(db, geocoding)
+    resolver.start()
+    try:
+        queue_id = db.create_note("node1", 4.7, -74.07, "bache", "bache")
+        start = time.perf_counter()
+        resolver.resolve(queue_id)
+        assert time.perf_counter() - start < 0.1
+        assert db.get_note_by_queue_id(queue_id)["address"] is None
+
+        release.set()
+        assert wait_until(lambda: db.get_note_by_queue_id(queue_id)["address"] == "Prado Veraniego, Bogotá")
+    finally:
+        resolver.stop()
+    assert resolver.get_metrics()["remote"] == 1
+
+
+def test_queue_full_drops_lookup(db, geocoding):
+    """Test that a full lookup queue skips the note instead of blocking."""
+    resolver = AddressResolver(db, geocoding, maxsize=1)
+    first = db.create_note("node1", 4.7, -74.07, "uno", "uno")
+    second = db.create_note("node1", 4.8, -74.07, "dos", "dos")
+
+    resolver.resolve(first)
+    resolver.resolve(second)
+
+    metrics = resolver.get_metrics()
+    assert metrics["queued"] == 1
+    assert metrics["dropped"] == 1
+
+
+def test_success_ack_uses_stored_address(db, geocoding):
+    """Test that the success ACK reads the stored address and never geocodes."""
+    serial = Mock()
+    serial.send_dm.return_value = True
+    notifications = NotificationManager(serial, db, geocoding=geocoding)
+    queue_id = db.create_note("node1", 4.7, -74.07, "bache", "bache")
+    db.set_note_address(queue_id, "Suba, Bogotá")
+
+    notifications.send_ack("node1", "success", local_queue_id=queue_id,
+                           osm_note_id=123, osm_note_url="https://osm.org/note/123")
+
+    sent = "".join(call[0][1] for call in serial.send_dm.call_args_list)
+    assert "Suba, Bogotá" in sent
+    geocoding.reverse_geocode.assert_not_called()
+
+
+def test_success_ack_without_address(db, geocoding):
+    """Test that the ACK goes out without a location when the lookup is not done."""
+    serial = Mock()
+    serial.send_dm.return_value = True
+    notifications = NotificationManager(serial, db, geocoding=geocoding)
+    queue_id = db.create_note("node1", 4.7, -74.07, "bache", "bache")
+
+    notifications.send_ack("node1", "success", local_queue_id=queue_id,
+                           osm_note_id=123, osm_note_url="https://osm.org/note/123")
+
+    sent = "".join(call[0][1] for call in serial.send_dm.call_args_list)
+    assert "123" in sent
+    assert "📍" not in sent
+    geocoding.reverse_geocode.assert_not_called()
+
+
+def test_q_to_note_reuses_stored_address(db, geocoding):
+    """Test that Q→Note notifications reuse stored or local addresses and never query Nominatim."""
+    geocoding.lookup_local.side_effect = lambda lat, lon: "Usaquén, Bogotá" if lat == 4.9 else None
+    serial = Mock()
+    serial.send_dm.return_value = True
+    notifications = NotificationManager(serial, db, geocoding=geocoding)
+    resolved = db.create_note("node1", 4.7, -74.07, "uno", "uno")
+    db.set_note_address(resolved, "Suba, Bogotá")
+    db.update_note_sent(resolved, 1, "https://osm.org/note/1")
+    unresolved = db.create_note("node2", 4.8, -74.07, "dos", "dos")
+    db.update_note_sent(unresolved, 2, "https://osm.org/note/2")
+    cached = db.create_note("node3", 4.9, -74.07, "tres", "tres")
+    db.update_note_sent(cached, 3, "https://osm.org/note/3")
+
+    notifications.process_sent_notifications()
+
+    sent = {call[0][0]: call[0][1] for call in serial.send_dm.call_args_list}
+    assert "Suba, Bogotá" in sent["node1"]
+    assert "📍" not in sent["node2"]
+    assert "Usaquén, Bogotá" in sent["node3"]
+    geocoding.reverse_geocode.assert_not_called()
+    assert db.get_note_by_queue_id(unresolved)["address"] is None
+    assert db.get_note_by_queue_id(cached)["address"] == "Usaquén, Bogotá"
@@ -0,0 +1,190 @@
+"""Tests for the connectivity monitor / circuit breaker."""
+
+import time
+import pytest
+from unittest.mock import Mock, patch
+
+import requests
+
+from gateway.connectivity import ConnectivityMonitor
+from gateway.database import Database
+from gateway.geocoding import GeocodingService
+from gateway.http_client import HttpClient
+from gateway.osm_worker import OSMWorker
+from gateway.position_cache import PositionCache
+from gateway.commands import CommandProcessor
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Create temporary database."""
+    return Database(db_path=tmp_path / "test.db")
+
+
+@pytest.fixture
+def monitor():
+    """Monitor that opens after two failures and allows a trial after 0.1s."""
+    # Own client without rate limits: probes hit the (limited) OSM host
+    return ConnectivityMonitor(failure_threshold=2, retry_seconds=0.1, http=HttpClient())
+
+
+def test_starts_closed(monitor):
+    """Test that a new monitor is optimistic."""
+    assert monitor.state == ConnectivityMonitor.CLOSED
+    assert monitor.is_online()
+    assert monitor.allow_request()
+
+
+def test_opens_after_threshold(monitor):
+    """Test that consecutive failures open the circuit."""
+    monitor.record_failure()
+    assert monitor.state == ConnectivityMonitor.CLOSED
+    monitor.record_failure()
+    assert monitor.state == ConnectivityMonitor.OPEN
+    assert not monitor.is_online()
+    assert not monitor.allow_request()
+
+
+def test_success_resets_failure_count(monitor):
+    """Test that a success between failures keeps the circuit closed."""
+    monitor.record_failure()
+    monitor.record_success()
+    monitor.record_failure()
+    assert monitor.state == ConnectivityMonitor.CLOSED
+
+
+def test_half_open_allows_single_trial(monitor):
+    """Test half-open: one trial after retry_seconds, failure re-opens."""
+    monitor.record_failure()
+    monitor.record_failure()
+    time.sleep(0.15)
+
+    assert monitor.allow_request()
+    assert monitor.state == ConnectivityMonitor.HALF_OPEN
+    assert not monitor.allow_request()  # only one trial at a time
+    assert not monitor.is_online()
+
+    monitor.record_failure()
+    assert monitor.state == ConnectivityMonitor.OPEN
+    assert not monitor.allow_request()
+
+    time.sleep(0.15)
+    assert monitor.allow_request()
+    monitor.record_success()
+    assert monitor.state == ConnectivityMonitor.CLOSED
+
+
+def test_listeners_notified_on_transitions(monitor):
+    """Test that listeners receive False on open and True on close."""
+    events = []
+    monitor.add_listener(events.append)
+
+    monitor.record_failure()
+    monitor.record_failure()
+    monitor.record_failure()  # already open: no duplicate event
+    monitor.record_success()
+    monitor.record_success()
+
+    assert events == [False, True]
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_probe_records_outcome(mock_head, monitor):
+    """Test that any HTTP response counts as online and errors as offline."""
+    mock_head.return_value = Mock(status_code=503)
+    assert monitor.probe() is True
+
+    mock_head.side_effect = requests.exceptions.ConnectionError()
+    assert monitor.probe() is False
+    assert monitor.probe() is False
+    assert monitor.state == ConnectivityMonitor.OPEN
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_background_thread_probes(mock_head):
+    """Test that start() probes immediately and stop() joins the thread."""
+    mock_head.side_effect = requests.exceptions.ConnectionError()
+    monitor = ConnectivityMonitor(failure_threshold=1, probe_interval=10, retry_seconds=10)
+    monitor.start()
+    try:
+        deadline = time.time() + 2
+        while monitor.state != ConnectivityMonitor.OPEN and time.time() < deadline:
+            time.sleep(0.01)
+        assert monitor.state == ConnectivityMonitor.OPEN
+    finally:
+        monitor.stop()
+    assert mock_head.called
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_osm_worker_fails_fast_when_open(mock_post, db, monitor, monkeypatch):
+    """Test that an offline cycle does not touch the network."""
+    monkeypatch.setattr("gateway.osm_worker.DRY_RUN", False)
+    db.create_note("node1", 4.6097, -74.0817, "first", "first")
+    db.create_note("node2", 4.6098, -74.0818, "second", "second")
+    monitor.record_failure()
+    monitor.record_failure()
+
+    worker = OSMWorker(db, connectivity=monitor)
+    start = time.perf_counter()
+    assert worker.process_pending(limit=10) == 0
+    assert time.perf_counter() - start < 0.5
+
+    mock_post.assert_not_called()
+    # Offline skips never spend retry attempts
+    assert all(note["retry_count"] == 0 for note in db.get_pending_notes())
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_osm_worker_records_connection_errors(mock_post, db, monitor, monkeypatch):
+    """Test that OSM connection errors feed the shared breaker."""
+    monkeypatch.setattr("gateway.osm_worker.DRY_RUN", False)
+    mock_post.side_effect = requests.exceptions.ConnectionError()
+    # Client without rate limits, so the second send does not wait
+    worker = OSMWorker(db, connectivity=monitor, http=HttpClient())
+
+    worker.send_note(4.6097, -74.0817, "test")
+    worker.send_note(4.6097, -74.0817, "test")
+
+    assert monitor.state == ConnectivityMonitor.OPEN
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_geocoding_skipped_when_open(mock_get, monitor):
+    """Test that reverse geocoding returns None without a request when offline."""
+    monitor.record_failure()
+    monitor.record_failure()
+    geocoding = GeocodingService(connectivity=monitor)
+
+    assert geocoding.reverse_geocode(4.6097, -74.0817) is None
+    mock_get.assert_not_called()
+
+
+@patch("requests.get")
+def test_osmstatus_uses_cached_state(mock_get, db, monitor):
+    """Test that #osmstatus never does a network request."""
+    cache = PositionCache(db=db)
+    processor = CommandProcessor(db, cache, connectivity=monitor)
+
+    _, online_msg = processor.process_message("node1", "#osmstatus")
+    monitor.record_failure()
+    monitor.record_failure()
+    _, offline_msg = processor.process_message("node1", "#osmstatus")
+
+    mock_get.assert_not_called()
+    assert "OK" in online_msg
+    assert "NO" in offline_msg
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_probe_does_not_spend_osm_rate_limit(mock_request):
+    """Test that probes on the OSM host leave its submission token alone."""
+    http = HttpClient()
+    http.set_limit("api.openstreetmap.org", 1 / 3)
+    monitor = ConnectivityMonitor(probe_url="https://api.openstreetmap.org/api/capabilities", http=http)
+
+    start = time.perf_counter()
+    assert monitor.probe()
+    assert monitor.probe()
+    assert time.perf_counter() - start < 0.5
+    assert http.get_limit("api.openstreetmap.org").try_acquire() == 0.0
@@ -79,3 +79,247 @@ def test_check_duplicate(db):
     # Different location
     is_dup3 = db.check_duplicate(node_id, text, 10.0, 20.0, time_bucket)
     assert not is_dup3
+
+
+def test_connection_reused_within_thread(db):
+    """Test that a thread reuses the same connection across calls."""
+    with db._get_connection() as conn1:
+        pass
+    db.get_user_language("node1")
+    with db._get_connection() as conn2:
+        pass
+    assert conn1 is conn2
+
+
+def test_connection_per_thread(db):
+    """Test that each thread gets its own connection."""
+    import threading
+
+    with db._get_connection() as main_conn:
+        pass
+
+    other = {}
+
+    def worker():
+        with db._get_connection() as conn:
+            other["conn"] = conn
+        other["queue_id"] = db.create_note("node1", 1.0, 2.0, "from thread", "from thread")
+
+    t = threading.Thread(target=worker)
+    t.start()
+    t.join()
+
+    assert other["conn"] is not main_conn
+    assert db.get_note_by_queue_id(other["queue_id"]) is not None
+
+
+def test_uncommitted_work_rolled_back(db):
+    """Test that a block leaving a transaction open does not leak it."""
+    with db._get_connection() as conn:
+        conn.execute("INSERT INTO system_state (key, value) VALUES ('k', 'v')")
+        # no commit
+
+    with db._get_connection() as conn:
+        assert not conn.in_transaction
+        row = conn.execute("SELECT value FROM system_state WHERE key = 'k'").fetchone()
+    assert row is None
+
+
+def test_close_and_reopen(db):
+    """Test that the database can be used again after close()."""
+    db.create_note("node1", 1.0, 2.0, "test", "test")
+    db.close()
+    assert db.get_total_queue_size() == 1
+
+
+def test_queue_id_not_reused_after_delete(db):
+    """Test that deleting a note does not cause queue ID collisions."""
+    q1 = db.create_note("node1", 1.0, 2.0, "test1", "test1")
+    q2 = db.create_note("node1", 1.0, 2.0, "test2", "test2")
+    with db._get_connection() as conn:
+        conn.execute("DELETE FROM notes WHERE local_queue_id = ?", (q1,))
+        conn.commit()
+
+    q3 = db.create_note("node1", 1.0, 2.0, "test3", "test3")
+    assert q3 is not None
+    assert q3 not in (q1, q2)
+    assert q3 == "Q-0003"
+
+
+def test_queue_id_sequence_survives_restart(tmp_path):
+    """Test that the queue ID counter persists across Database instances."""
+    db_path = tmp_path / "test.db"
+    db1 = Database(db_path=db_path)
+    db1.create_note("node1", 1.0, 2.0, "test1", "test1")
+    db1.close()
+
+    db2 = Database(db_path=db_path)
+    assert db2.create_note("node1", 1.0, 2.0, "test2", "test2") == "Q-0002"
+
+
+def test_queue_id_sequence_seeded_from_existing_notes(tmp_path):
+    """Test that a database without the counter continues after the highest ID."""
+    db_path = tmp_path / "test.db"
+    db1 = Database(db_path=db_path)
+    with db1._get_connection() as conn:
+        conn.execute("""
+            INSERT INTO notes (local_queue_id, node_id, created_at, lat, lon,
+                               text_original, text_normalized)
+            VALUES ('Q-0105', 'node1', CURRENT_TIMESTAMP, 1.0, 2.0, 'old', 'old')
+        """)
+        conn.execute("DELETE FROM system_state WHERE key = 'note_queue_seq'")
+        conn.commit()
+    db1.close()
+
+    db2 = Database(db_path=db_path)
+    assert db2.create_note("node1", 1.0, 2.0, "new", "new") == "Q-0106"
+
+
+def _insert_old_note(conn, queue_id):
+    conn.execute("""
+        INSERT INTO notes (local_queue_id, node_id, created_at, lat, lon,
+                           text_original, text_normalized)
+        VALUES (?, 'node1', CURRENT_TIMESTAMP, 1.0, 2.0, 'old', 'old')
+    """, (queue_id,))
+
+
+def test_stale_queue_id_sequence_resynced_on_open(tmp_path):
+    """Test that a counter behind the notes table (restored backup) is moved past the highest ID."""
+    db_path = tmp_path / "test.db"
+    db1 = Database(db_path=db_path)
+    with db1._get_connection() as conn:
+        for seq in range(169, 181):
+            _insert_old_note(conn, f"Q-{seq:04d}")
+        conn.execute("UPDATE system_state SET value = '168' WHERE key = 'note_queue_seq'")
+        conn.commit()
+    db1.close()
+
+    db2 = Database(db_path=db_path)
+    assert db2.create_note("node1", 1.0, 2.0, "new", "new") == "Q-0181"
+
+
+def test_queue_id_collision_resyncs_and_retries(db):
+    """Test that an ID taken behind the counter's back is skipped instead of dropping the note."""
+    with db._get_connection() as conn:
+        _insert_old_note(conn, "Q-0001")
+        _insert_old_note(conn, "Q-0002")
+        conn.commit()
+
+    assert db.create_note("node1", 1.0, 2.0, "new", "new") == "Q-0003"
+    assert db.create_note("node1", 1.0, 2.0, "next", "next") == "Q-0004"
+
+
+def test_queue_ids_unique_under_concurrent_inserts(db):
+    """Test that concurrent inserts from several threads get unique IDs."""
+    import threading
+
+    ids = []
+    lock = threading.Lock()
+
+    def worker(n):
+        for i in range(20):
+            queue_id = db.create_note(f"node{n}", 1.0, 2.0, f"t{n}-{i}", f"t{n}-{i}")
+            with lock:
+                ids.append(queue_id)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert None not in ids
+    assert len(set(ids)) == 80
+
+
+def test_create_note_deduplicated(db):
+    """Test that the atomic insert rejects a duplicate in the same bucket."""
+    bucket = int(time.time() / 120)
+    queue_id, is_dup = db.create_note_deduplicated("node1", 1.0, 2.0, "msg", "msg", bucket)
+    assert queue_id == "Q-0001"
+    assert not is_dup
+
+    queue_id2, is_dup2 = db.create_note_deduplicated("node1", 1.00001, 2.0, "msg", "msg", bucket)
+    assert queue_id2 is None
+    assert is_dup2
+
+    # Next bucket is a new note; the rejected duplicate did not consume an ID
+    queue_id3, is_dup3 = db.create_note_deduplicated("node1", 1.0, 2.0, "msg", "msg", bucket + 1)
+    assert queue_id3 == "Q-0002"
+    assert not is_dup3
+
+
+def test_create_note_deduplicated_concurrent(db):
+    """Test that concurrent copies of the same report create one note."""
+    import threading
+
+    bucket = int(time.time() / 120)
+    results = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(6)
+
+    def worker():
+        barrier.wait()
+        result = db.create_note_deduplicated("node1", 1.0, 2.0, "same", "same", bucket)
+        with lock:
+            results.append(result)
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    created = [queue_id for queue_id, is_dup in results if not is_dup]
+    assert len(created) == 1
+    assert db.get_total_queue_size() == 1
+
+
+def test_create_note_always_creates(db):
+    """Test that create_note still inserts when the dedup key is taken."""
+    q1 = db.create_note("node1", 1.0, 2.0, "same", "same")
+    q2 = db.create_note("node1", 1.0, 2.0, "same", "same")
+    assert q1 is not None and q2 is not None
+    assert q1 != q2
+
+
+def test_dedup_key_migration(tmp_path):
+    """Test that notes from a database without dedup_key get backfilled."""
+    import sqlite3
+
+    db_path = tmp_path / "old.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            local_queue_id TEXT UNIQUE NOT NULL,
+            node_id TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            lat REAL NOT NULL,
+            lon REAL NOT NULL,
+            text_original TEXT NOT NULL,
+            text_normalized TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            osm_note_id INTEGER,
+            osm_note_url TEXT,
+            sent_at TIMESTAMP,
+            last_error TEXT,
+            notified_sent INTEGER DEFAULT 0
+        )
+    """)
+    created_at = "2026-01-01 12:00:30.000000"
+    for queue_id in ("Q-0001", "Q-0002"):
+        conn.execute(
+            "INSERT INTO notes (local_queue_id, node_id, created_at, lat, lon, text_original, text_normalized) "
+            "VALUES (?, 'node1', ?, 1.0, 2.0, 'old', 'old')",
+            (queue_id, created_at),
+        )
+    conn.commit()
+    conn.close()
+
+    db = Database(db_path=db_path)
+    bucket = int(1767268830 / 120)  # 2026-01-01 12:00:30 UTC
+    assert db.check_duplicate("node1", "old", 1.0, 2.0, bucket)
+    # The second (duplicate) legacy row keeps a NULL key instead of failing the migration
+    note = db.get_note_by_queue_id("Q-0002")
+    assert note["dedup_key"] is None
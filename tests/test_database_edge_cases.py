@@ -134,3 +134,108 @@ def test_check_duplicate_different_time_bucket(db):
     future_bucket = current_bucket + 1000
     is_dup2 = db.check_duplicate(node_id, text, lat, lon, future_bucket)
     assert not is_dup2, "Should NOT be duplicate in different bucket"
+
+
+def test_get_node_stats_today_excludes_older_notes(db):
+    """Test that 'today' only counts notes from the current local day."""
+    node_id = "test_node"
+    old_id = db.create_note(node_id, 1.0, 2.0, "old", "old")
+    db.create_note(node_id, 1.0, 2.0, "new", "new")
+    with db._get_connection() as conn:
+        conn.execute(
+            "UPDATE notes SET created_at = datetime('now', '-2 days') WHERE local_queue_id = ?",
+            (old_id,),
+        )
+        conn.commit()
+
+    stats = db.get_node_stats(node_id)
+    assert stats["total"] == 2
+    assert stats["today"] == 1
+    assert stats["queue"] == 2
+
+
+def test_get_node_stats_today_uses_local_day(db):
+    """Test that day bounds follow the requested timezone, not UTC."""
+    from datetime import datetime, timedelta
+    import pytz
+
+    node_id = "test_node"
+    queue_id = db.create_note(node_id, 1.0, 2.0, "test", "test")
+
+    # Place the note one minute after local midnight in Bogotá (UTC-5)
+    tz = pytz.timezone("America/Bogota")
+    local_midnight = tz.localize(datetime.combine(datetime.now(tz).date(), datetime.min.time()))
+    created_utc = (local_midnight + timedelta(minutes=1)).astimezone(pytz.UTC).replace(tzinfo=None)
+    with db._get_connection() as conn:
+        conn.execute(
+            "UPDATE notes SET created_at = ? WHERE local_queue_id = ?",
+            (created_utc.strftime("%Y-%m-%d %H:%M:%S.%f"), queue_id),
+        )
+        conn.commit()
+    assert db.get_node_stats(node_id, timezone="America/Bogota")["today"] == 1
+
+    # Two minutes before local midnight belongs to yesterday
+    created_utc = (local_midnight - timedelta(minutes=2)).astimezone(pytz.UTC).replace(tzinfo=None)
+    with db._get_connection() as conn:
+        conn.execute(
+            "UPDATE notes SET created_at = ? WHERE local_queue_id = ?",
+            (created_utc.strftime("%Y-%m-%d %H:%M:%S"), queue_id),
+        )
+        conn.commit()
+    assert db.get_node_stats(node_id, timezone="America/Bogota")["today"] == 0
+
+
+def test_failed_notes_leave_pending_queue(db):
+    """Test that failed notes are not returned as pending work."""
+    failed_id = db.create_note("node1", 1.0, 2.0, "dead", "dead")
+    live_id = db.create_note("node1", 1.0, 2.0, "live", "live")
+
+    db.mark_note_failed(failed_id, "Falló después de 3 intentos. Revisa logs.")
+
+    pending = db.get_pending_notes(limit=10)
+    assert [n["local_queue_id"] for n in pending] == [live_id]
+    assert db.get_total_queue_size() == 1
+    assert db.get_node_stats("node1")["queue"] == 1
+
+
+def test_failed_notes_notified_once(db):
+    """Test failure notification selection uses the notified_failed flag."""
+    queue_id = db.create_note("node1", 1.0, 2.0, "dead", "dead")
+    db.mark_note_failed(queue_id, "Error del servidor OSM")
+
+    failed = db.get_failed_notes_for_notification()
+    assert [n["local_queue_id"] for n in failed] == [queue_id]
+
+    db.mark_notified_failed(queue_id)
+    assert db.get_failed_notes_for_notification() == []
+    # Failure notification does not touch the sent-notification flag
+    assert db.get_note_by_queue_id(queue_id)["notified_sent"] == 0
+
+
+def test_failed_status_migration(tmp_path):
+    """Test that exhausted pending notes from older databases become failed."""
+    import sqlite3
+
+    db_path = tmp_path / "old.db"
+    Database(db_path=db_path).close()
+    conn = sqlite3.connect(db_path)
+    # Simulate a database from before notified_failed existed
+    conn.execute("DROP INDEX IF EXISTS idx_notes_failed_unnotified")
+    conn.execute("ALTER TABLE notes DROP COLUMN notified_failed")
+    conn.execute(
+        "INSERT INTO notes (local_queue_id, node_id, created_at, lat, lon, text_original, "
+        "text_normalized, status, last_error) VALUES ('Q-0001', 'node1', CURRENT_TIMESTAMP, "
+        "1.0, 2.0, 'x', 'x', 'pending', 'Falló después de 3 intentos. Revisa logs.')"
+    )
+    conn.execute(
+        "INSERT INTO notes (local_queue_id, node_id, created_at, lat, lon, text_original, "
+        "text_normalized, status, last_error) VALUES ('Q-0002', 'node1', CURRENT_TIMESTAMP, "
+        "1.0, 2.0, 'y', 'y', 'pending', 'Timeout al conectar con OSM API')"
+    )
+    conn.commit()
+    conn.close()
+
+    db = Database(db_path=db_path)
+    assert db.get_note_by_queue_id("Q-0001")["status"] == "failed"
+    assert db.get_note_by_queue_id("Q-0002")["status"] == "pending"
+    assert len(db.get_failed_notes_for_notification()) == 1
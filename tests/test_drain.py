@@ -0,0 +1,111 @@
+"""Tests for backlog drain mode."""
+
+import time
+import threading
+import pytest
+from unittest.mock import Mock, patch
+
+from gateway.database import Database
+from gateway.drain import BacklogDrain
+from gateway.main import Gateway
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Create temporary database."""
+    return Database(db_path=tmp_path / "test.db")
+
+
+def test_hysteresis_and_batch_size():
+    """Test that drain mode turns on above enter_backlog and off at exit_backlog."""
+    drain = BacklogDrain(normal_batch_size=10, enter_backlog=50, exit_backlog=5, drain_batch_size=25)
+    assert drain.batch_size == 10
+
+    assert drain.record_pass(0, 50, now=0) is False
+    assert drain.record_pass(0, 51, now=1) is True
+    assert drain.batch_size == 25
+    # Between the thresholds the mode does not change
+    assert drain.record_pass(25, 20, now=2) is True
+    assert drain.record_pass(15, 5, now=3) is False
+    assert drain.batch_size == 10
+
+    metrics = drain.get_metrics()
+    assert metrics["drains"] == 1
+    assert metrics["drained"] == 40
+
+
+def test_throughput_and_eta():
+    """Test notes/min over the window and the ETA from the remaining backlog."""
+    drain = BacklogDrain(enter_backlog=50, window=300)
+    now = time.time()
+    drain.record_pass(10, 600, now=now - 120)
+    drain.record_pass(10, 590, now=now - 60)
+    drain.record_pass(10, 580, now=now)
+
+    metrics = drain.get_metrics()
+    assert metrics["active"] is True
+    assert metrics["throughput"] == pytest.approx(10, rel=0.01)  # 20 notes in 2 min
+    assert metrics["eta"] == pytest.approx(580 * 6, rel=0.01)
+
+
+def test_eta_unknown_while_nothing_is_sent():
+    """Test that the ETA is None (not infinite or zero) while stalled."""
+    drain = BacklogDrain(enter_backlog=50)
+    drain.record_pass(0, 100, now=time.time() - 10)
+    drain.record_pass(0, 100)
+    assert drain.get_metrics()["eta"] is None
+
+
+def test_old_passes_leave_the_window():
+    """Test that throughput only counts recent passes."""
+    drain = BacklogDrain(enter_backlog=50, window=60)
+    now = time.time()
+    drain.record_pass(100, 600, now=now - 200)
+    drain.record_pass(100, 500, now=now - 100)
+    drain.record_pass(0, 500, now=now - 30)
+    drain.record_pass(0, 500, now=now)
+    assert drain.get_metrics()["throughput"] == 0.0
+
+
+@pytest.fixture
+def gateway(db):
+    """Gateway with mocked serial/position cache and a mocked OSM worker."""
+    with patch('gateway.main.MeshtasticSerial') as mock_serial, \
+            patch('gateway.main.PositionCache') as mock_cache, \
+            patch('gateway.main.WORKER_INTERVAL', 30):
+        mock_serial.return_value = Mock()
+        mock_cache.return_value = Mock()
+        gw = Gateway()
+        gw.db = db
+        gw.osm_worker = Mock()
+        gw.notifications = Mock()
+        gw.db.set_time_correction_applied(True)
+        yield gw
+        gw.running = False
+        gw.wake_worker()
+
+
+def test_worker_drains_continuously(gateway, db):
+    """Test that partial batches keep the worker going in drain mode, with notification passes between."""
+    for i in range(60):
+        db.create_note(f"node{i}", 4.6, -74.0, f"n{i}", f"n{i}")
+    # Partial batches (e.g. some notes rescheduled) would normally end the burst
+    gateway.osm_worker.process_pending.side_effect = [3, 3, 3, 0]
+
+    gateway.running = True
+    thread = threading.Thread(target=gateway._worker_loop, daemon=True)
+    thread.start()
+    deadline = time.time() + 2.0
+    while gateway.osm_worker.process_pending.call_count < 4 and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert gateway.osm_worker.process_pending.call_count == 4
+    assert gateway.osm_worker.process_pending.call_args_list[1][1]["limit"] == gateway.drain.drain_batch_size
+    assert gateway.notifications.process_sent_notifications.call_count >= 3
+    assert gateway.drain.active
+    time.sleep(0.1)
+    # Nothing sent: back to waiting for events
+    assert gateway.osm_worker.process_pending.call_count == 4
+    gateway.running = False
+    gateway.wake_worker()
+    thread.join(timeout=2.0)
@@ -0,0 +1,94 @@
+"""Tests for per-node fair scheduling of the pending queue."""
+
+import time
+import threading
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+
+from gateway.database import Database
+from gateway.http_client import HttpClient
+from gateway.osm_worker import OSMWorker
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Create temporary database."""
+    return Database(db_path=tmp_path / "test.db")
+
+
+def set_created_at(db, queue_id, seconds_ago):
+    with db._get_connection() as conn:
+        conn.execute(
+            "UPDATE notes SET created_at = ? WHERE local_queue_id = ?",
+            (datetime.utcnow() - timedelta(seconds=seconds_ago), queue_id),
+        )
+        conn.commit()
+
+
+def backlog(db):
+    """A chatty node with 50 old notes, then two nodes with one note each."""
+    for i in range(50):
+        set_created_at(db, db.create_note("chatty", 4.6, -74.0 + i * 0.001, f"c{i}", f"c{i}"), 3600 - i)
+    quiet = [db.create_note(node, 4.7, -74.1, node, node) for node in ("quiet1", "quiet2")]
+    set_created_at(db, quiet[0], 1800)
+    set_created_at(db, quiet[1], 1700)
+    return quiet
+
+
+def test_round_robin_across_nodes(db):
+    """Test that every node's oldest note comes before any node's second note."""
+    quiet = backlog(db)
+    batch = db.get_pending_notes_fair(limit=5)
+
+    assert [note["node_id"] for note in batch] == ["chatty", "quiet1", "quiet2", "chatty", "chatty"]
+    assert [note["local_queue_id"] for note in batch[1:3]] == quiet
+    assert "node_rank" not in batch[0]
+    # Strict FIFO would have returned only the chatty node
+    assert {note["node_id"] for note in db.get_pending_notes(limit=5)} == {"chatty"}
+
+
+def test_fresh_reports_first(db):
+    """Test the optional priority for notes created within fresh_seconds."""
+    backlog(db)
+    fresh = db.create_note("chatty", 4.8, -74.2, "nuevo", "nuevo")
+
+    assert db.get_pending_notes_fair(limit=1, fresh_seconds=300)[0]["local_queue_id"] == fresh
+    assert db.get_pending_notes_fair(limit=1)[0]["local_queue_id"] != fresh
+
+
+def test_notes_waiting_for_retry_skipped(db):
+    """Test that scheduled retries are not picked before they are due."""
+    quiet = backlog(db)
+    db.update_note_error(quiet[0], "error", retry_count=1, next_attempt_at=time.time() + 60)
+    assert quiet[0] not in {note["local_queue_id"] for note in db.get_pending_notes_fair(limit=100)}
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_worker_sends_fairly_and_reports_waits(mock_post, db):
+    """Test that one worker batch reaches every node and records queue waits."""
+    response = Mock(status_code=200)
+    response.json.return_value = {"properties": {"id": 1}}
+    mock_post.return_value = response
+    quiet = backlog(db)
+    worker = OSMWorker(db, http=HttpClient(), note_lookup=Mock(return_value=None))
+
+    assert worker.process_pending(limit=3) == 3
+    assert all(db.get_note_by_queue_id(queue_id)["status"] == "sent" for queue_id in quiet)
+
+    waits = worker.get_metrics()["queue_wait"]
+    assert set(waits) == {"chatty", "quiet1", "quiet2"}
+    assert waits["quiet1"]["count"] == 1
+    assert waits["quiet1"]["p50"] == pytest.approx(1800, abs=5)
+    assert waits["chatty"]["p95"] == pytest.approx(3600, abs=5)
+
+
+def test_metrics_not_blocked_by_a_send_in_flight(db):
+    """Test that get_metrics answers while another thread holds the send lock."""
+    worker = OSMWorker(db, http=HttpClient())
+    result = []
+    with worker._send_lock:
+        reader = threading.Thread(target=lambda: result.append(worker.get_metrics()))
+        reader.start()
+        reader.join(timeout=2)
+    assert result and result[0]["reconciled"] == 0
@@ -0,0 +1,139 @@
+"""Tests for the persistent reverse-geocode cache."""
+
+import time
+import pytest
+from unittest.mock import Mock, patch
+
+from gateway.database import Database
+from gateway.geocode_cache import GeocodeCache
+from gateway.geocoding import GeocodingService
+from gateway.http_client import HttpClient
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Create temporary database."""
+    return Database(db_path=tmp_path / "test.db")
+
+
+def nominatim_response(neighbourhood="Prado Veraniego"):
+    response = Mock(status_code=200)
+    response.json.return_value = {
+        "address": {"neighbourhood": neighbourhood, "city": "Bogotá", "country": "Colombia"}
+    }
+    return response
+
+
+def test_nearby_coordinates_share_a_cell(db):
+    """Test that coordinates are quantised to the configured precision."""
+    cache = GeocodeCache(db, precision=3)
+    cache.put(4.60971, -74.08171, "Prado Veraniego, Bogotá")
+
+    assert cache.get(4.60968, -74.08169) == "Prado Veraniego, Bogotá"
+    assert cache.get(4.6120, -74.0817) is None
+    assert cache.cell(4.60971, -74.08171) == "4.610,-74.082"
+
+
+def test_hit_and_miss_counters(db):
+    """Test hit/miss metrics."""
+    cache = GeocodeCache(db)
+    assert cache.get(4.6097, -74.0817) is None
+    cache.put(4.6097, -74.0817, "Bogotá")
+    cache.get(4.6097, -74.0817)
+    cache.get(4.6097, -74.0817)
+
+    metrics = cache.get_metrics()
+    assert metrics["hits"] == 2
+    assert metrics["misses"] == 1
+    assert metrics["hit_ratio"] == pytest.approx(2 / 3)
+    assert metrics["size"] == 1
+
+
+def test_ttl_expires_entries(db):
+    """Test that entries older than the TTL are misses and removed from disk."""
+    cache = GeocodeCache(db, ttl=60)
+    cache.put(4.6097, -74.0817, "Bogotá")
+
+    with patch("gateway.geocode_cache.time.time", return_value=time.time() + 61):
+        assert cache.get(4.6097, -74.0817) is None
+    assert cache.get_metrics()["expired"] == 1
+    assert db.load_geocode_cache(0, 10) == []
+
+
+def test_lru_eviction(db):
+    """Test that the least recently used cell is evicted, in memory and on disk."""
+    cache = GeocodeCache(db, max_entries=2)
+    cache.put(1.0, 1.0, "A")
+    cache.put(2.0, 2.0, "B")
+    cache.get(1.0, 1.0)  # A is now more recent than B
+    cache.put(3.0, 3.0, "C")
+
+    assert cache.get(2.0, 2.0) is None
+    assert cache.get(1.0, 1.0) == "A"
+    assert cache.get(3.0, 3.0) == "C"
+    assert cache.get_metrics()["evictions"] == 1
+    assert sorted(cell for cell, _, _ in db.load_geocode_cache(0, 10)) == ["1.000,1.000", "3.000,3.000"]
+
+
+def test_survives_restart(db):
+    """Test that cached addresses are loaded back from SQLite."""
+    GeocodeCache(db).put(4.6097, -74.0817, "Prado Veraniego, Bogotá")
+
+    reloaded = GeocodeCache(db)
+    assert reloaded.get(4.6097, -74.0817) == "Prado Veraniego, Bogotá"
+
+
+def test_restart_drops_stale_and_excess_rows(db):
+    """Test that loading trims expired rows and keeps the newest max_entries."""
+    now = time.time()
+    db.save_geocode("0.000,0.000", "stale", now - 1000)
+    db.save_geocode("1.000,1.000", "old", now - 20)
+    db.save_geocode("2.000,2.000", "new", now - 10)
+
+    cache = GeocodeCache(db, ttl=100, max_entries=1)
+    assert cache.get_metrics()["size"] == 1
+    assert cache.get(2.0, 2.0) == "new"
+    assert [cell for cell, _, _ in db.load_geocode_cache(0, 10)] == ["2.000,2.000"]
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_geocoding_service_uses_cache(mock_get, db):
+    """Test that repeat lookups skip Nominatim and the rate-limit sleep."""
+    mock_get.return_value = nominatim_response()
+    service = GeocodingService(cache=GeocodeCache(db))
+
+    first = service.reverse_geocode(4.6097, -74.0817)
+    assert "Prado Veraniego" in first
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        assert service.reverse_geocode(4.6097, -74.0817) == first
+    per_lookup = (time.perf_counter() - start) / 1000
+
+    assert mock_get.call_count == 1
+    assert per_lookup < 0.001
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_failed_lookups_not_cached(mock_get, db):
+    """Test that errors are retried on the next call."""
+    mock_get.return_value = Mock(status_code=500, text="error")
+    # Client without rate limits, so the retry does not wait
+    service = GeocodingService(cache=GeocodeCache(db), http=HttpClient())
+
+    assert service.reverse_geocode(4.6097, -74.0817) is None
+    mock_get.return_value = nominatim_response()
+    assert "Prado Veraniego" in service.reverse_geocode(4.6097, -74.0817)
+    assert mock_get.call_count == 2
+
+
+def test_cached_cell_served_while_offline(db):
+    """Test that a cached address is returned even with the circuit open."""
+    connectivity = Mock()
+    connectivity.allow_request.return_value = False
+    cache = GeocodeCache(db)
+    cache.put(4.6097, -74.0817, "Bogotá")
+
+    service = GeocodingService(connectivity=connectivity, cache=cache)
+    assert service.reverse_geocode(4.6097, -74.0817) == "Bogotá"
+    assert service.reverse_geocode(5.0, -75.0) is None
@@ -11,7 +11,7 @@ def geocoding():
     return GeocodingService()
 
 
-@patch('gateway.geocoding.requests.get')
+@patch('gateway.http_client.requests.Session.request')
 def test_reverse_geocode_success(mock_get, geocoding):
     """Test successful reverse geocoding."""
     # Mock successful response
@@ -35,7 +35,7 @@ def test_reverse_geocode_success(mock_get, geocoding):
     assert "Colombia" in result
 
 
-@patch('gateway.geocoding.requests.get')
+@patch('gateway.http_client.requests.Session.request')
 def test_reverse_geocode_no_address_components(mock_get, geocoding):
     """Test geocoding with no address components."""
     mock_response = Mock()
@@ -50,7 +50,7 @@ def test_reverse_geocode_no_address_components(mock_get, geocoding):
     assert result is None
 
 
-@patch('gateway.geocoding.requests.get')
+@patch('gateway.http_client.requests.Session.request')
 def test_reverse_geocode_api_error(mock_get, geocoding):
     """Test geocoding with API error."""
     mock_response = Mock()
@@ -63,7 +63,7 @@ def test_reverse_geocode_api_error(mock_get, geocoding):
     assert result is None
 
 
-@patch('gateway.geocoding.requests.get')
+@patch('gateway.http_client.requests.Session.request')
 def test_reverse_geocode_timeout(mock_get, geocoding):
     """Test geocoding with timeout."""
     import requests
@@ -74,7 +74,7 @@ def test_reverse_geocode_timeout(mock_get, geocoding):
     assert result is None
 
 
-@patch('gateway.geocoding.requests.get')
+@patch('gateway.http_client.requests.Session.request')
 def test_reverse_geocode_connection_error(mock_get, geocoding):
     """Test geocoding with connection error."""
     import requests
@@ -85,7 +85,7 @@ def test_reverse_geocode_connection_error(mock_get, geocoding):
     assert result is None
 
 
-@patch('gateway.geocoding.requests.get')
+@patch('gateway.http_client.requests.Session.request')
 def test_reverse_geocode_rate_limiting(mock_get, geocoding):
     """Test that geocoding respects rate limiting."""
     import time
@@ -114,3 +114,65 @@ def test_reverse_geocode_rate_limiting(mock_get, geocoding):
     assert result2 is not None
     # Second call should have waited at least 1 second (rate limit)
     assert elapsed2 >= 0.9  # Allow some margin for test execution time
+
+
+@patch('gateway.http_client.requests.Session.request')
+def test_concurrent_lookups_share_one_request(mock_get):
+    """Test that concurrent lookups for one cell wait on a single Nominatim request."""
+    import threading
+    import time
+    from gateway.http_client import HttpClient
+
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow_response(*args, **kwargs):
+        started.set()
+        release.wait(2.0)
+        response = Mock(status_code=200)
+        response.json.return_value = {"address": {"neighbourhood": "Prado Veraniego", "city": "Bogotá"}}
+        return response
+
+    mock_get.side_effect = slow_response
+    service = GeocodingService(http=HttpClient())
+    results = []
+    leader = threading.Thread(target=lambda: results.append(service.reverse_geocode(4.6097, -74.0817)))
+    leader.start()
+    assert started.wait(2.0)
+
+    # Nearby points fall in the same cell
+    followers = [
+        threading.Thread(target=lambda: results.append(service.reverse_geocode(4.6098, -74.0816)))
+        for _ in range(4)
+    ]
+    for thread in followers:
+        thread.start()
+    deadline = time.time() + 2.0
+    while service.get_metrics()["coalesced"] < 4 and time.time() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(2.0)
+
+    assert results == ["Prado Veraniego, Bogotá"] * 5
+    assert mock_get.call_count == 1
+    metrics = service.get_metrics()
+    assert metrics["nominatim_requests"] == 1
+    assert metrics["coalesced"] == 4
+    assert metrics["in_flight"] == 0
+
+
+@patch('gateway.http_client.requests.Session.request')
+def test_failed_flight_is_not_reused(mock_get):
+    """Test that a failed lookup is shared by its waiters but not by later calls."""
+    from gateway.http_client import HttpClient
+
+    mock_get.return_value = Mock(status_code=500, text="error")
+    service = GeocodingService(http=HttpClient())
+    assert service.reverse_geocode(4.6097, -74.0817) is None
+
+    response = Mock(status_code=200)
+    response.json.return_value = {"address": {"city": "Bogotá"}}
+    mock_get.return_value = response
+    assert service.reverse_geocode(4.6097, -74.0817) == "Bogotá"
+    assert service.get_metrics()["nominatim_requests"] == 2
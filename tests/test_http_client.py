@@ -0,0 +1,162 @@
+"""Tests for the shared HTTP client."""
+
+import threading
+import time
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock, patch
+
+from gateway import http_client
+from gateway.http_client import HttpClient, TokenBucket
+from gateway.geocoding import GeocodingService
+from gateway.commands import CommandProcessor
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """Local keep-alive HTTP server."""
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_token_bucket_spacing():
+    """Test that a bucket of capacity 1 spaces requests by 1/rate."""
+    bucket = TokenBucket(rate=20.0)
+    start = time.perf_counter()
+    waits = [bucket.acquire() for _ in range(4)]
+    elapsed = time.perf_counter() - start
+
+    assert waits[0] == 0.0
+    assert elapsed >= 0.14
+    assert bucket.acquire() > 0
+
+
+def test_token_bucket_concurrent_callers_queue_up():
+    """Test that concurrent callers are spaced, not released together."""
+    bucket = TokenBucket(rate=20.0)
+    done = []
+    threads = [threading.Thread(target=lambda: done.append((bucket.acquire(), time.perf_counter())))
+               for _ in range(4)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(t for _, t in done) - start >= 0.14
+
+
+def test_connections_are_reused(server):
+    """Test keep-alive: one TCP connection for several requests, with timings."""
+    client = HttpClient()
+    for _ in range(3):
+        assert client.get(f"{server}/reverse", timeout=5).json() == {"ok": True}
+
+    metrics = client.get_metrics()["127.0.0.1"]
+    assert metrics["requests"] == 3
+    assert metrics["new_connections"] == 1
+    assert metrics["reused_connections"] == 2
+    assert metrics["connect_p50"] is not None
+    assert metrics["tls_p50"] == 0.0
+    assert metrics["ttfb_p50"] is not None
+    assert metrics["total_p95"] >= metrics["ttfb_p50"]
+    assert metrics["rate"] is None
+    client.close()
+
+
+def test_per_host_limit(server):
+    """Test that only the limited host waits."""
+    client = HttpClient()
+    client.set_limit("127.0.0.1", 10.0)
+    start = time.perf_counter()
+    client.get(f"{server}/a", timeout=5)
+    client.get(f"{server}/b", timeout=5)
+    assert time.perf_counter() - start >= 0.09
+
+    metrics = client.get_metrics()["127.0.0.1"]
+    assert metrics["rate"] == 10.0
+    assert metrics["limit_wait"] > 0.0
+
+    client.set_limit("127.0.0.1", None)
+    start = time.perf_counter()
+    client.get(f"{server}/c", timeout=5)
+    assert time.perf_counter() - start < 0.09
+    client.close()
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_errors_are_counted_and_reraised(mock_request):
+    """Test that request exceptions propagate to the caller."""
+    import requests
+    mock_request.side_effect = requests.exceptions.ConnectionError()
+    client = HttpClient()
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get("https://example.org/")
+    assert client.get_metrics()["example.org"]["errors"] == 1
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_nominatim_limit_shared_between_instances(mock_request):
+    """Test that two GeocodingService instances share one Nominatim rate limit."""
+    response = Mock(status_code=200)
+    response.json.return_value = {"address": {"city": "Bogotá"}}
+    mock_request.return_value = response
+
+    first = GeocodingService()
+    second = GeocodingService()
+    assert first.http is second.http is http_client.get_client()
+
+    start = time.perf_counter()
+    first.reverse_geocode(4.6, -74.0)
+    second.reverse_geocode(4.7, -74.1)
+    assert time.perf_counter() - start >= 0.9
+
+
+def test_command_processor_has_no_own_geocoder(tmp_path):
+    """Test that CommandProcessor no longer builds a separate GeocodingService."""
+    from gateway.database import Database
+    from gateway.position_cache import PositionCache
+    db = Database(db_path=tmp_path / "test.db")
+    processor = CommandProcessor(db, PositionCache(db=db))
+    assert not hasattr(processor, "geocoding")
+
+
+def test_token_bucket_try_acquire():
+    """Test that try_acquire never sleeps and takes no token when none is available."""
+    bucket = TokenBucket(rate=10.0)
+    assert bucket.try_acquire() == 0.0
+    wait = bucket.try_acquire()
+    assert 0.05 < wait <= 0.1
+    assert bucket.try_acquire() == pytest.approx(wait, abs=0.01)
+    time.sleep(wait)
+    assert bucket.try_acquire() == 0.0
+
+
+def test_request_without_rate_limit(server):
+    """Test that rate_limited=False skips the host's bucket."""
+    client = HttpClient()
+    client.set_limit("127.0.0.1", 1.0)
+    client.get(f"{server}/a", timeout=5)
+    start = time.perf_counter()
+    client.get(f"{server}/b", timeout=5, rate_limited=False)
+    assert time.perf_counter() - start < 0.5
+    assert client.get_metrics()["127.0.0.1"]["limit_wait"] == 0.0
+    client.close()
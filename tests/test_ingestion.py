@@ -0,0 +1,270 @@
+"""Tests for the bounded ingestion queue."""
+
+import threading
+import time
+import pytest
+from unittest.mock import Mock, patch
+
+from gateway.ingestion import (
+    IngestionQueue,
+    PRIORITY_NOTE,
+    PRIORITY_COMMAND,
+    PRIORITY_OTHER,
+    OVERFLOW_DROP_NEWEST,
+    OVERFLOW_DROP_LOWEST,
+    OVERFLOW_BLOCK,
+    PacketDedup,
+)
+from gateway.meshtastic_serial import MeshtasticSerial
+
+
+def by_text(msg):
+    """Priority from the message text, for tests."""
+    return {"note": PRIORITY_NOTE, "cmd": PRIORITY_COMMAND}.get(msg["text"], PRIORITY_OTHER)
+
+
+def msg(text, n=0):
+    return {"node_id": f"!{n:08x}", "text": text}
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_submit_returns_immediately_and_handles_in_worker():
+    """Test that a slow handler does not block submit()."""
+    handled = []
+    release = threading.Event()
+
+    def handler(m):
+        release.wait(2.0)
+        handled.append(m)
+
+    queue = IngestionQueue(handler, by_text, maxsize=10, workers=1)
+    queue.start()
+    try:
+        start = time.perf_counter()
+        assert queue.submit(msg("note"))
+        assert queue.submit(msg("cmd"))
+        assert time.perf_counter() - start < 0.1
+        release.set()
+        assert wait_until(lambda: len(handled) == 2)
+    finally:
+        queue.stop()
+
+
+def test_notes_handled_before_commands():
+    """Test priority order, FIFO within a priority."""
+    handled = []
+    queue = IngestionQueue(lambda m: handled.append(m["node_id"]), by_text, maxsize=10, workers=1)
+
+    queue.submit(msg("other", 1))
+    queue.submit(msg("cmd", 2))
+    queue.submit(msg("note", 3))
+    queue.submit(msg("cmd", 4))
+    queue.submit(msg("note", 5))
+    queue.start()
+    try:
+        assert wait_until(lambda: len(handled) == 5)
+    finally:
+        queue.stop()
+
+    assert handled == ["!00000003", "!00000005", "!00000002", "!00000004", "!00000001"]
+
+
+def test_drop_newest_policy():
+    """Test that drop_newest refuses messages once full."""
+    queue = IngestionQueue(Mock(), by_text, maxsize=2, overflow_policy=OVERFLOW_DROP_NEWEST)
+    assert queue.submit(msg("cmd"))
+    assert queue.submit(msg("cmd"))
+    assert not queue.submit(msg("note"))
+
+    metrics = queue.get_metrics()
+    assert metrics["depth"] == 2
+    assert metrics["dropped"]["note"] == 1
+
+
+def test_drop_lowest_policy_evicts_less_important():
+    """Test that a note evicts the oldest lowest-priority queued message."""
+    handled = []
+    queue = IngestionQueue(lambda m: handled.append(m["node_id"]), by_text,
+                           maxsize=3, workers=1, overflow_policy=OVERFLOW_DROP_LOWEST)
+    queue.submit(msg("other", 1))
+    queue.submit(msg("cmd", 2))
+    queue.submit(msg("other", 3))
+
+    assert queue.submit(msg("note", 4))  # evicts !00000001
+    assert queue.submit(msg("cmd", 5))  # evicts !00000003
+    assert not queue.submit(msg("cmd", 6))  # nothing less important left
+
+    metrics = queue.get_metrics()
+    assert metrics["dropped"] == {"note": 0, "command": 1, "other": 2}
+
+    queue.start()
+    try:
+        assert wait_until(lambda: len(handled) == 3)
+    finally:
+        queue.stop()
+    assert handled == ["!00000004", "!00000002", "!00000005"]
+
+
+def test_block_policy_waits_for_room():
+    """Test that block waits for a worker to free a slot."""
+    release = threading.Event()
+    queue = IngestionQueue(lambda m: release.wait(2.0), by_text,
+                           maxsize=1, workers=1, overflow_policy=OVERFLOW_BLOCK, block_timeout=2.0)
+    queue.start()
+    try:
+        queue.submit(msg("cmd"))  # taken by the worker
+        assert wait_until(lambda: queue.depth() == 0)
+        queue.submit(msg("cmd"))  # fills the queue
+
+        threading.Timer(0.1, release.set).start()
+        start = time.perf_counter()
+        assert queue.submit(msg("note"))
+        assert 0.05 < time.perf_counter() - start < 1.5
+    finally:
+        release.set()
+        queue.stop()
+
+
+def test_block_policy_times_out():
+    """Test that block drops the message after block_timeout."""
+    # Running but without worker threads, so nothing frees a slot
+    queue = IngestionQueue(Mock(), by_text, maxsize=1,
+                           overflow_policy=OVERFLOW_BLOCK, block_timeout=0.05)
+    queue._running = True
+    queue.submit(msg("cmd"))
+    start = time.perf_counter()
+    assert not queue.submit(msg("note"))
+    assert time.perf_counter() - start >= 0.04
+    assert queue.get_metrics()["dropped"]["note"] == 1
+
+
+def test_unknown_policy_rejected():
+    """Test that a misconfigured policy fails loudly."""
+    with pytest.raises(ValueError):
+        IngestionQueue(Mock(), overflow_policy="drop_everything")
+
+
+def test_handler_errors_do_not_kill_workers():
+    """Test that a failing message does not stop the pool."""
+    handled = []
+
+    def handler(m):
+        if m["text"] == "boom":
+            raise RuntimeError("boom")
+        handled.append(m)
+
+    queue = IngestionQueue(handler, by_text, maxsize=10, workers=1)
+    queue.start()
+    try:
+        queue.submit(msg("boom"))
+        queue.submit(msg("note"))
+        assert wait_until(lambda: len(handled) == 1)
+    finally:
+        queue.stop()
+    metrics = queue.get_metrics()
+    assert metrics["errors"] == 1
+    assert metrics["processed"] == 2
+
+
+def test_wait_time_metrics():
+    """Test that queue wait percentiles are reported."""
+    queue = IngestionQueue(Mock(), by_text, maxsize=10, workers=1)
+    assert queue.get_metrics()["wait_p50"] is None
+
+    queue.submit(msg("note"))
+    time.sleep(0.05)
+    queue.start()
+    try:
+        assert wait_until(lambda: queue.get_metrics()["processed"] == 1)
+    finally:
+        queue.stop()
+
+    metrics = queue.get_metrics()
+    assert metrics["wait_p50"] >= 0.04
+    assert metrics["wait_max"] == metrics["wait_p95"]
+    assert metrics["max_depth"] == 1
+    assert metrics["submitted"] == 1
+
+
+def test_stop_drains_queued_messages():
+    """Test that stop() handles what was already queued."""
+    handled = []
+    queue = IngestionQueue(lambda m: (time.sleep(0.01), handled.append(m)), by_text,
+                           maxsize=10, workers=2)
+    queue.start()
+    for i in range(5):
+        queue.submit(msg("cmd", i))
+    queue.stop(timeout=2.0)
+    assert len(handled) == 5
+
+
+@patch('gateway.main.MeshtasticSerial')
+@patch('gateway.main.PositionCache')
+def test_gateway_message_priority(mock_position_cache, mock_meshtastic_serial):
+    """Test the Gateway's classification of incoming messages."""
+    from gateway.main import Gateway
+
+    mock_meshtastic_serial.return_value = Mock()
+    mock_position_cache.return_value = Mock()
+    gateway = Gateway()
+
+    assert gateway._message_priority({"text": "#osmnote bache"}) == PRIORITY_NOTE
+    assert gateway._message_priority({"text": "Hay un #osm-note aquí"}) == PRIORITY_NOTE
+    assert gateway._message_priority({"text": "#osmstatus"}) == PRIORITY_COMMAND
+    assert gateway._message_priority({"text": "hola"}) == PRIORITY_OTHER
+    gateway.serial.set_message_callback.assert_called_with(gateway.ingestion.submit)
+
+
+def test_packet_dedup_suppresses_repeats():
+    """Test that a (from, packet id) pair is only new once."""
+    dedup = PacketDedup()
+    assert dedup.first_seen(0x1234, 42) is True
+    assert dedup.first_seen(0x1234, 42) is False
+    assert dedup.first_seen(0x5678, 42) is True  # same id, other node
+    assert dedup.first_seen(0x1234, 0) is True  # no id: cannot match
+    assert dedup.first_seen(0x1234, 0) is True
+
+    metrics = dedup.get_metrics()
+    assert metrics["suppressed"] == 1
+    assert metrics["size"] == 2
+
+
+def test_packet_dedup_expires_and_is_bounded():
+    """Test TTL expiry and the max_entries bound."""
+    dedup = PacketDedup(ttl=60, max_entries=3)
+    with patch("gateway.ingestion.time.monotonic", return_value=1000.0):
+        for packet_id in (1, 2, 3, 4):
+            dedup.first_seen(1, packet_id)
+    assert dedup.get_metrics()["evicted"] == 1
+    with patch("gateway.ingestion.time.monotonic", return_value=1030.0):
+        assert dedup.first_seen(1, 1) is True  # evicted
+        assert dedup.first_seen(1, 4) is False
+    with patch("gateway.ingestion.time.monotonic", return_value=1061.0):
+        assert dedup.first_seen(1, 4) is True  # expired
+        assert dedup.get_metrics()["size"] == 2  # 1 (seen at 1030) and 4
+
+
+def test_text_packet_delivered_twice_is_handled_once():
+    """Test that the text topic and the catch-all topic do not both run the pipeline."""
+    serial = MeshtasticSerial()
+    serial.running = True
+    callback = Mock()
+    serial.set_message_callback(callback)
+    packet = {"from": 0x1234abcd, "id": 987654, "decoded": {"portnum": "TEXT_MESSAGE_APP", "text": "#osmnote bache"}}
+
+    serial._on_receive_text(packet, None)
+    serial._on_receive_all(packet, None)
+    serial._on_receive_text(dict(packet), None)  # mesh rebroadcast
+
+    callback.assert_called_once()
+    assert callback.call_args[0][0]["node_id"] == "!1234abcd"
+    assert serial.packet_dedup.get_metrics()["suppressed"] == 2
+
+    serial._on_receive_text({**packet, "id": 987655}, None)
+    assert callback.call_count == 2
@@ -0,0 +1,109 @@
+"""Tests for the local mock OSM / Nominatim server."""
+
+import time
+import pytest
+import requests
+from unittest.mock import patch
+
+from gateway.database import Database
+from gateway.http_client import HttpClient
+from gateway.mock_osm import FaultProfile, MockOSMServer, parse_latency
+from gateway.osm_worker import OSMWorker
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Create temporary database."""
+    return Database(db_path=tmp_path / "test.db")
+
+
+@pytest.fixture
+def server():
+    mock = MockOSMServer(seed=1).start()
+    yield mock
+    mock.stop()
+
+
+def test_parse_latency():
+    """Test the latency spec forms."""
+    assert parse_latency("0.25")() == 0.25
+    assert 0.1 <= parse_latency("uniform:0.1:0.2")() <= 0.2
+    assert parse_latency("exp:0.5")() >= 0
+    assert parse_latency("lognormal:0.2:0.5")() > 0
+    with pytest.raises(ValueError):
+        parse_latency("gamma:1")
+
+
+def test_worker_submits_and_reconciles_against_mock(server, db):
+    """Test the real HTTP path: a note is created, then found by the reconciliation lookup."""
+    with patch("gateway.osm_worker.OSM_API_URL", server.notes_url):
+        worker = OSMWorker(db, http=HttpClient())
+        queue_id = db.create_note("node1", 4.6097, -74.0817, "bache", "bache")
+
+        assert worker.process_pending() == 1
+        assert db.get_note_by_queue_id(queue_id)["osm_note_id"] == 1
+        assert server.notes[0]["properties"]["comments"][0]["text"].startswith("bache")
+
+        found = worker.find_submitted_note(4.6097, -74.0817, "bache", time.time() - 60)
+        assert found["id"] == 1
+    assert server.get_metrics()["by_status"] == {200: 2}
+
+
+def test_injected_429_with_retry_after(server, db):
+    """Test that an injected 429 reaches the rate controller with its Retry-After."""
+    server.profiles["notes"] = FaultProfile(errors={429: 1.0}, retry_after=120)
+    with patch("gateway.osm_worker.OSM_API_URL", server.notes_url):
+        worker = OSMWorker(db, http=HttpClient())
+        queue_id = db.create_note("node1", 4.6097, -74.0817, "bache", "bache")
+        worker.process_pending()
+
+    note = db.get_note_by_queue_id(queue_id)
+    assert note["status"] == "pending"
+    assert (note["retry_count"] or 0) == 0
+    assert note["next_attempt_at"] >= time.time() + 100
+    assert server.get_metrics()["faults"] == 1
+    assert server.notes == []
+
+
+def test_latency_hang_and_request_log(tmp_path):
+    """Test injected latency, a hung request seen as a client timeout, and the JSONL log."""
+    log_path = tmp_path / "requests.jsonl"
+    server = MockOSMServer(
+        reverse=FaultProfile(latency=0.1),
+        notes=FaultProfile(hang_rate=1.0, hang_seconds=0.5),
+        log_path=str(log_path),
+    ).start()
+    try:
+        started = time.monotonic()
+        response = requests.get(server.reverse_url, params={"lat": 4.6, "lon": -74.0}, timeout=2)
+        assert time.monotonic() - started >= 0.1
+        assert response.json()["address"]["city"] == "Bogotá"
+
+        with pytest.raises(requests.exceptions.Timeout):
+            requests.post(server.notes_url, json={"lat": 4.6, "lon": -74.0, "text": "x"}, timeout=0.2)
+    finally:
+        server.stop()
+
+    assert [entry["status"] for entry in server.requests] == [200, None]
+    assert server.requests[1]["fault"] == "hang"
+    assert len(log_path.read_text().splitlines()) == 2
+
+
+def test_urls_follow_the_bound_host():
+    """Test that the URLs use the bound address, with a separate name only for Nominatim."""
+    server = MockOSMServer(host="0.0.0.0")
+    try:
+        assert server.notes_url == f"http://127.0.0.1:{server.port}/api/0.6/notes.json"
+        assert server.probe_url == f"http://127.0.0.1:{server.port}/api/capabilities"
+        assert server.reverse_url == f"http://localhost:{server.port}/reverse"
+    finally:
+        server.stop()
+
+    server = MockOSMServer(host="127.0.0.2").start()
+    try:
+        assert server.notes_url.startswith("http://127.0.0.2:")
+        assert requests.get(server.reverse_url, params={"lat": 4.6, "lon": -74.0}, timeout=2).status_code == 200
+        server.reverse_host = "mock-nominatim"
+        assert server.reverse_url == f"http://mock-nominatim:{server.port}/reverse"
+    finally:
+        server.stop()
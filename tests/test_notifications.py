@@ -143,3 +143,18 @@ def test_dry_run_mode(notifications, serial, monkeypatch):
     # But the current implementation still calls send_dm
     # This is acceptable for MVP
     assert True
+
+
+def test_process_failed_notifications(notifications, db, serial):
+    """Test that failed notes trigger one error notification."""
+    queue_id = db.create_note("node1", 1.0, 2.0, "test", "test")
+    db.mark_note_failed(queue_id, "Error del servidor OSM")
+
+    notifications.process_failed_notifications()
+    serial.send_dm.assert_called_once()
+    assert "fallaron" in serial.send_dm.call_args[0][1]
+
+    # Second pass sends nothing new
+    notifications.process_failed_notifications()
+    serial.send_dm.assert_called_once()
+    assert db.get_note_by_queue_id(queue_id)["notified_failed"] == 1
@@ -0,0 +1,136 @@
+"""Tests for offline reverse geocoding from local boundaries."""
+
+import json
+import math
+import time
+import pytest
+from unittest.mock import Mock, patch
+
+from gateway.geocoding import GeocodingService, OfflineGeocoder
+
+
+def square(lon0, lat0, lon1, lat1):
+    return [[lon0, lat0], [lon1, lat0], [lon1, lat1], [lon0, lat1], [lon0, lat0]]
+
+
+def feature(name, ring_or_rings, geometry_type="Polygon", **tags):
+    coordinates = ring_or_rings if geometry_type == "MultiPolygon" else (
+        ring_or_rings if isinstance(ring_or_rings[0][0], list) else [ring_or_rings]
+    )
+    return {
+        "type": "Feature",
+        "properties": {"name": name, **tags},
+        "geometry": {"type": geometry_type, "coordinates": coordinates},
+    }
+
+
+def circle(lon, lat, radius, vertices):
+    ring = [
+        [lon + radius * math.cos(2 * math.pi * i / vertices), lat + radius * math.sin(2 * math.pi * i / vertices)]
+        for i in range(vertices)
+    ]
+    return ring + ring[:1]
+
+
+@pytest.fixture
+def bogota_features():
+    """Nested boundaries around (4.7, -74.07)."""
+    return [
+        feature("Colombia", square(-79.0, -4.2, -66.8, 12.5), boundary="administrative", admin_level="2"),
+        feature("Bogotá D.C.", square(-74.3, 4.4, -73.9, 4.9), admin_level=4),
+        feature("Bogotá", square(-74.25, 4.45, -73.95, 4.85), admin_level="6"),
+        feature("Suba", square(-74.15, 4.68, -74.0, 4.8), admin_level="8"),
+        # Barrio with a park cut out of it
+        feature("Prado Veraniego", [square(-74.08, 4.69, -74.05, 4.72), square(-74.07, 4.70, -74.06, 4.71)],
+                place="neighbourhood"),
+        feature("Rincón", [[square(-74.11, 4.73, -74.10, 4.74)], [square(-74.09, 4.75, -74.08, 4.76)]],
+                geometry_type="MultiPolygon", place="suburb"),
+        # Ignored: no name / unsupported tags / not a polygon
+        feature("", square(-74.08, 4.69, -74.05, 4.72), admin_level="9"),
+        feature("Parque", square(-74.07, 4.70, -74.06, 4.71), leisure="park"),
+        {"type": "Feature", "properties": {"name": "Punto", "place": "suburb"},
+         "geometry": {"type": "Point", "coordinates": [-74.07, 4.7]}},
+    ]
+
+
+def test_full_hierarchy(bogota_features):
+    """Test that nested polygons produce the Nominatim-style hierarchy."""
+    geocoder = OfflineGeocoder(bogota_features)
+    assert geocoder.area_count == 6
+    assert geocoder.reverse_geocode(4.695, -74.075) == "Prado Veraniego, Suba, Bogotá, Bogotá D.C., Colombia"
+
+
+def test_hole_and_multipolygon(bogota_features):
+    """Test that holes are excluded and every part of a multipolygon matches."""
+    geocoder = OfflineGeocoder(bogota_features)
+    assert "neighbourhood" not in geocoder.lookup(4.705, -74.065)
+    assert geocoder.lookup(4.735, -74.105)["suburb"] == "Rincón"
+    assert geocoder.lookup(4.755, -74.085)["suburb"] == "Rincón"
+    assert geocoder.reverse_geocode(4.705, -74.065) == "Suba, Bogotá, Bogotá D.C., Colombia"
+
+
+def test_smallest_polygon_wins(bogota_features):
+    """Test that overlapping polygons of one component resolve to the smallest."""
+    bogota_features.append(feature("Sector Norte", square(-74.2, 4.6, -74.0, 4.8), admin_level="8"))
+    geocoder = OfflineGeocoder(bogota_features)
+    assert geocoder.lookup(4.695, -74.075)["district"] == "Suba"
+    assert geocoder.lookup(4.65, -74.1)["district"] == "Sector Norte"
+
+
+def test_point_outside_coverage(bogota_features):
+    """Test that uncovered points return None."""
+    geocoder = OfflineGeocoder(bogota_features)
+    assert geocoder.lookup(40.4, -3.7) == {}
+    assert geocoder.reverse_geocode(40.4, -3.7) is None
+
+
+def test_lookup_is_sub_millisecond():
+    """Test lookup speed against detailed boundaries."""
+    features = [feature("País", circle(-74.0, 4.5, 8.0, 20000), admin_level="2")]
+    for i in range(200):
+        lon = -74.5 + (i % 20) * 0.05
+        lat = 4.5 + (i // 20) * 0.05
+        features.append(feature(f"Barrio {i}", circle(lon + 0.025, lat + 0.025, 0.024, 500), place="neighbourhood"))
+    geocoder = OfflineGeocoder(features)
+
+    points = [(4.5 + 0.0037 * i % 0.5, -74.5 + 0.0071 * i % 1.0) for i in range(1000)]
+    start = time.perf_counter()
+    for lat, lon in points:
+        geocoder.lookup(lat, lon)
+    per_lookup = (time.perf_counter() - start) / len(points)
+
+    assert geocoder.lookup(4.525, -74.475) == {"country": "País", "neighbourhood": "Barrio 0"}
+    assert per_lookup < 0.001
+
+
+def test_from_file(tmp_path, bogota_features):
+    """Test loading a GeoJSON FeatureCollection."""
+    path = tmp_path / "boundaries.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": bogota_features}), encoding="utf-8")
+    assert OfflineGeocoder.from_file(path).reverse_geocode(4.695, -74.075).startswith("Prado Veraniego")
+
+    bad = tmp_path / "bad.geojson"
+    bad.write_text(json.dumps({"type": "Feature"}), encoding="utf-8")
+    with pytest.raises(ValueError):
+        OfflineGeocoder.from_file(bad)
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_service_uses_offline_first(mock_get, bogota_features):
+    """Test that covered points never reach Nominatim."""
+    service = GeocodingService(offline=OfflineGeocoder(bogota_features))
+    assert service.reverse_geocode(4.695, -74.075).startswith("Prado Veraniego")
+    mock_get.assert_not_called()
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_service_nominatim_fallback(mock_get, bogota_features):
+    """Test that uncovered points use Nominatim only when the fallback is on."""
+    response = Mock(status_code=200)
+    response.json.return_value = {"address": {"city": "Madrid", "country": "España"}}
+    mock_get.return_value = response
+    offline = OfflineGeocoder(bogota_features)
+
+    assert GeocodingService(offline=offline, nominatim_fallback=True).reverse_geocode(40.4, -3.7) == "Madrid, España"
+    assert GeocodingService(offline=offline, nominatim_fallback=False).reverse_geocode(40.4, -3.7) is None
+    assert mock_get.call_count == 1
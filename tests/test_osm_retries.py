@@ -13,7 +13,11 @@ except ImportError:
 
 from gateway.osm_worker import OSMWorker
 from gateway.database import Database
-from gateway.config import OSM_MAX_RETRIES, OSM_RETRY_DELAY_SECONDS
+from gateway.http_client import HttpClient
+from gateway.config import (
+    OSM_MAX_RETRIES, OSM_RETRY_DELAY_SECONDS,
+    OSM_RETRY_MAX_DELAY_SECONDS, OSM_RETRY_JITTER,
+)
 
 
 @pytest.fixture
@@ -25,8 +29,8 @@ def db(tmp_path):
 
 @pytest.fixture
 def worker(db):
-    """Create OSM worker."""
-    return OSMWorker(db)
+    """Create OSM worker (OSM host not rate limited, see test_rate_controller)."""
+    return OSMWorker(db, http=HttpClient())
 
 
 def test_parse_osm_error_400(worker):
@@ -65,18 +69,18 @@ def test_parse_osm_error_unknown(worker):
     assert "Unknown Error" in error_msg or "Error desconocido" in error_msg
 
 
-@patch('gateway.osm_worker.requests.post')
-def test_process_pending_retries_on_failure(mock_post, worker, db, monkeypatch):
-    """Test that process_pending retries failed notes."""
-    import time
-    
-    # Mock sleep to not actually wait
-    sleep_calls = []
-    original_sleep = time.sleep
-    def mock_sleep(seconds):
-        sleep_calls.append(seconds)
-    monkeypatch.setattr(time, "sleep", mock_sleep)
-    
+def _make_due(db, queue_id):
+    """Move a note's scheduled retry into the past."""
+    with db._get_connection() as conn:
+        conn.execute(
+            "UPDATE notes SET next_attempt_at = 0 WHERE local_queue_id = ?", (queue_id,)
+        )
+        conn.commit()
+
+
+@patch('gateway.http_client.requests.Session.request')
+def test_process_pending_retries_on_failure(mock_post, worker, db):
+    """Test that process_pending reschedules failed notes and retries them when due."""
     # Create a pending note
     queue_id = db.create_note(
         node_id="test_node",
@@ -85,37 +89,39 @@ def test_process_pending_retries_on_failure(mock_post, worker, db, monkeypatch):
         text_original="test",
         text_normalized="test"
     )
-    
+
     # Mock API to fail first time, succeed second time
     mock_response_fail = Mock()
     mock_response_fail.status_code = 500
     mock_response_fail.text = "Internal Server Error"
-    
+
     mock_response_success = Mock()
     mock_response_success.status_code = 200
     mock_response_success.json.return_value = {
         "properties": {"id": 12345}
     }
-    
-    # First call: fail
+
+    # First attempt - should fail and persist the retry schedule
     mock_post.return_value = mock_response_fail
-    
-    # First attempt - should fail and increment retry count
     sent_count = worker.process_pending(limit=10)
     assert sent_count == 0
-    assert queue_id in worker.retry_counts
-    assert worker.retry_counts[queue_id] == 1
-    
-    # Second call: succeed
+    note = db.get_note_by_queue_id(queue_id)
+    assert note["retry_count"] == 1
+    assert note["next_attempt_at"] > time.time()
+
+    # Not due yet - should not be attempted
     mock_post.return_value = mock_response_success
-    
-    # Second attempt - should succeed
+    assert worker.process_pending(limit=10) == 0
+    assert mock_post.call_count == 1
+
+    # Once due - should succeed
+    _make_due(db, queue_id)
     sent_count = worker.process_pending(limit=10)
     assert sent_count == 1
-    assert queue_id not in worker.retry_counts  # Should be removed after success
+    assert db.get_note_by_queue_id(queue_id)["status"] == "sent"
 
 
-@patch('gateway.osm_worker.requests.post')
+@patch('gateway.http_client.requests.Session.request')
 def test_process_pending_max_retries_exceeded(mock_post, worker, db):
     """Test that process_pending stops retrying after max retries."""
     # Create a pending note
@@ -126,62 +132,120 @@ def test_process_pending_max_retries_exceeded(mock_post, worker, db):
         text_original="test",
         text_normalized="test"
     )
-    
+
     # Mock API to always fail
     mock_response_fail = Mock()
     mock_response_fail.status_code = 500
     mock_response_fail.text = "Internal Server Error"
     mock_post.return_value = mock_response_fail
-    
+
     # Set retry count to max
-    worker.retry_counts[queue_id] = OSM_MAX_RETRIES
-    
+    db.update_note_error(queue_id, "Error del servidor OSM", retry_count=OSM_MAX_RETRIES)
+
     # Should not retry anymore (should skip and mark error)
     sent_count = worker.process_pending(limit=10)
     assert sent_count == 0
-    
-    # Retry count should be removed after max retries exceeded
-    assert queue_id not in worker.retry_counts
-    
-    # Note should have error message
+    mock_post.assert_not_called()
+
+    # Note should have error message and leave the pending queue
     note = db.get_note_by_queue_id(queue_id)
     assert note["last_error"] is not None
     assert str(OSM_MAX_RETRIES) in note["last_error"]
+    assert note["status"] == "failed"
+    assert db.get_pending_notes() == []
 
 
-@patch('gateway.osm_worker.requests.post')
-def test_process_pending_retry_delay(mock_post, worker, db, monkeypatch):
-    """Test that retries have delay between attempts."""
-    import time
-    
-    # Track sleep calls
-    sleep_calls = []
-    def mock_sleep(seconds):
-        sleep_calls.append(seconds)
-    
-    monkeypatch.setattr(time, "sleep", mock_sleep)
-    
-    # Create a pending note
-    queue_id = db.create_note(
-        node_id="test_node",
-        lat=4.6097,
-        lon=-74.0817,
-        text_original="test",
-        text_normalized="test"
-    )
-    
-    # Mock API to fail
+@patch('gateway.http_client.requests.Session.request')
+def test_process_pending_last_attempt_marks_failed(mock_post, worker, db):
+    """Test that the final failed attempt moves the note to 'failed' right away."""
+    queue_id = db.create_note("test_node", 4.6097, -74.0817, "test", "test")
+    db.update_note_error(queue_id, "Error del servidor OSM", retry_count=OSM_MAX_RETRIES - 1)
+
     mock_response_fail = Mock()
     mock_response_fail.status_code = 500
+    mock_response_fail.text = "Internal Server Error"
     mock_post.return_value = mock_response_fail
-    
-    # First attempt - should fail and increment retry count
+
     worker.process_pending(limit=10)
-    assert queue_id in worker.retry_counts
-    assert worker.retry_counts[queue_id] == 1
-    
-    # Second attempt - should have delay before retrying
+
+    note = db.get_note_by_queue_id(queue_id)
+    assert note["status"] == "failed"
+    assert "Error del servidor OSM" in note["last_error"]
+
+
+@patch('gateway.http_client.requests.Session.request')
+def test_process_pending_does_not_sleep_for_retry(mock_post, worker, db, monkeypatch):
+    """Test that a failed attempt is scheduled instead of blocking the worker."""
+    sleep_calls = []
+    monkeypatch.setattr(time, "sleep", lambda seconds: sleep_calls.append(seconds))
+
+    first = db.create_note("node_a", 4.6097, -74.0817, "first", "first")
+    second = db.create_note("node_b", 4.6098, -74.0818, "second", "second")
+
+    mock_response_fail = Mock()
+    mock_response_fail.status_code = 500
+    mock_response_fail.text = "Internal Server Error"
+    mock_post.return_value = mock_response_fail
+
+    before = time.time()
     worker.process_pending(limit=10)
-    
-    # Should have called sleep with retry delay (after first failure)
-    assert OSM_RETRY_DELAY_SECONDS in sleep_calls
+
+    # The failed note is scheduled; the 500 leaves the rest of the batch for later
+    assert sleep_calls == []
+    assert mock_post.call_count == 1
+    note = db.get_note_by_queue_id(first)
+    assert note["retry_count"] == 1
+    assert note["next_attempt_at"] >= before + OSM_RETRY_DELAY_SECONDS * (1 - OSM_RETRY_JITTER)
+    assert (db.get_note_by_queue_id(second)["retry_count"] or 0) == 0
+
+
+def test_retry_delay_backoff_is_exponential_and_capped(monkeypatch):
+    """Test the backoff schedule without jitter."""
+    monkeypatch.setattr("gateway.osm_worker.random.uniform", lambda a, b: 1.0)
+    assert OSMWorker.retry_delay(1) == OSM_RETRY_DELAY_SECONDS
+    assert OSMWorker.retry_delay(2) == OSM_RETRY_DELAY_SECONDS * 2
+    assert OSMWorker.retry_delay(3) == OSM_RETRY_DELAY_SECONDS * 4
+    assert OSMWorker.retry_delay(30) == OSM_RETRY_MAX_DELAY_SECONDS
+
+
+def test_retry_delay_jitter_bounds():
+    """Test that jitter stays within the configured fraction."""
+    for _ in range(100):
+        delay = OSMWorker.retry_delay(1)
+        assert OSM_RETRY_DELAY_SECONDS * (1 - OSM_RETRY_JITTER) <= delay
+        assert delay <= OSM_RETRY_DELAY_SECONDS * (1 + OSM_RETRY_JITTER)
+
+
+@patch('gateway.http_client.requests.Session.request')
+def test_retry_schedule_survives_restart(mock_post, db):
+    """Test that a new worker instance honours the persisted schedule."""
+    queue_id = db.create_note("test_node", 4.6097, -74.0817, "test", "test")
+    mock_response_fail = Mock()
+    mock_response_fail.status_code = 500
+    mock_response_fail.text = "Internal Server Error"
+    mock_post.return_value = mock_response_fail
+
+    OSMWorker(db).process_pending(limit=10)
+
+    restarted = OSMWorker(db)
+    assert restarted.process_pending(limit=10) == 0
+    assert mock_post.call_count == 1
+    assert db.get_note_by_queue_id(queue_id)["retry_count"] == 1
+
+
+@patch('gateway.http_client.requests.Session.request')
+def test_connection_error_does_not_consume_retry(mock_post, worker, db):
+    """Test that being offline keeps notes due and stops the batch."""
+    first = db.create_note("node_a", 4.6097, -74.0817, "first", "first")
+    second = db.create_note("node_b", 4.6098, -74.0818, "second", "second")
+    mock_post.side_effect = requests.exceptions.ConnectionError()
+
+    assert worker.process_pending(limit=10) == 0
+
+    # Only the first note was tried; nothing was counted against the retry budget
+    assert mock_post.call_count == 1
+    note = db.get_note_by_queue_id(first)
+    assert note["retry_count"] == 0
+    assert note["next_attempt_at"] is None
+    assert "conexión" in note["last_error"]
+    assert {n["local_queue_id"] for n in db.get_pending_notes()} == {first, second}
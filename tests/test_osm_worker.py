@@ -46,7 +46,7 @@ def test_send_note_dry_run(worker, monkeypatch):
     assert "openstreetmap.org" in result["url"]
 
 
-@patch('gateway.osm_worker.requests.post')
+@patch('gateway.http_client.requests.Session.request')
 def test_send_note_success(mock_post, worker, monkeypatch):
     """Test successful note sending."""
     monkeypatch.setenv("DRY_RUN", "false")
@@ -70,7 +70,7 @@ def test_send_note_success(mock_post, worker, monkeypatch):
     mock_post.assert_called_once()
 
 
-@patch('gateway.osm_worker.requests.post')
+@patch('gateway.http_client.requests.Session.request')
 def test_send_note_api_error(mock_post, worker, monkeypatch):
     """Test API error handling."""
     monkeypatch.setenv("DRY_RUN", "false")
@@ -89,7 +89,7 @@ def test_send_note_api_error(mock_post, worker, monkeypatch):
     assert result is None
 
 
-@patch('gateway.osm_worker.requests.post')
+@patch('gateway.http_client.requests.Session.request')
 def test_send_note_timeout(mock_post, worker, monkeypatch):
     """Test timeout handling."""
     monkeypatch.setenv("DRY_RUN", "false")
@@ -105,7 +105,7 @@ def test_send_note_timeout(mock_post, worker, monkeypatch):
     assert result is None
 
 
-@patch('gateway.osm_worker.requests.post')
+@patch('gateway.http_client.requests.Session.request')
 def test_send_note_connection_error(mock_post, worker, monkeypatch):
     """Test connection error handling."""
     monkeypatch.setenv("DRY_RUN", "false")
@@ -139,7 +139,7 @@ def test_process_pending_success(mock_send, worker, db):
     assert note["osm_note_id"] == 12345
 
 
-@patch('gateway.osm_worker.requests.post')
+@patch('gateway.http_client.requests.Session.request')
 def test_process_pending_failure(mock_post, worker, db):
     """Test processing pending notes with failure."""
     # Create pending note
@@ -158,11 +158,12 @@ def test_process_pending_failure(mock_post, worker, db):
     note = db.get_note_by_queue_id(queue_id)
     assert note["status"] == "pending"
     assert note["last_error"] is not None
-    # Should have retry count
-    assert queue_id in worker.retry_counts
+    # Should have a persisted retry schedule
+    assert note["retry_count"] == 1
+    assert note["next_attempt_at"] is not None
 
 
-@patch('gateway.osm_worker.requests.post')
+@patch('gateway.http_client.requests.Session.request')
 def test_rate_limiting(mock_post, worker, monkeypatch):
     """Test rate limiting."""
     monkeypatch.setenv("DRY_RUN", "false")
@@ -184,7 +185,10 @@ def test_rate_limiting(mock_post, worker, monkeypatch):
     result2 = worker.send_note(1.0, 2.0, "test2")
     elapsed = time.time() - start_time
     
-    # Should have at least 3 seconds between sends (OSM_RATE_LIMIT_SECONDS)
-    assert elapsed >= 2.5, f"Rate limiting not working: elapsed={elapsed}"  # Allow some margin
+    # The second send inside OSM_RATE_LIMIT_SECONDS is skipped (left queued)
+    # instead of sleeping for the next token
+    assert elapsed < 1.0, f"Send waited for the rate limit: elapsed={elapsed}"
     assert result1 is not None
-    assert result2 is not None
+    assert result2 is None
+    assert mock_post.call_count == 1
+    assert 2.5 <= worker._last_throttle_wait <= 3.0
@@ -98,3 +98,63 @@ def test_load_from_database(db):
     assert pos.lat == 1.0
     assert pos.lon == 2.0
     assert pos.seen_count == 5
+
+
+def test_write_behind_defers_database_writes(db):
+    """Test that write-behind keeps updates in memory until flushed."""
+    cache = PositionCache(db=db, write_behind=True, flush_interval=3600)
+    try:
+        cache.update("node1", 1.0, 2.0)
+        cache.update("node1", 1.5, 2.5)
+
+        # Memory is authoritative immediately
+        assert cache.get("node1").lat == 1.5
+        assert cache.get("node1").seen_count == 2
+        # Database not written yet
+        assert db.get_position("node1") is None
+
+        assert cache.flush() == 1
+        saved = db.get_position("node1")
+        assert saved["lat"] == 1.5
+        assert saved["seen_count"] == 2
+    finally:
+        cache.close()
+
+
+def test_write_behind_flushes_when_max_pending_reached(db):
+    """Test that reaching flush_max_pending dirty nodes triggers a flush."""
+    cache = PositionCache(db=db, write_behind=True, flush_interval=3600, flush_max_pending=3)
+    try:
+        for i in range(3):
+            cache.update(f"node{i}", 1.0 + i, 2.0)
+
+        deadline = time.time() + 2.0
+        while time.time() < deadline and len(db.load_all_positions()) < 3:
+            time.sleep(0.01)
+        assert len(db.load_all_positions()) == 3
+    finally:
+        cache.close()
+
+
+def test_write_behind_flushes_on_close(tmp_path):
+    """Test that close() persists dirty positions (e.g. on Gateway.stop())."""
+    db_path = tmp_path / "test.db"
+    cache = PositionCache(db=Database(db_path=db_path), write_behind=True, flush_interval=3600)
+    cache.update("node1", 1.0, 2.0)
+    cache.close()
+
+    cache2 = PositionCache(db=Database(db_path=db_path))
+    pos = cache2.get("node1")
+    assert pos is not None
+    assert pos.lat == 1.0
+
+
+def test_cleanup_old_positions_counts_only_its_deletes(db):
+    """Test that the cleanup reports the rows it removed, not the connection's total changes."""
+    now = time.time()
+    db.save_position("old", 1.0, 2.0, now - 90000)
+    db.save_position("new", 3.0, 4.0, now)
+    assert db.cleanup_old_positions(max_age_seconds=86400) == 1
+    assert db.cleanup_old_positions(max_age_seconds=86400) == 0
+    assert db.get_position("old") is None
+    assert db.get_position("new") is not None
@@ -0,0 +1,198 @@
+"""Tests for adaptive OSM submission rate control."""
+
+import time
+import pytest
+from email.utils import formatdate
+from unittest.mock import Mock, patch
+from requests.structures import CaseInsensitiveDict
+
+from gateway.database import Database
+from gateway.http_client import HttpClient
+from gateway.osm_worker import OSMWorker
+from gateway.rate_controller import AdaptiveRateController, parse_retry_after
+
+
+HOST = "api.openstreetmap.org"
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Create temporary database."""
+    return Database(db_path=tmp_path / "test.db")
+
+
+@pytest.fixture
+def http():
+    """Client with the OSM host limited to one request every 3 s."""
+    client = HttpClient()
+    client.set_limit(HOST, 1 / 3)
+    return client
+
+
+def osm_response(status_code, retry_after=None):
+    response = Mock(status_code=status_code, text="")
+    response.headers = CaseInsensitiveDict({"Retry-After": retry_after} if retry_after else {})
+    response.json.return_value = {"properties": {"id": 42}}
+    return response
+
+
+def test_parse_retry_after():
+    """Test delay-seconds and HTTP-date forms."""
+    now = time.time()
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(formatdate(now + 30, usegmt=True), now=now) == pytest.approx(30, abs=1)
+    assert parse_retry_after(formatdate(now - 30, usegmt=True), now=now) == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_additive_increase_multiplicative_decrease(http):
+    """Test that successes add to the rate and throttling halves it, within bounds."""
+    controller = AdaptiveRateController(http, HOST, min_interval=1.0, max_interval=60.0,
+                                        increase=0.1, decrease_factor=0.5)
+    assert controller.rate == pytest.approx(1 / 3)
+
+    controller.record_success()
+    assert controller.rate == pytest.approx(1 / 3 + 0.1)
+    assert http.get_limit(HOST).rate == controller.rate
+
+    for _ in range(20):
+        controller.record_success()
+    assert controller.rate == 1.0
+
+    controller.record_throttle(429)
+    assert controller.rate == 0.5
+    for _ in range(20):
+        controller.record_throttle(503)
+    assert controller.rate == pytest.approx(1 / 60)
+
+    metrics = controller.get_metrics()
+    assert metrics["successes"] == 21
+    assert metrics["throttled"] == 21
+    assert metrics["interval"] == pytest.approx(60)
+
+
+def test_retry_after_pauses(http):
+    """Test that Retry-After pauses submissions, capped at max_pause."""
+    controller = AdaptiveRateController(http, HOST, max_pause=100)
+    assert controller.record_throttle(429, "30") == 30.0
+    assert 29 < controller.paused_for() <= 30
+    assert controller.record_throttle(429, "3600") == 100.0
+    assert controller.get_metrics()["retry_after_pauses"] == 2
+
+
+def test_unlimited_host_stays_unlimited():
+    """Test that a host without a limit is not given one."""
+    http = HttpClient()
+    controller = AdaptiveRateController(http, HOST)
+    controller.record_success()
+    controller.record_throttle(429)
+    assert controller.rate is None
+    assert http.get_limit(HOST) is None
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_worker_honours_retry_after(mock_post, db, http):
+    """Test that a 429 keeps the note pending without spending an attempt."""
+    worker = OSMWorker(db, http=http)
+    first = db.create_note("node_a", 4.6097, -74.0817, "uno", "uno")
+    db.create_note("node_b", 4.6098, -74.0818, "dos", "dos")
+    mock_post.return_value = osm_response(429, "120")
+
+    before = time.time()
+    assert worker.process_pending(limit=10) == 0
+
+    # The batch stops at the first throttled note
+    assert mock_post.call_count == 1
+    note = db.get_note_by_queue_id(first)
+    assert note["status"] == "pending"
+    assert (note["retry_count"] or 0) == 0
+    assert before + 119 <= note["next_attempt_at"] <= time.time() + 120
+    assert worker.rate.rate == pytest.approx(1 / 6)
+
+    # Immediate sends during the pause do not reach OSM
+    assert worker.send_note(4.6, -74.0, "tres") is None
+    assert mock_post.call_count == 1
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_worker_throttle_without_retry_after(mock_post, db, http):
+    """Test that a bare 503 waits one interval at the reduced rate, without an attempt."""
+    worker = OSMWorker(db, http=http)
+    queue_id = db.create_note("node_a", 4.6097, -74.0817, "uno", "uno")
+    mock_post.return_value = osm_response(503)
+
+    before = time.time()
+    worker.process_pending(limit=10)
+
+    note = db.get_note_by_queue_id(queue_id)
+    assert (note["retry_count"] or 0) == 0
+    assert note["next_attempt_at"] == pytest.approx(before + 6, abs=1)
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_worker_success_speeds_up(mock_post, db, http):
+    """Test that accepted notes raise the OSM host's rate."""
+    worker = OSMWorker(db, http=http)
+    worker.rate.increase = 10.0  # reach the ceiling at once so the test does not wait
+    mock_post.return_value = osm_response(200)
+
+    assert worker.send_note(4.6, -74.0, "uno") == {"id": 42, "url": "https://www.openstreetmap.org/note/42"}
+    assert worker.rate.rate == worker.rate.max_rate
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_forbidden_is_not_a_throttle(mock_post, db, http):
+    """Test that a 403 (blocked account, forbidden action) spends an attempt and keeps the rate."""
+    assert not AdaptiveRateController.is_throttle(403)
+    worker = OSMWorker(db, http=http)
+    queue_id = db.create_note("node_a", 4.6097, -74.0817, "uno", "uno")
+    mock_post.return_value = osm_response(403)
+
+    worker.process_pending(limit=10)
+
+    assert db.get_note_by_queue_id(queue_id)["retry_count"] == 1
+    assert worker.rate.rate == pytest.approx(1 / 3)
+    assert worker.rate.get_metrics()["throttled"] == 0
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_server_error_spends_attempt_and_stops_batch(mock_post, db, http):
+    """Test that a 502 counts against the note but leaves the rest of the batch for later."""
+    worker = OSMWorker(db, http=http)
+    first = db.create_note("node_a", 4.6097, -74.0817, "uno", "uno")
+    second = db.create_note("node_b", 4.6098, -74.0818, "dos", "dos")
+    mock_post.return_value = osm_response(502)
+
+    worker.process_pending(limit=10)
+
+    assert mock_post.call_count == 1
+    assert db.get_note_by_queue_id(first)["retry_count"] == 1
+    assert (db.get_note_by_queue_id(second)["retry_count"] or 0) == 0
+    assert worker.rate.rate == pytest.approx(1 / 6)
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_worker_does_not_wait_for_tokens(mock_post, db, http, monkeypatch):
+    """Test that an exhausted rate limit ends the batch instead of sleeping for a token."""
+    sleep_calls = []
+    monkeypatch.setattr(time, "sleep", lambda seconds: sleep_calls.append(seconds))
+    worker = OSMWorker(db, http=http)
+    first = db.create_note("node_a", 4.6097, -74.0817, "uno", "uno")
+    second = db.create_note("node_b", 4.6098, -74.0818, "dos", "dos")
+    mock_post.return_value = osm_response(200)
+
+    before = time.time()
+    assert worker.process_pending(limit=10) == 1
+
+    assert sleep_calls == []
+    assert mock_post.call_count == 1
+    sent, queued = db.get_note_by_queue_id(first), db.get_note_by_queue_id(second)
+    assert sent["status"] == "sent"
+    assert queued["status"] == "pending"
+    assert (queued["retry_count"] or 0) == 0
+    assert queued["next_attempt_at"] <= before + 1 / worker.rate.rate + 1
+
+    # Immediate sends are not held up either: the note stays queued
+    assert worker.send_note(4.6, -74.0, "tres") is None
+    assert mock_post.call_count == 1
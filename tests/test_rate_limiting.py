@@ -101,3 +101,24 @@ def test_rate_limit_cleanup(rate_limiter):
         # After check_rate_limit, old entries are filtered out
         # So the list should only contain new entries (the one we just added)
         assert len(rate_limiter.user_messages[node_id]) <= 1
+
+
+def test_rate_limit_concurrent_checks(rate_limiter):
+    """Test that concurrent checks from several handler threads never exceed the limit."""
+    import threading
+
+    results = []
+    barrier = threading.Barrier(8)
+
+    def check():
+        barrier.wait()
+        for _ in range(USER_RATE_LIMIT_MAX_MESSAGES):
+            results.append(rate_limiter.check_rate_limit("busy_node")[0])
+
+    threads = [threading.Thread(target=check) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == USER_RATE_LIMIT_MAX_MESSAGES
@@ -0,0 +1,155 @@
+"""Tests for the Meshtastic serial link supervisor."""
+
+import time
+import threading
+import pytest
+from unittest.mock import Mock, patch
+
+from pubsub import pub
+
+from gateway.meshtastic_serial import MeshtasticSerial
+
+
+class FakeSerialInterface:
+    """Stand-in for meshtastic SerialInterface whose port can be unplugged."""
+
+    instances = []
+    # Connection attempts that fail before the port comes back
+    failures_left = 0
+
+    def __init__(self, devPath=None, noProto=False, connectNow=True):
+        if FakeSerialInterface.failures_left > 0:
+            FakeSerialInterface.failures_left -= 1
+            raise OSError(f"could not open port {devPath}")
+        self.devPath = devPath
+        self.isConnected = threading.Event()
+        self.isConnected.set()
+        self.nodes = {}
+        self.closed = False
+        self.heartbeats = 0
+        self.dead = False
+        FakeSerialInterface.instances.append(self)
+
+    def unplug(self):
+        self.dead = True
+
+    def getMyNodeInfo(self):
+        return {}
+
+    def getNode(self, node_id):
+        return Mock()
+
+    def sendHeartbeat(self):
+        if self.dead:
+            raise OSError("write failed: device disconnected")
+        self.heartbeats += 1
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_interface():
+    FakeSerialInterface.instances = []
+    FakeSerialInterface.failures_left = 0
+    with patch("gateway.meshtastic_serial.meshtastic.serial_interface.SerialInterface", FakeSerialInterface):
+        yield FakeSerialInterface
+
+
+@pytest.fixture
+def serial(fake_interface):
+    """Serial link with a fast supervisor."""
+    link = MeshtasticSerial(port="/dev/fake")
+    link.probe_interval = 0.05
+    link.reconnect_min_delay = 0.02
+    link.reconnect_max_delay = 0.1
+    yield link
+    link.stop()
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_backoff_is_exponential_and_capped():
+    """Test the delay after each failed reconnect attempt."""
+    with patch("gateway.meshtastic_serial.meshtastic.serial_interface.SerialInterface", FakeSerialInterface):
+        link = MeshtasticSerial(port="/dev/fake")
+    link.reconnect_min_delay = 5.0
+    link.reconnect_max_delay = 60.0
+    assert [link._backoff(attempt) for attempt in range(1, 7)] == [5.0, 10.0, 20.0, 40.0, 60.0, 60.0]
+
+
+def test_dead_link_is_reconnected_with_state_kept(serial, fake_interface):
+    """Test that an unplugged port is replaced and messages keep flowing to the same callback."""
+    callback = Mock()
+    serial.set_message_callback(callback)
+    dedup = serial.packet_dedup
+    serial.start()
+    first = serial.interface
+    assert wait_for(lambda: first.heartbeats > 0)
+
+    fake_interface.failures_left = 2  # the port takes a moment to come back
+    first.unplug()
+    assert wait_for(lambda: serial.get_metrics()["reconnects"] == 1)
+
+    assert first.closed
+    assert serial.interface is fake_interface.instances[-1] and serial.interface is not first
+    metrics = serial.get_metrics()
+    assert metrics["connected"] is True
+    assert metrics["down_for"] is None
+    assert metrics["outages"] == 1
+    assert metrics["reconnect_attempts"] == 3
+    assert metrics["last_recovery"] > 0
+    assert metrics["max_recovery"] == metrics["last_recovery"]
+
+    # Subscriptions and in-memory state carry over to the new interface
+    assert serial.packet_dedup is dedup
+    packet = {"from": 0x1234abcd, "id": 1, "decoded": {"portnum": "TEXT_MESSAGE_APP", "text": "#osmnote bache"}}
+    pub.sendMessage("meshtastic.receive.text", packet=packet, interface=serial.interface)
+    callback.assert_called_once()
+    assert callback.call_args[0][0]["node_id"] == "!1234abcd"
+
+
+def test_connection_lost_event_wakes_supervisor(serial, fake_interface):
+    """Test that meshtastic.connection.lost triggers a reconnect before the next probe."""
+    serial.probe_interval = 60
+    serial.start()
+    first = serial.interface
+    assert wait_for(lambda: first.heartbeats > 0)
+
+    first.isConnected.clear()
+    pub.sendMessage("meshtastic.connection.lost", interface=first)
+    assert wait_for(lambda: serial.get_metrics()["reconnects"] == 1, timeout=1.0)
+    assert serial.interface is not first
+
+
+def test_start_without_device_keeps_retrying(serial, fake_interface):
+    """Test that a missing device at startup is picked up once it appears."""
+    fake_interface.failures_left = 3
+    serial.start()
+    assert serial.running
+    assert serial.interface is None
+
+    assert wait_for(lambda: serial.get_metrics()["connected"])
+    metrics = serial.get_metrics()
+    assert metrics["outages"] == 1
+    assert metrics["reconnects"] == 1
+    assert len(fake_interface.instances) == 1
+
+
+def test_stop_ends_supervisor(serial, fake_interface):
+    """Test that stop() joins the supervisor even while it is backing off."""
+    serial.reconnect_min_delay = serial.reconnect_max_delay = 30
+    fake_interface.failures_left = 100
+    serial.start()
+    assert wait_for(lambda: serial.get_metrics()["reconnect_attempts"] >= 1)
+
+    started = time.time()
+    serial.stop()
+    assert time.time() - started < 1.0
+    assert serial._supervisor is None
+    assert serial.get_metrics()["down_for"] > 0
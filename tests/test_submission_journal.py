@@ -0,0 +1,194 @@
+"""Tests for the crash-safe OSM submission journal."""
+
+import time
+import pytest
+import requests
+from unittest.mock import Mock, patch
+
+from gateway.database import Database
+from gateway.http_client import HttpClient
+from gateway.osm_worker import OSMWorker
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Create temporary database."""
+    return Database(db_path=tmp_path / "test.db")
+
+
+@pytest.fixture
+def lookup():
+    """Stand-in for the OSM notes query: OSM has nothing."""
+    return Mock(return_value=None)
+
+
+@pytest.fixture
+def worker(db, lookup):
+    """Worker with an unlimited HTTP client and the stand-in lookup."""
+    return OSMWorker(db, http=HttpClient(), note_lookup=lookup)
+
+
+def created(note_id=42):
+    response = Mock(status_code=200)
+    response.json.return_value = {"properties": {"id": note_id}}
+    return response
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_journal_written_before_post_and_cleared_on_success(mock_post, worker, db, lookup):
+    """Test that the attempt is on disk while the POST is in flight."""
+    queue_id = db.create_note("node1", 4.6097, -74.0817, "bache", "bache")
+    journaled = []
+
+    def post(*args, **kwargs):
+        journaled.append(db.get_note_by_queue_id(queue_id)["submit_started_at"])
+        return created()
+
+    mock_post.side_effect = post
+    assert worker.process_pending() == 1
+
+    assert journaled[0] is not None
+    note = db.get_note_by_queue_id(queue_id)
+    assert note["status"] == "sent"
+    assert note["submit_started_at"] is None
+    lookup.assert_not_called()
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_crash_after_post_is_reconciled(mock_post, db, lookup):
+    """Test that a note created on OSM before a crash is not submitted again."""
+    queue_id = db.create_note("node1", 4.6097, -74.0817, "bache", "bache")
+    # Power loss between the 200 and update_note_sent
+    mock_post.return_value = created(42)
+    with patch.object(db, "update_note_sent", side_effect=SystemExit):
+        with pytest.raises(SystemExit):
+            OSMWorker(db, http=HttpClient(), note_lookup=lookup).process_pending()
+    assert db.get_note_by_queue_id(queue_id)["status"] == "pending"
+
+    # Restart: OSM has the note
+    lookup.return_value = {"id": 42, "url": "https://www.openstreetmap.org/note/42"}
+    assert db.count_unconfirmed_submissions() == 1
+    restarted = OSMWorker(db, http=HttpClient(), note_lookup=lookup)
+    assert restarted.process_pending() == 1
+
+    assert mock_post.call_count == 1
+    note = db.get_note_by_queue_id(queue_id)
+    assert note["status"] == "sent"
+    assert note["osm_note_id"] == 42
+    assert db.count_unconfirmed_submissions() == 0
+    lat, lon, text, since = lookup.call_args[0]
+    assert (lat, lon, text) == (4.6097, -74.0817, "bache")
+    assert since <= time.time()
+    metrics = restarted.get_metrics()
+    assert (metrics["reconciled"], metrics["resubmitted"]) == (1, 0)
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_unknown_outcome_not_on_osm_is_resubmitted(mock_post, worker, db, lookup):
+    """Test that a timed-out POST is checked, then sent again."""
+    queue_id = db.create_note("node1", 4.6097, -74.0817, "bache", "bache")
+    mock_post.side_effect = requests.exceptions.Timeout()
+    worker.process_pending()
+    assert db.get_note_by_queue_id(queue_id)["submit_started_at"] is not None
+
+    mock_post.side_effect = None
+    mock_post.return_value = created(43)
+    assert worker.process_pending() == 1
+
+    lookup.assert_called_once()
+    assert db.get_note_by_queue_id(queue_id)["osm_note_id"] == 43
+    metrics = worker.get_metrics()
+    assert (metrics["reconciled"], metrics["resubmitted"]) == (0, 1)
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_error_response_clears_journal(mock_post, worker, db, lookup):
+    """Test that a definite rejection needs no reconciliation."""
+    queue_id = db.create_note("node1", 4.6097, -74.0817, "bache", "bache")
+    mock_post.return_value = Mock(status_code=400, text="Bad Request")
+    worker.process_pending()
+
+    note = db.get_note_by_queue_id(queue_id)
+    assert note["submit_started_at"] is None
+    assert note["retry_count"] == 1
+    lookup.assert_not_called()
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_server_error_keeps_journal(mock_post, worker, db, lookup):
+    """Test that a 5xx is an unknown outcome, reconciled before the next attempt."""
+    queue_id = db.create_note("node1", 4.6097, -74.0817, "bache", "bache")
+    mock_post.return_value = Mock(status_code=502, text="Bad Gateway")
+    worker.process_pending()
+    note = db.get_note_by_queue_id(queue_id)
+    assert note["submit_started_at"] is not None
+    assert note["retry_count"] == 1
+
+    db.update_note_error(queue_id, note["last_error"], retry_count=1, next_attempt_at=0)
+    mock_post.return_value = created(44)
+    assert worker.process_pending() == 1
+    lookup.assert_called_once()
+    assert db.get_note_by_queue_id(queue_id)["submit_started_at"] is None
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_lookup_failure_keeps_note_queued(mock_post, worker, db, lookup):
+    """Test that an unknown outcome is never resubmitted blindly."""
+    queue_id = db.create_note("node1", 4.6097, -74.0817, "bache", "bache")
+    db.journal_submission(queue_id, time.time())
+    lookup.side_effect = requests.exceptions.ConnectionError()
+
+    assert worker.process_pending() == 0
+    mock_post.assert_not_called()
+    note = db.get_note_by_queue_id(queue_id)
+    assert note["status"] == "pending"
+    assert (note["retry_count"] or 0) == 0
+    assert note["submit_started_at"] is not None
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_find_submitted_note_matches_osm_notes(mock_get, db):
+    """Test the default lookup against an OSM notes GeoJSON response."""
+    now = time.time()
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime(now))
+    old = time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime(now - 86400))
+
+    def note(note_id, lon, lat, text, date):
+        return {
+            "geometry": {"coordinates": [lon, lat]},
+            "properties": {"id": note_id, "date_created": date, "comments": [{"text": text}]},
+        }
+
+    response = Mock(status_code=200)
+    response.json.return_value = {"features": [
+        note(1, -74.0817, 4.6097, "otra cosa", stamp),
+        note(2, -74.0818, 4.6097, "bache\n\n---\nCreado mediante ...", stamp),
+        note(3, -74.0817, 4.6097, "bache\n\n---\nCreado mediante ...", old),
+        note(4, -74.0817, 4.6097, "bache\n\n---\nCreado mediante ...", stamp),
+    ]}
+    mock_get.return_value = response
+    worker = OSMWorker(db, http=HttpClient())
+
+    assert worker.find_submitted_note(4.6097, -74.0817, "bache", now - 5) == {
+        "id": 4, "url": "https://www.openstreetmap.org/note/4",
+    }
+    params = mock_get.call_args[1]["params"]
+    assert params["closed"] == -1
+    assert len(params["bbox"].split(",")) == 4
+
+    mock_get.return_value = Mock(status_code=503)
+    with pytest.raises(requests.exceptions.HTTPError):
+        worker.find_submitted_note(4.6097, -74.0817, "bache", now)
+
+
+@patch("gateway.http_client.requests.Session.request")
+def test_find_submitted_note_does_not_spend_osm_rate_limit(mock_get, db):
+    """Test that the reconciliation query leaves the submission token alone."""
+    mock_get.return_value = Mock(status_code=200)
+    mock_get.return_value.json.return_value = {"features": []}
+    http = HttpClient()
+    worker = OSMWorker(db, http=http)
+    http.set_limit(worker.rate.host, 1 / 3)
+
+    assert worker.find_submitted_note(4.6097, -74.0817, "bache", time.time()) is None
+    assert worker.rate.try_acquire() == 0.0
@@ -0,0 +1,252 @@
+"""Tests for the outbound TX scheduler."""
+
+import threading
+import time
+import pytest
+from unittest.mock import Mock
+
+from gateway.database import Database
+from gateway.notifications import NotificationManager
+from gateway.tx_scheduler import (
+    TxScheduler,
+    PRIORITY_ACK,
+    PRIORITY_RESPONSE,
+    PRIORITY_BULK,
+    estimate_airtime,
+)
+
+
+class RecordingSerial:
+    """Serial stand-in that records (time, destination, text)."""
+
+    def __init__(self, fail_on=None):
+        self.sent = []
+        self.fail_on = fail_on
+        self.lock = threading.Lock()
+
+    def send_dm(self, node_id, message):
+        with self.lock:
+            self.sent.append((time.monotonic(), node_id, message))
+        return message != self.fail_on
+
+    def send_broadcast(self, message):
+        with self.lock:
+            self.sent.append((time.monotonic(), "broadcast", message))
+        return True
+
+
+def make_scheduler(serial, **kwargs):
+    options = {"duty_cycle": 1.0, "duty_cycle_window": 60.0, "destination_gap": 0.0,
+               "airtime_fn": lambda message: 0.0}
+    options.update(kwargs)
+    return TxScheduler(serial, **options)
+
+
+def wait_until(predicate, timeout=3.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.005)
+    return predicate()
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Create temporary database."""
+    return Database(db_path=tmp_path / "test.db")
+
+
+def test_estimate_airtime_grows_with_length():
+    """Test the airtime estimate is positive and monotonic in size."""
+    short = estimate_airtime("ok")
+    long = estimate_airtime("x" * 200)
+    assert 0 < short < long < 3.0
+
+
+def test_send_dm_returns_immediately():
+    """Test that callers never wait for the radio."""
+    serial = RecordingSerial()
+    scheduler = make_scheduler(serial, destination_gap=10.0)
+    scheduler.start()
+    try:
+        start = time.perf_counter()
+        scheduler.send_dm("!a", ["part 1", "part 2", "part 3"])
+        assert time.perf_counter() - start < 0.05
+        assert wait_until(lambda: len(serial.sent) == 1)
+        assert scheduler.pending() == 1
+    finally:
+        scheduler.stop()
+
+
+def test_parts_in_order_and_paced_per_destination():
+    """Test that parts to one node keep order and spacing, others interleave."""
+    serial = RecordingSerial()
+    scheduler = make_scheduler(serial, destination_gap=0.2)
+    scheduler.send_dm("!a", ["a1", "a2"])
+    scheduler.send_dm("!b", ["b1"])
+    scheduler.start()
+    try:
+        assert wait_until(lambda: len(serial.sent) == 3)
+    finally:
+        scheduler.stop()
+
+    texts = [text for _, _, text in serial.sent]
+    assert texts == ["a1", "b1", "a2"]
+    a_times = [t for t, dest, _ in serial.sent if dest == "!a"]
+    assert a_times[1] - a_times[0] >= 0.19
+
+
+def test_ack_sent_before_bulk():
+    """Test that ACKs jump ahead of queued bulk notifications."""
+    serial = RecordingSerial()
+    scheduler = make_scheduler(serial)
+    for i in range(3):
+        scheduler.send_dm(f"!bulk{i}", [f"bulk {i}"], priority=PRIORITY_BULK)
+    scheduler.send_dm("!r", ["response"], priority=PRIORITY_RESPONSE)
+    scheduler.send_dm("!a", ["ack"], priority=PRIORITY_ACK)
+    scheduler.start()
+    try:
+        assert wait_until(lambda: len(serial.sent) == 5)
+    finally:
+        scheduler.stop()
+
+    assert [text for _, _, text in serial.sent] == ["ack", "response", "bulk 0", "bulk 1", "bulk 2"]
+
+
+def test_duty_cycle_budget_delays_transmissions():
+    """Test that the airtime budget holds packets until old ones leave the window."""
+    serial = RecordingSerial()
+    # 0.1 s per packet, budget 0.2 s per 1 s window: two packets, then wait
+    scheduler = make_scheduler(serial, duty_cycle=0.2, duty_cycle_window=1.0,
+                               airtime_fn=lambda message: 0.1)
+    for i in range(3):
+        scheduler.send_dm(f"!n{i}", [f"m{i}"], priority=PRIORITY_ACK)
+    scheduler.start()
+    try:
+        assert wait_until(lambda: len(serial.sent) == 2)
+        time.sleep(0.3)
+        assert len(serial.sent) == 2
+        assert wait_until(lambda: len(serial.sent) == 3)
+    finally:
+        scheduler.stop()
+
+    times = [t for t, _, _ in serial.sent]
+    assert times[1] - times[0] >= 0.09  # radio busy for the first packet's airtime
+    assert times[2] - times[0] >= 0.95
+    assert scheduler.get_metrics()["airtime_budget"] == pytest.approx(0.2)
+
+
+def test_bulk_cannot_use_reserved_budget():
+    """Test that bulk stops at bulk_budget_fraction while ACKs may continue."""
+    serial = RecordingSerial()
+    scheduler = make_scheduler(serial, duty_cycle=0.4, duty_cycle_window=10.0,
+                               bulk_budget_fraction=0.5, airtime_fn=lambda message: 1.0)
+    # Budget 4 s of airtime; bulk may use 2 s
+    for i in range(3):
+        scheduler.send_dm(f"!bulk{i}", [f"bulk {i}"], priority=PRIORITY_BULK)
+    scheduler.start()
+    try:
+        assert wait_until(lambda: len(serial.sent) == 2)
+        time.sleep(0.1)
+        assert len(serial.sent) == 2
+
+        scheduler.send_dm("!ack", ["ack"], priority=PRIORITY_ACK)
+        # Radio is busy for the previous packet's 1 s airtime
+        assert wait_until(lambda: len(serial.sent) == 3, timeout=2.0)
+        assert serial.sent[-1][2] == "ack"
+    finally:
+        scheduler.stop()
+
+
+def test_failed_part_drops_rest_and_reports():
+    """Test that a failed part ends the message with on_sent(False)."""
+    serial = RecordingSerial(fail_on="p2")
+    results = []
+    scheduler = make_scheduler(serial, destination_gap=0.05)
+    scheduler.send_dm("!a", ["p1", "p2", "p3"], on_sent=results.append)
+    scheduler.send_dm("!b", ["ok"], on_sent=results.append)
+    scheduler.start()
+    try:
+        assert wait_until(lambda: len(results) == 2)
+    finally:
+        scheduler.stop()
+
+    assert [text for _, _, text in serial.sent] == ["p1", "ok", "p2"]
+    assert sorted(results) == [False, True]
+    assert scheduler.get_metrics()["failed_packets"] == 1
+
+
+def test_broadcast_uses_send_broadcast():
+    """Test that broadcasts go through the scheduler too."""
+    serial = RecordingSerial()
+    results = []
+    scheduler = make_scheduler(serial)
+    scheduler.send_broadcast("hello mesh", on_sent=results.append)
+    scheduler.start()
+    try:
+        assert wait_until(lambda: results == [True])
+    finally:
+        scheduler.stop()
+    assert serial.sent[0][1:] == ("broadcast", "hello mesh")
+
+
+def test_notifications_enqueue_and_return(db):
+    """Test that NotificationManager no longer sends or sleeps on the caller's thread."""
+    serial = RecordingSerial()
+    scheduler = make_scheduler(serial, destination_gap=5.0)
+    notifications = NotificationManager(serial, db, tx_scheduler=scheduler)
+
+    start = time.perf_counter()
+    notifications.send_command_response("node1", "línea\n" * 120)
+    assert time.perf_counter() - start < 0.5
+    assert serial.sent == []
+    assert scheduler.pending() == 1
+
+
+def test_sent_notifications_not_queued_twice(db):
+    """Test that in-flight Q→Note notifications are not re-queued by the next pass."""
+    serial = RecordingSerial()
+    scheduler = make_scheduler(serial)
+    notifications = NotificationManager(serial, db, tx_scheduler=scheduler)
+    notifications.geocoding = Mock(lookup_local=Mock(return_value=None))
+    queue_id = db.create_note("node1", 1.0, 2.0, "test", "test")
+    db.update_note_sent(queue_id, 12345, "https://osm.org/note/12345")
+
+    notifications.process_sent_notifications()
+    notifications.process_sent_notifications()
+    assert scheduler.pending() == 1
+    assert db.get_note_by_queue_id(queue_id)["notified_sent"] == 0
+
+    scheduler.start()
+    try:
+        assert wait_until(lambda: db.get_note_by_queue_id(queue_id)["notified_sent"] == 1)
+    finally:
+        scheduler.stop()
+    assert len(serial.sent) == 1
+
+
+def test_summary_covers_only_the_notes_it_counted(db):
+    """Test that a queued summary marks only its own notes and skips notes already in flight."""
+    serial = RecordingSerial()
+    scheduler = make_scheduler(serial)
+    notifications = NotificationManager(serial, db, tx_scheduler=scheduler)
+    notifications.geocoding = Mock(lookup_local=Mock(return_value=None))
+    in_flight, counted = (db.create_note("node1", 1.0, 2.0, f"n{i}", f"n{i}") for i in range(2))
+    for i, queue_id in enumerate((in_flight, counted)):
+        db.update_note_sent(queue_id, 100 + i, f"https://osm.org/note/{100 + i}")
+    assert notifications._claim(f"sent:{in_flight}")
+    for _ in range(3):
+        notifications._record_notification("node1")
+
+    notifications.process_sent_notifications()
+    late = db.create_note("node1", 1.0, 2.0, "late", "late")
+    db.update_note_sent(late, 200, "https://osm.org/note/200")
+
+    scheduler.start()
+    try:
+        assert wait_until(lambda: len(serial.sent) == 1)
+    finally:
+        scheduler.stop()
+    assert "Se enviaron 1 reportes" in serial.sent[0][2]
+    assert db.get_note_by_queue_id(counted)["notified_sent"] == 1
+    assert db.get_note_by_queue_id(in_flight)["notified_sent"] == 0
+    assert db.get_note_by_queue_id(late)["notified_sent"] == 0
@@ -0,0 +1,99 @@
+"""Tests for event-driven worker wakeups."""
+
+import time
+import threading
+import pytest
+from unittest.mock import Mock, patch
+
+from gateway.database import Database
+from gateway.main import Gateway
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Create temporary database."""
+    db_path = tmp_path / "test.db"
+    return Database(db_path=db_path)
+
+
+@pytest.fixture
+def gateway(db):
+    """Gateway with mocked serial/position cache and a worker loop that counts passes."""
+    with patch('gateway.main.MeshtasticSerial') as mock_serial, \
+            patch('gateway.main.PositionCache') as mock_cache, \
+            patch('gateway.main.WORKER_INTERVAL', 30):
+        mock_serial.return_value = Mock()
+        mock_cache.return_value = Mock()
+        gw = Gateway()
+        gw.db = db
+        gw.osm_worker = Mock()
+        gw.osm_worker.process_pending.return_value = 0
+        gw.notifications = Mock()
+        gw._first_worker_cycle = True
+        gw.db.set_time_correction_applied(True)
+        gw.running = True
+        thread = threading.Thread(target=gw._worker_loop, daemon=True)
+        thread.start()
+        yield gw
+        gw.running = False
+        gw.wake_worker()
+        thread.join(timeout=2.0)
+
+
+def wait_for_passes(gateway, count, timeout=2.0):
+    deadline = time.time() + timeout
+    while gateway.osm_worker.process_pending.call_count < count and time.time() < deadline:
+        time.sleep(0.01)
+    return gateway.osm_worker.process_pending.call_count
+
+
+def test_worker_idles_without_events(gateway):
+    """Test that the worker does not poll faster than WORKER_INTERVAL when idle."""
+    assert wait_for_passes(gateway, 1) == 1
+    time.sleep(0.2)
+    assert gateway.osm_worker.process_pending.call_count == 1
+
+
+def test_wake_worker_runs_pass_immediately(gateway):
+    """Test that wake_worker() triggers a pass without waiting for the interval."""
+    wait_for_passes(gateway, 1)
+    gateway.wake_worker()
+    assert wait_for_passes(gateway, 2) == 2
+
+
+def test_connectivity_restored_wakes_worker(gateway):
+    """Test that closing the connectivity circuit triggers a pass."""
+    wait_for_passes(gateway, 1)
+    gateway.connectivity.record_failure()
+    gateway.connectivity.record_failure()
+    time.sleep(0.1)
+    assert gateway.osm_worker.process_pending.call_count == 1
+
+    gateway.connectivity.record_success()
+    assert wait_for_passes(gateway, 2) == 2
+
+
+def test_full_batch_triggers_another_pass(gateway):
+    """Test that a full batch makes the worker continue draining."""
+    wait_for_passes(gateway, 1)
+    gateway.osm_worker.process_pending.side_effect = [10, 0]
+    gateway.wake_worker()
+    assert wait_for_passes(gateway, 3) == 3
+
+
+def test_wait_timeout_follows_next_retry(db):
+    """Test that the idle wait is shortened to the next scheduled retry."""
+    with patch('gateway.main.MeshtasticSerial') as mock_serial, \
+            patch('gateway.main.PositionCache') as mock_cache:
+        mock_serial.return_value = Mock()
+        mock_cache.return_value = Mock()
+        gw = Gateway()
+    gw.db = db
+
+    with patch('gateway.main.WORKER_INTERVAL', 30):
+        assert gw._worker_wait_timeout() == 30
+
+        queue_id = db.create_note("node1", 4.6097, -74.0817, "test", "test")
+        db.update_note_error(queue_id, "Error del servidor OSM", retry_count=1,
+                             next_attempt_at=time.time() + 5)
+        assert 4 < gw._worker_wait_timeout() <= 5